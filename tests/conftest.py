@@ -3,6 +3,7 @@ import datetime
 import json
 import os
 import platform
+import threading
 import time
 from os.path import dirname, join
 from unittest.mock import MagicMock
@@ -107,7 +108,55 @@ def pytest_runtest_setup(item):
 
     from django.core.cache import cache
 
+    from treeherder.etl.taskcluster_pulse.client import task_definition_cache
+    from treeherder.model.bug_search import bugscache_index
+    from treeherder.model.error_summary import bug_suggestion_cache, normalize_line
+    from treeherder.model.reference_data import reference_data_cache
+
     cache.clear()
+    # Ids cached in memory may point at rows from a previous test's database.
+    reference_data_cache.clear()
+    bugscache_index.clear()
+    bug_suggestion_cache.clear()
+    normalize_line.cache_clear()
+    task_definition_cache.clear()
+
+
+@pytest.fixture
+def redis_cache(settings):
+    """
+    Back the default cache with the Redis at ``REDIS_URL`` instead of local memory,
+    for the code paths that use Redis directly.  Skips the test if it isn't running.
+
+    Returns the Redis client, on a database that is flushed before and after the test.
+    """
+    from django_redis import get_redis_connection
+    from redis.exceptions import ConnectionError
+
+    location = redis_url_for_worker(settings.REDIS_URL, os.environ.get("PYTEST_XDIST_WORKER"))
+    settings.CACHES = {
+        **settings.CACHES,
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": location,
+            "OPTIONS": {"SOCKET_CONNECT_TIMEOUT": 1},
+        },
+    }
+    client = get_redis_connection("default")
+    try:
+        client.flushdb()
+    except ConnectionError:
+        pytest.skip(f"Redis isn't available at {location}")
+    yield client
+    client.flushdb()
+
+
+@pytest.fixture(params=["locmem", "redis"])
+def cache_backend(request):
+    """Run the test with the default cache in local memory, then in Redis (see ``redis_cache``)."""
+    if request.param == "redis":
+        request.getfixturevalue("redis_cache")
+    return request.param
 
 
 @pytest.fixture
@@ -936,13 +985,16 @@ def bugs(mock_bugzilla_api_request):
 @pytest.fixture
 def mock_bugzilla_reopen_request(monkeypatch, request):
     """Mock reopen_request() used to reopen incomplete bugs."""
+    # The requests are sent from several threads.
+    lock = threading.Lock()
 
     def _reopen_request(url, method, headers, json):
         import json as json_module
 
-        reopened_bugs = request.config.cache.get("reopened_bugs", {})
-        reopened_bugs[url] = json_module.dumps(json)
-        request.config.cache.set("reopened_bugs", reopened_bugs)
+        with lock:
+            reopened_bugs = request.config.cache.get("reopened_bugs", {})
+            reopened_bugs[url] = json_module.dumps(json)
+            request.config.cache.set("reopened_bugs", reopened_bugs)
 
     monkeypatch.setattr(treeherder.etl.bugzilla, "reopen_request", _reopen_request)
 
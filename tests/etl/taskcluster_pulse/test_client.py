@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from treeherder.etl.taskcluster_pulse import client
+from treeherder.etl.taskcluster_pulse.client import (
+    TaskDefinitionCache,
+    close_session,
+    get_session,
+)
+
+ROOT_URL = "https://firefox-ci-tc.services.mozilla.com"
+
+
+class FakeQueue:
+    calls = []
+
+    def __init__(self, options, session=None):
+        self.root_url = options["rootUrl"]
+
+    async def task(self, task_id):
+        FakeQueue.calls.append((self.root_url, task_id))
+        await asyncio.sleep(0)
+        return {"taskId": task_id}
+
+
+@pytest.fixture
+def fake_queue(monkeypatch):
+    FakeQueue.calls = []
+    monkeypatch.setattr(client.taskcluster.aio, "Queue", FakeQueue)
+    return FakeQueue
+
+
+@pytest.mark.asyncio
+async def test_session_is_shared():
+    session = get_session()
+    assert get_session() is session
+
+    await session.close()
+    assert get_session() is not session
+    await close_session()
+
+
+@pytest.mark.asyncio
+async def test_fetch_is_cached(fake_queue):
+    cache = TaskDefinitionCache()
+    session = object()
+
+    assert await cache.fetch(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg", session) == {
+        "taskId": "AJBb7wqZT6K9kz4niYAatg"
+    }
+    await cache.fetch(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg", session)
+    await cache.fetch(
+        "https://community-tc.services.mozilla.com", "AJBb7wqZT6K9kz4niYAatg", session
+    )
+
+    assert fake_queue.calls == [
+        (ROOT_URL, "AJBb7wqZT6K9kz4niYAatg"),
+        ("https://community-tc.services.mozilla.com", "AJBb7wqZT6K9kz4niYAatg"),
+    ]
+    assert cache.stats == {"local_hit": 1, "shared_hit": 0, "miss": 2}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_share_a_request(fake_queue):
+    cache = TaskDefinitionCache()
+
+    tasks = await asyncio.gather(
+        *[cache.fetch(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg", object()) for _ in range(3)]
+    )
+
+    assert len(fake_queue.calls) == 1
+    assert tasks[0] is tasks[1] is tasks[2]
+
+
+def test_entries_expire(settings):
+    settings.TASK_DEFINITION_CACHE_TTL = 0
+    cache = TaskDefinitionCache()
+    cache.set(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg", {"taskId": "AJBb7wqZT6K9kz4niYAatg"})
+
+    assert cache.get(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg") is None
+
+
+def test_size_is_bounded():
+    cache = TaskDefinitionCache(max_size=2)
+    for task_id in ("a", "b", "c"):
+        cache.set(ROOT_URL, task_id, {"taskId": task_id})
+
+    assert cache.get(ROOT_URL, "a") is None
+    assert cache.get(ROOT_URL, "c") == {"taskId": "c"}
+
+
+def test_shared_cache(settings):
+    settings.TASK_DEFINITION_CACHE_SHARED = True
+    TaskDefinitionCache().set(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg", {"taskId": "x"})
+
+    other_worker = TaskDefinitionCache()
+    assert other_worker.get(ROOT_URL, "AJBb7wqZT6K9kz4niYAatg") == {"taskId": "x"}
+    assert other_worker.stats["shared_hit"] == 1
@@ -126,3 +126,47 @@ def test_handle_task_defined():
     assert isinstance(result, dict)
     assert result["buildMachine"]["name"] == "unknown"
     assert result["origin"]["project"] == "autoland"
+
+
+@pytest.mark.asyncio
+async def test_fetch_artifacts_follows_continuation(monkeypatch):
+    pages = {
+        None: {"artifacts": [{"name": "public/logs/live.log"}], "continuationToken": "abc"},
+        "abc": {"artifacts": [{"name": "public/test_info/errorsummary.log"}]},
+    }
+
+    class FakeQueue:
+        def __init__(self, options, session=None):
+            pass
+
+        async def listArtifacts(self, task_id, run_id, query=None):  # noqa: N802
+            return pages[(query or {}).get("continuationToken")]
+
+    monkeypatch.setattr(tc_handler.taskcluster.aio, "Queue", FakeQueue)
+
+    artifacts = await tc_handler.fetch_artifacts(
+        "https://firefox-ci-tc.services.mozilla.com", "AJBb7wqZT6K9kz4niYAatg", 0, None
+    )
+
+    assert artifacts == [
+        {"name": "public/logs/live.log"},
+        {"name": "public/test_info/errorsummary.log"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_artifact_links_are_lazy(monkeypatch, settings):
+    settings.LAZY_ARTIFACT_LINKS = True
+
+    async def fetch_artifacts(*args):
+        raise AssertionError("artifacts should not be listed during ingestion")
+
+    monkeypatch.setattr(tc_handler, "fetch_artifacts", fetch_artifacts)
+    job = {"jobInfo": {"links": []}}
+
+    assert (
+        await tc_handler.add_artifact_uploaded_links(
+            "https://firefox-ci-tc.services.mozilla.com", "AJBb7wqZT6K9kz4niYAatg", 0, job, None
+        )
+        is job
+    )
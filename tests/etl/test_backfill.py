@@ -0,0 +1,101 @@
+from treeherder.etl import backfill
+from treeherder.etl.backfill import BackfillEngine, Checkpoint, task_to_jobs
+from treeherder.etl.job_loader import JobLoader
+
+ROOT_URL = "https://firefox-ci-tc.services.mozilla.com"
+
+
+async def make_tasks(task_ids):
+    for task_id in task_ids:
+        yield {"status": {"taskId": task_id, "runs": []}, "task": {}}
+
+
+async def test_task_to_jobs(monkeypatch):
+    messages = []
+
+    async def mock_handle_message(message, task_definition):
+        messages.append((message["exchange"], message["payload"]["runId"]))
+        return [{"taskId": f"a/{message['payload']['runId']}"}, None]
+
+    monkeypatch.setattr(backfill, "handle_message", mock_handle_message)
+    task = {
+        "status": {
+            "taskId": "a",
+            "runs": [{"runId": 0, "state": "exception"}, {"runId": 1, "state": "completed"}],
+        },
+        "task": {},
+    }
+
+    jobs = await task_to_jobs(task, ROOT_URL)
+
+    # the latest run comes first, so the earlier one can be marked as retried
+    assert messages == [
+        ("exchange/taskcluster-queue/v1/task-completed", 1),
+        ("exchange/taskcluster-queue/v1/task-exception", 0),
+    ]
+    assert jobs == [{"taskId": "a/1"}, {"taskId": "a/0"}]
+
+
+async def test_backfill_engine(monkeypatch, tmp_path):
+    async def mock_task_to_jobs(task, root_url):
+        task_id = task["status"]["taskId"]
+        if task_id == "broken":
+            raise ValueError("bad task")
+        return [{"taskId": f"{task_id}/0"}]
+
+    batches = []
+
+    def mock_process_jobs(self, jobs, root_url):
+        batches.append(jobs)
+        return [task_id for task_id, _ in jobs if task_id == "unstored"]
+
+    monkeypatch.setattr(backfill, "task_to_jobs", mock_task_to_jobs)
+    monkeypatch.setattr(JobLoader, "process_jobs", mock_process_jobs)
+
+    checkpoint_path = str(tmp_path / "checkpoint")
+    checkpoint = Checkpoint(checkpoint_path)
+    checkpoint.add(["done"])
+    task_ids = ["done", "broken", "unstored"] + [f"task{n}" for n in range(20)]
+    engine = BackfillEngine(ROOT_URL, workers=2, batch_size=5, checkpoint=checkpoint)
+
+    stats = await engine.run(make_tasks(task_ids))
+
+    assert stats == {"tasks": 20, "skipped": 1, "jobs": 20, "failed": 2}
+    assert all(len(batch) <= 5 for batch in batches)
+    assert sorted(task_id for batch in batches for task_id, _ in batch) == sorted(
+        ["unstored"] + [f"task{n}" for n in range(20)]
+    )
+
+    # a new run resumes from the checkpoint, retrying only the tasks that failed
+    batches.clear()
+    engine = BackfillEngine(ROOT_URL, checkpoint=Checkpoint(checkpoint_path))
+    stats = await engine.run(make_tasks(task_ids))
+
+    assert stats["skipped"] == 21
+    assert [task_id for batch in batches for task_id, _ in batch] == ["unstored"]
+
+
+async def test_backfill_engine_ingests_missing_push(monkeypatch):
+    async def mock_task_to_jobs(task, root_url):
+        return [{"taskId": "a/0", "origin": {"project": "autoland", "revision": "abc"}}]
+
+    pushes = []
+    stored = []
+
+    def mock_process_job(self, job, root_url):
+        if not pushes:
+            raise backfill.MissingPushError("no push")
+        stored.append(job["taskId"])
+
+    monkeypatch.setattr(backfill, "task_to_jobs", mock_task_to_jobs)
+    monkeypatch.setattr(JobLoader, "process_jobs", lambda self, jobs, root_url: ["a"])
+    monkeypatch.setattr(JobLoader, "process_job", mock_process_job)
+
+    engine = BackfillEngine(
+        ROOT_URL, ingest_missing_push=lambda project, revision: pushes.append(revision)
+    )
+    stats = await engine.run(make_tasks(["a"]))
+
+    assert pushes == ["abc"]
+    assert stored == ["a/0"]
+    assert stats["tasks"] == 1
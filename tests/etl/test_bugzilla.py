@@ -1,8 +1,16 @@
+import datetime
+import json
+import os
+from urllib.parse import parse_qs, urlsplit
+
 import pytest
+import requests
 from django.urls import reverse
 
+from treeherder.etl import bugzilla
 from treeherder.etl.bugzilla import BzApiBugProcess
 from treeherder.model.models import BugJobMap, Bugscache
+from treeherder.utils.benchmark import LocalHTTPServer
 
 
 @pytest.mark.django_db(transaction=True)
@@ -18,6 +26,46 @@ def test_bz_api_process(mock_bugzilla_api_request):
     assert Bugscache.objects.count() == 28
 
 
+@pytest.mark.django_db(transaction=True)
+def test_bz_api_process_pages(monkeypatch, settings):
+    bug_list_path = os.path.join(os.path.dirname(__file__), "..", "sample_data", "bug_list.json")
+    with open(bug_list_path) as f:
+        bugs = json.load(f)["bugs"]
+    last_change_time = (datetime.datetime.utcnow() - datetime.timedelta(days=30)).strftime(
+        "%Y-%m-%dT%H:%M:%SZ"
+    )
+    for bug in bugs:
+        bug["last_change_time"] = last_change_time
+    bugs_by_id = {bug["id"]: bug for bug in bugs}
+    bugs_by_id[303].update(dupe_of=404, resolution="DUPLICATE")
+    bugs_by_id[404]["duplicates"] = [303]
+
+    def rest_bug(path):
+        query = parse_qs(urlsplit(path).query)
+        if "id" in query:
+            page = [bugs_by_id[int(bug_id)] for bug_id in query["id"][0].split(",")]
+        else:
+            offset = int(query["offset"][0])
+            page = bugs[offset : offset + int(query["limit"][0])]
+        return 200, {"Content-Type": "application/json"}, json.dumps({"bugs": page}).encode()
+
+    monkeypatch.setattr(bugzilla, "BUGS_PAGE_SIZE", 5)
+    settings.BZ_API_CONCURRENCY = 3
+    with LocalHTTPServer({"/rest/bug": rest_bug}) as server:
+        settings.BZ_API_URL = server.url("")
+        BzApiBugProcess().run()
+
+        assert set(Bugscache.objects.values_list("bugzilla_id", flat=True)) == set(bugs_by_id)
+        duplicate = Bugscache.objects.get(bugzilla_id=303)
+        assert duplicate.dupe_of == 404
+        assert duplicate.modified == Bugscache.objects.get(bugzilla_id=404).modified
+        # the pages after the last (short) one may have been requested, but no more
+        assert 6 <= server.request_count <= 6 + settings.BZ_API_CONCURRENCY
+
+        BzApiBugProcess().run()
+        assert Bugscache.objects.count() == 28
+
+
 @pytest.mark.parametrize(
     "minimum_failures_to_reopen",
     [1, 3],
@@ -123,3 +171,21 @@ def test_bz_reopen_bugs(
             },
         )
     assert reopened_bugs == expected_reopen_attempts
+
+
+def test_bz_reopen_bugs_request_error(monkeypatch, test_jobs, bugs):
+    """A failed request doesn't stop the bugs that were reopened from being marked open."""
+    incomplete_bugs = [bug for bug in bugs if bug.resolution == "INCOMPLETE"]
+    for job, bug in zip(test_jobs, incomplete_bugs[:2]):
+        BugJobMap.objects.create(job=job, bug=bug)
+
+    def mock_reopen_request(url, method, headers, json):
+        if url.endswith(f"/{incomplete_bugs[0].bugzilla_id}"):
+            raise requests.exceptions.ConnectionError("connection reset")
+
+    monkeypatch.setattr(bugzilla, "reopen_request", mock_reopen_request)
+
+    bugzilla.reopen_intermittent_bugs()
+
+    assert BugJobMap.objects.get(bug=incomplete_bugs[0]).bug_open is False
+    assert BugJobMap.objects.get(bug=incomplete_bugs[1]).bug_open is True
@@ -4,7 +4,12 @@ import pytest
 
 from tests import test_utils
 from tests.sample_data_generator import job_data
-from treeherder.etl.jobs import _remove_existing_jobs, store_job_data
+from treeherder.etl.jobs import (
+    _remove_existing_jobs,
+    _split_conflicting_jobs,
+    store_job_data,
+    store_job_data_bulk,
+)
 from treeherder.etl.push import store_push_data
 from treeherder.model.models import Job, JobLog
 
@@ -141,6 +146,79 @@ def test_ingest_running_to_retry_to_success_sample_job(
     assert JobLog.objects.count() == 2
 
 
+@pytest.mark.parametrize(
+    "ingestion_cycles", [[(0, 1), (1, 2), (2, 3)], [(0, 2), (2, 3)], [(0, 3)], [(0, 1), (1, 3)]]
+)
+def test_ingest_running_to_retry_to_success_sample_job_bulk(
+    test_repository,
+    failure_classifications,
+    sample_data,
+    sample_push,
+    mock_log_parser,
+    ingestion_cycles,
+):
+    # verifies that bulk storing applies several events for the same task in order
+    store_push_data(test_repository, sample_push)
+
+    job_datum = copy.deepcopy(sample_data.job_data[0])
+    job_datum["revision"] = sample_push[0]["revision"]
+
+    job = job_datum["job"]
+    job_guid_root = job["job_guid"]
+
+    job_data = []
+    for state, result, job_guid in [
+        ("running", "unknown", job_guid_root),
+        ("completed", "retry", job_guid_root + "_" + str(job["end_timestamp"])[-5:]),
+        ("completed", "success", job_guid_root),
+    ]:
+        new_job_datum = copy.deepcopy(job_datum)
+        new_job_datum["job"]["state"] = state
+        new_job_datum["job"]["result"] = result
+        new_job_datum["job"]["job_guid"] = job_guid
+        job_data.append(new_job_datum)
+
+    for i, j in ingestion_cycles:
+        store_job_data_bulk(test_repository, job_data[i:j])
+
+    assert Job.objects.count() == 2
+    assert Job.objects.get(id=1).result == "retry"
+    assert Job.objects.get(id=2).result == "success"
+    assert JobLog.objects.count() == 2
+
+
+def test_ingest_all_sample_jobs_bulk(
+    test_repository, failure_classifications, sample_data, sample_push, mock_log_parser
+):
+    """Storing the sample jobs in bulk gives the same jobs as storing them one at a time"""
+    store_push_data(test_repository, sample_push)
+    job_data = copy.deepcopy(sample_data.job_data)
+    for index, job_datum in enumerate(job_data):
+        job_datum["revision"] = sample_push[index % len(sample_push)]["revision"]
+
+    store_job_data_bulk(test_repository, job_data)
+    fields = ["guid", "signature_id", "job_type_id", "machine_id", "result", "state", "push_id"]
+    stored_in_bulk = sorted(Job.objects.values_list(*fields))
+    log_count = JobLog.objects.count()
+
+    Job.objects.all().delete()
+    for job_datum in job_data:
+        store_job_data(test_repository, [job_datum])
+
+    assert stored_in_bulk == sorted(Job.objects.values_list(*fields))
+    assert log_count == JobLog.objects.count()
+
+
+def test_split_conflicting_jobs():
+    data = [
+        {"job": {"job_guid": "a"}},
+        {"job": {"job_guid": "b"}},
+        {"job": {"job_guid": "a_1"}},
+        {"job": {"job_guid": "a"}},
+    ]
+    assert _split_conflicting_jobs(data) == [data[:2], [data[2]], [data[3]]]
+
+
 @pytest.mark.parametrize(
     "ingestion_cycles", [[(0, 1), (1, 3), (3, 4)], [(0, 3), (3, 4)], [(0, 2), (2, 4)]]
 )
@@ -436,3 +514,41 @@ def test_unscheduled_ingestion_idempotent(
     assert Job.objects.count() == 1
     job = Job.objects.get(guid=job_guid)
     assert job.state == "unscheduled"
+
+
+@pytest.mark.parametrize("batch_per_job, expected_calls", [(False, 2), (True, 1)])
+def test_ingest_job_log_parsing_batching(
+    test_repository,
+    failure_classifications,
+    sample_data,
+    sample_push,
+    monkeypatch,
+    settings,
+    batch_per_job,
+    expected_calls,
+):
+    """A job's pending logs are scheduled together when batching per job"""
+    from treeherder.etl import jobs
+
+    settings.LOG_PARSER_BATCH_PER_JOB = batch_per_job
+    scheduled = []
+    monkeypatch.setattr(
+        jobs,
+        "_publish_tasks",
+        lambda tasks: scheduled.extend((task.options["queue"], list(task.args)) for task in tasks),
+    )
+
+    job_data = copy.deepcopy(sample_data.job_data[:1])
+    job_data[0]["job"]["result"] = "testfailed"
+    job_data[0]["job"]["log_references"] = [
+        {"url": "http://my-log.mozilla.org/errorsummary.log", "name": "errorsummary_json"},
+        {"url": "http://my-log.mozilla.org/live_backing.log", "name": "live_backing_log"},
+    ]
+    test_utils.do_job_ingestion(test_repository, job_data, sample_push, verify_data=False)
+
+    assert len(scheduled) == expected_calls
+    assert sorted(log_id for _, args in scheduled for log_id in args[1]) == sorted(
+        JobLog.objects.values_list("id", flat=True)
+    )
+    if batch_per_job:
+        assert scheduled[0][0] == "log_parser_fail_json_unsheriffed"
@@ -8,8 +8,9 @@ import slugid
 from django.core.exceptions import ObjectDoesNotExist
 
 from treeherder.etl.job_loader import JobLoader
+from treeherder.etl.taskcluster_pulse.client import close_session
 from treeherder.etl.taskcluster_pulse.handler import handle_message
-from treeherder.model.models import Job, JobLog, Push, TaskclusterMetadata
+from treeherder.model.models import Job, JobLog, Machine, Push, TaskclusterMetadata
 
 
 @pytest.fixture
@@ -71,6 +72,7 @@ async def new_pulse_jobs(sample_data, test_repository, push_stored):
             run["origin"]["project"] = test_repository.name
             run["origin"]["revision"] = revision
             jobs.append(run)
+    await close_session()
     return jobs
 
 
@@ -307,6 +309,104 @@ def test_ingest_pulse_jobs_with_missing_push(pulse_jobs):
     assert Job.objects.count() == 0
 
 
+@pytest.mark.parametrize("bulk", [False, True])
+def test_ingest_pulse_job_lazy_artifact_links(
+    first_job, failure_classifications, mock_log_parser, monkeypatch, settings, bulk
+):
+    """A completed job's artifacts are listed by a separate task once it is stored"""
+    from treeherder.etl import jobs
+
+    settings.LAZY_ARTIFACT_LINKS = True
+    scheduled = []
+    monkeypatch.setattr(
+        jobs,
+        "_publish_tasks",
+        lambda tasks: scheduled.extend(
+            (task.options["queue"], list(task.args))
+            for task in tasks
+            if task.task == "store-artifact-references"
+        ),
+    )
+
+    jl = JobLoader()
+    if bulk:
+        jl.process_jobs([(0, first_job)], "https://firefox-ci-tc.services.mozilla.com")
+    else:
+        jl.process_job(first_job, "https://firefox-ci-tc.services.mozilla.com")
+
+    assert scheduled == [("log_parser", [Job.objects.get().id])]
+
+
+def test_ingest_pulse_jobs_bulk(
+    pulse_jobs, test_repository, push_stored, failure_classifications, mock_log_parser
+):
+    """Storing a batch of jobs in bulk gives the same result as one at a time"""
+    jl = JobLoader()
+    revision = push_stored[0]["revision"]
+    for job in pulse_jobs:
+        job["origin"]["revision"] = revision
+
+    failed = jl.process_jobs(
+        list(enumerate(pulse_jobs)), "https://firefox-ci-tc.services.mozilla.com"
+    )
+
+    assert failed == []
+    assert Job.objects.count() == 30
+    assert TaskclusterMetadata.objects.count() == 30
+    assert JobLog.objects.filter(name="live_backing_log").count() == 30
+
+
+@pytest.mark.django_db(transaction=True)
+def test_ingest_pulse_jobs_bulk_fallback(
+    first_job, failure_classifications, mock_log_parser, monkeypatch
+):
+    """Jobs of a failed batch are stored one at a time, with reference data that still exists"""
+    from treeherder.etl import jobs
+
+    real_load_jobs = jobs._load_jobs
+
+    def failing_load_jobs(*args):
+        real_load_jobs(*args)
+        raise ValueError("batch failed")
+
+    monkeypatch.setattr(jobs, "_load_jobs", failing_load_jobs)
+    first_job["buildMachine"]["name"] = "new-worker-for-fallback"
+
+    failed = JobLoader().process_jobs(
+        [(0, first_job)], "https://firefox-ci-tc.services.mozilla.com"
+    )
+
+    assert failed == []
+    job = Job.objects.get()
+    assert Machine.objects.get(id=job.machine_id).name == "new-worker-for-fallback"
+
+
+@responses.activate
+def test_ingest_pulse_jobs_bulk_with_missing_push(
+    pulse_jobs, test_repository, push_stored, failure_classifications, mock_log_parser
+):
+    """Jobs that can't be stored yet are returned, without failing the rest of the batch"""
+    jl = JobLoader()
+    revision = push_stored[0]["revision"]
+    for job in pulse_jobs:
+        job["origin"]["revision"] = revision
+    pulse_jobs[0]["origin"]["revision"] = "1234567890123456789012345678901234567890"
+    responses.add(
+        responses.GET,
+        "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/task/AI3Nrr3gSDSpZ9E9aBA3rg",
+        json={},
+        content_type="application/json",
+        status=200,
+    )
+
+    failed = jl.process_jobs(
+        list(enumerate(pulse_jobs)), "https://firefox-ci-tc.services.mozilla.com"
+    )
+
+    assert failed == [0]
+    assert Job.objects.count() == 29
+
+
 def test_transition_pending_running_complete(first_job, failure_classifications, mock_log_parser):
     jl = JobLoader()
 
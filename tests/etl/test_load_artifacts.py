@@ -3,10 +3,12 @@ import json
 
 import pytest
 from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from treeherder.etl.artifact import store_job_artifacts
-from treeherder.model.error_summary import MemDBCache, get_error_summary
+from treeherder.model.error_summary import get_error_summary
 from treeherder.model.models import TextLogError
 
 
@@ -74,6 +76,35 @@ def test_load_non_ascii_textlog_errors(test_job):
     assert TextLogError.objects.get(line_number=1588).line == "07:51:29  WARNING - <U+01D400>"
 
 
+def test_load_textlog_summary_marks_new_failures_in_bulk(test_job):
+    text_log_summary_artifact = {
+        "type": "json",
+        "name": "text_log_summary",
+        "blob": json.dumps(
+            {
+                "errors": [
+                    {"line": f"TEST-UNEXPECTED-FAIL | test_{n}.js | failed", "linenumber": n}
+                    for n in range(5)
+                ],
+            }
+        ),
+        "job_guid": test_job.guid,
+    }
+    test_job.result = "testfailed"
+    test_job.save()
+
+    with CaptureQueriesContext(connection) as captured:
+        store_job_artifacts([text_log_summary_artifact])
+
+    assert TextLogError.objects.filter(job=test_job, new_failure=True).count() == 5
+    test_job.refresh_from_db()
+    assert test_job.failure_classification_id == 6
+    updates = [
+        query["sql"] for query in captured if query["sql"].startswith('UPDATE "text_log_error"')
+    ]
+    assert len(updates) == 1
+
+
 def _add_job_summary(job, date=None, expected_new=False):
     text_log_summary_artifact = {
         "type": "json",
@@ -172,132 +203,7 @@ def test_new_failure_partial_annotation(client, test_jobs, test_user):
 
 
 @pytest.mark.django_db
-def test_memcache_migration():
-    root = "th_test"
-
-    date = "2025-01-01"
-    date2 = "2025-02-01"
-    # add stuff to line_cache, write to memcache, verify not in db_cache
-    line_cache = {}
-    line_cache[date] = {
-        "new_lines": {"this is a trap": 31415926535},
-        "this is a trap": 1,
-    }
-
-    db_cache = caches["db_cache"]
-    db_cache.set(root, line_cache)
-
-    # ensure we can get the cache and it is a dict with key "date"
-    lcache = db_cache.get(root)
-    assert date in lcache
-
-    lcache = MemDBCache(root)
-
-    # this will migrate the old format to the new
-    lc = lcache.get_cache()
-    assert date in lc
-    assert lcache.get_cache_keys() == [f"{date}"]
-
-    # ensure entire old db is cleared
-    rc = db_cache.get(root)
-    assert rc is None
-
-    # add an extra date
-    lc[date2] = lc[date]
-    lcache.write_cache(date2)
-    assert date2 in lc
-    assert lcache.get_cache_keys() == [date, date2]
-
-    # flush cache so we can reload
-    memcache = caches["default"]
-    memcache.delete(root)
-    assert memcache.get(root) is None
-
-    # reload cache
-    lc = lcache.get_cache()
-    assert date in lc
-    assert date2 in lc
-    assert lcache.get_cache_keys() == [date, date2]
-
-    # ensure we can wipe things out and it really clears stuff
-    db_cache.clear()
-    memcache.clear()
-    assert lcache.get_cache_keys() == []
-
-
-@pytest.mark.django_db
-def test_memcache_to_db_class():
-    root = "th_test"
-    lcache = MemDBCache(root)
-    line_cache = lcache.get_cache()
-
-    date = "2025-01-01"
-    # add stuff to line_cache, write to memcache, verify not in db_cache
-    line_cache[date] = {
-        "new_lines": {"this is a trap": 31415926535},
-        "this is a trap": 1,
-    }
-    assert caches["default"].get(f"{root}_{date}") is None
-
-    # write to memcache
-    lcache.update_cache(date, line_cache[date])
-    assert len(lcache.get_cache_keys()) == 0
-
-    # add key to db
-    lcache.add_cache_keys(date)
-    assert len(lcache.get_cache_keys()) == 1
-
-    db_data = caches["db_cache"].get(f"{root}_{date}")
-    assert db_data is None
-
-    # bulk write entire memcache -> db
-    lcache.write_cache()
-    db_data = caches["db_cache"].get(f"{root}_{date}")
-    assert db_data == line_cache[date]
-
-    date2 = "2025-01-02"
-    line_cache[date2] = {
-        "new_lines": {"this is a trap2": 31415926535},
-        "this is a trap2": 1,
-    }
-
-    # write only date2 to db
-    lcache.write_cache(date2, line_cache[date2])
-    assert len(lcache.get_cache_keys()) == 2
-    db_data = caches["db_cache"].get(f"{root}_{date2}")
-    assert db_data == line_cache[date2]
-
-    # expire cache
-    lcache.remove_cache_key(date)
-    assert len(lcache.get_cache_keys()) == 1
-
-    # ensure we only have date2
-    line_cache = lcache.get_cache()
-    assert len(line_cache.keys()) == 1
-
-    # remove it all
-    lcache.remove_cache_key(date2)
-    line_cache = lcache.get_cache()
-    assert len(line_cache.keys()) == 0
-
-
-@pytest.mark.django_db
-def test_memcache_new_date(client, test_jobs, test_user):
-    root = "mc_error_lines"
-
-    db_cache = caches["db_cache"]
-    db_cache.clear()
-
-    date = "2025-01-01"
-    line_cache = {}
-    line_cache[date] = {
-        "new_lines": {"this is a trap": 31415926535},
-        "this is a trap": 1,
-    }
-
-    db_cache = caches["db_cache"]
-    db_cache.set(root, line_cache)
-
-    # adding two jobs on different dates
+def test_error_line_counts_new_date(client, test_jobs, test_user):
+    # adding two jobs on different dates, the second one counts the first one's line
     _add_job_summary(test_jobs[0], date="2025-01-02", expected_new=True)
     _add_job_summary(test_jobs[1], date="2025-01-03", expected_new=False)
@@ -0,0 +1,71 @@
+import pytest
+
+from treeherder.etl.push import store_push_data
+from treeherder.model.models import Commit, Push
+
+
+def make_push(revision, num_commits, author="foo@example.com"):
+    commits = [
+        {
+            "revision": f"{n:02d}".ljust(40, revision[0]),
+            "author": author,
+            "comment": f"Bug {n} - commit {n}",
+        }
+        for n in range(num_commits - 1)
+    ]
+    commits.append({"revision": revision, "author": author, "comment": "Merge"})
+    return {
+        "revision": revision,
+        "author": author,
+        "push_timestamp": 1378293517,
+        "revisions": commits,
+    }
+
+
+def test_store_push_data(test_repository):
+    pushes = [make_push("a" * 40, 300), make_push("b" * 40, 2)]
+
+    store_push_data(test_repository, pushes)
+
+    assert Push.objects.count() == 2
+    push = Push.objects.get(revision="a" * 40)
+    assert push.author == "foo@example.com"
+    # commits keep their order in the push
+    assert list(push.commits.order_by("id").values_list("revision", flat=True)) == [
+        commit["revision"] for commit in pushes[0]["revisions"]
+    ]
+    assert Commit.objects.count() == 302
+
+
+def test_store_push_data_updates_existing(test_repository):
+    store_push_data(test_repository, [make_push("a" * 40, 3)])
+    push_id = Push.objects.get().id
+
+    store_push_data(test_repository, [make_push("a" * 40, 4, author="bar@example.com")])
+
+    push = Push.objects.get()
+    assert push.id == push_id
+    assert push.author == "bar@example.com"
+    assert set(push.commits.values_list("author", flat=True)) == {"bar@example.com"}
+    assert push.commits.count() == 4
+
+
+def test_store_push_data_duplicates(test_repository):
+    push = make_push("a" * 40, 2)
+    push["revisions"].append(dict(push["revisions"][0], comment="Amended"))
+
+    store_push_data(test_repository, [make_push("a" * 40, 1), push])
+
+    assert Push.objects.count() == 1
+    assert Commit.objects.count() == 2
+    assert Commit.objects.get(revision=push["revisions"][0]["revision"]).comments == "Amended"
+
+
+def test_store_push_data_requires_revision(test_repository):
+    push = make_push("a" * 40, 1)
+    del push["revision"]
+
+    with pytest.raises(ValueError):
+        store_push_data(test_repository, [make_push("b" * 40, 1), push])
+
+    assert not Push.objects.exists()
@@ -1,9 +1,11 @@
 import json
 import os
 
+import pytest
 import responses
 from django.core.cache import cache
 
+from treeherder.etl.exceptions import CollectionNotStoredError
 from treeherder.etl.pushlog import HgPushlogProcess
 from treeherder.model.models import Commit, Push
 
@@ -32,6 +34,29 @@ def test_ingest_hg_pushlog(test_repository, test_base_dir, activate_responses):
     assert Commit.objects.count() == 15
 
 
+def test_ingest_hg_pushlog_malformed_push(test_repository, test_base_dir, activate_responses):
+    """a push that can't be transformed is reported, and the others are still stored"""
+
+    pushlog_path = os.path.join(test_base_dir, "sample_data", "hg_pushlog.json")
+    with open(pushlog_path) as f:
+        pushlog_json = json.load(f)
+    malformed_push = next(iter(pushlog_json["pushes"].values()))
+    del malformed_push["user"]
+    pushlog_fake_url = "http://www.thisismypushlog.com"
+    responses.add(
+        responses.GET,
+        pushlog_fake_url,
+        body=json.dumps(pushlog_json),
+        status=200,
+        content_type="application/json",
+    )
+
+    with pytest.raises(CollectionNotStoredError):
+        HgPushlogProcess().run(pushlog_fake_url, test_repository.name)
+
+    assert Push.objects.count() == 9
+
+
 def test_ingest_hg_pushlog_already_stored(test_repository, test_base_dir, activate_responses):
     """test that trying to ingest a push already stored doesn't doesn't affect
     all the pushes in the request,
@@ -1,6 +1,20 @@
 import datetime
+import time
+from collections import Counter
+from unittest.mock import patch
 
-from treeherder.log_parser.intermittents import check_and_mark_intermittent
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from treeherder.log_parser import tasks
+from treeherder.log_parser.intermittents import (
+    CLASSIFICATION_LOCK_TIMEOUT,
+    ClassificationQueue,
+    GroupTallies,
+    apply_classifications,
+    check_and_mark_intermittent,
+    classify,
+)
 from treeherder.model.models import Group, GroupStatus, Job, JobLog, JobType, Push
 
 
@@ -99,3 +113,185 @@ def test_check_and_mark_intermittent_marks_prior_failure(
     # passing job (result=success) is left untouched by classify().
     assert failed_job.failure_classification_id == 8
     assert passing_job.failure_classification_id == 1
+
+
+def test_check_and_mark_intermittent_counts_new_results(
+    test_repository, generic_reference_data, failure_classifications
+):
+    """Results stored after a push was loaded are added to its tallies, and jobs
+    classified otherwise since no longer count."""
+    now = datetime.datetime.now()
+    older_push = Push.objects.create(
+        repository=test_repository,
+        revision="a" * 40,
+        author="test@example.com",
+        time=now - datetime.timedelta(hours=1),
+    )
+    current_push = Push.objects.create(
+        repository=test_repository,
+        revision="b" * 40,
+        author="test@example.com",
+        time=now,
+    )
+    job_type = JobType.objects.create(name="test-linux1804-64/opt-mochitest-plain")
+    group = Group.objects.create(name="/some/manifest.ini")
+
+    def make_job(push, result, status, guid):
+        job = _make_job(test_repository, push, job_type, generic_reference_data, result, 1, guid)
+        job_log = JobLog.objects.create(
+            job=job, name="errorsummary_json", url=f"http://log/{guid}", status=JobLog.PARSED
+        )
+        GroupStatus.objects.create(status=status, duration=1, job_log=job_log, group=group)
+        return job
+
+    fixed_job = make_job(older_push, "testfailed", GroupStatus.ERROR, "job-older-1")
+    failed_job = make_job(older_push, "testfailed", GroupStatus.ERROR, "job-older-2")
+    passing_job = make_job(current_push, "success", GroupStatus.OK, "job-current")
+    check_and_mark_intermittent(passing_job.id)
+    failed_job.refresh_from_db()
+    assert failed_job.failure_classification_id == 1
+
+    # once a failure is classified as fixed by a commit it doesn't count anymore,
+    # and the group passes as often as it fails
+    Job.objects.filter(id=fixed_job.id).update(failure_classification_id=2)
+    check_and_mark_intermittent(passing_job.id)
+    failed_job.refresh_from_db()
+    assert failed_job.failure_classification_id == 8
+
+    # a retrigger failing too makes the group fail more often than it passes
+    retrigger = make_job(current_push, "testfailed", GroupStatus.ERROR, "job-retrigger")
+    check_and_mark_intermittent(retrigger.id)
+    failed_job.refresh_from_db()
+    retrigger.refresh_from_db()
+    assert failed_job.failure_classification_id == 1
+    # but not on the current push
+    assert retrigger.failure_classification_id == 8
+
+
+def test_group_tallies(
+    test_repository, generic_reference_data, failure_classifications, cache_backend
+):
+    """A job's results are counted once, however often they're recorded."""
+    now = datetime.datetime.now()
+    push, empty_push = [
+        Push.objects.create(
+            repository=test_repository, revision=revision * 40, author="test@example.com", time=now
+        )
+        for revision in ("a", "b")
+    ]
+    job_type = JobType.objects.create(name="test-linux1804-64/opt-mochitest-plain")
+    job = _make_job(
+        test_repository, push, job_type, generic_reference_data, "testfailed", 1, "job-1"
+    )
+    job_log = JobLog.objects.create(
+        job=job, name="errorsummary_json", url="http://log/1", status=JobLog.PARSED
+    )
+    GroupStatus.objects.create(
+        status=GroupStatus.ERROR,
+        duration=1,
+        job_log=job_log,
+        group=Group.objects.create(name="/some/manifest.ini"),
+    )
+
+    tallies = GroupTallies(test_repository.id, job_type.name)
+    pushes = tallies.get_pushes([push.id, empty_push.id])
+    assert pushes[push.id].jobs == {job.id: {"/some/manifest.ini": "error"}}
+    assert pushes[push.id].tallies == Counter({"error:/some/manifest.ini": 1})
+    assert pushes[empty_push.id].jobs == {}
+
+    # the same results again
+    tallies.record(push.id, {job.id: {"/some/manifest.ini": "error"}})
+    # both pushes are read back as loaded
+    with patch.object(GroupTallies, "_load") as load:
+        pushes = tallies.get_pushes([push.id, empty_push.id])
+    load.assert_not_called()
+    assert pushes[push.id].tallies == Counter({"error:/some/manifest.ini": 1})
+
+    # new results for the job move its counts
+    tallies.record(push.id, {job.id: {"/some/manifest.ini": "ok", "/other.ini": "ok"}})
+    push_groups = tallies.get_pushes([push.id])[push.id]
+    assert push_groups.jobs == {job.id: {"/some/manifest.ini": "ok", "/other.ini": "ok"}}
+    assert push_groups.tallies == Counter({"ok:/some/manifest.ini": 1, "ok:/other.ini": 1})
+    assert push_groups.passing("/some/manifest.ini")
+
+
+def test_apply_classifications(
+    test_repository, generic_reference_data, failure_classifications, cache_backend
+):
+    """The latest decision for each job is applied, in a single update."""
+    push = Push.objects.create(
+        repository=test_repository,
+        revision="a" * 40,
+        author="test@example.com",
+        time=datetime.datetime.now(),
+    )
+    job_type = JobType.objects.create(name="test-linux1804-64/opt-mochitest-plain")
+    jobs = [
+        _make_job(test_repository, push, job_type, generic_reference_data, "testfailed", 1, guid)
+        for guid in ("job-1", "job-2", "job-3")
+    ]
+
+    queue = ClassificationQueue(push.id)
+    queue.put(
+        [
+            [jobs[0].id, True, 1.0],
+            [jobs[0].id, False, 3.0],
+            [jobs[1].id, False, 1.0],
+            [jobs[1].id, True, 2.0],
+            [jobs[2].id, True, 2.0],
+        ]
+    )
+    # a later decision was applied already
+    queue.set_applied({jobs[2].id: 5.0})
+    with CaptureQueriesContext(connection) as captured:
+        apply_classifications(push.id)
+
+    assert [Job.objects.get(id=job.id).failure_classification_id for job in jobs] == [1, 8, 1]
+    assert len([q for q in captured if q["sql"].startswith('UPDATE "job"')]) == 1
+    assert not queue.pending()
+
+    # applying the same decision again doesn't write anything
+    queue.put([[jobs[1].id, True, 2.0]])
+    with CaptureQueriesContext(connection) as captured:
+        apply_classifications(push.id)
+    assert not [q for q in captured if q["sql"].startswith('UPDATE "job"')]
+
+    # decisions found while another worker applies the push's are left to it
+    queue.put([[jobs[0].id, True, 4.0]])
+    assert queue.lock()
+    apply_classifications(push.id)
+    assert queue.pending()
+    queue.unlock()
+    apply_classifications(push.id)
+    assert Job.objects.get(id=jobs[0].id).failure_classification_id == 8
+    assert not queue.pending()
+
+
+def test_classify_after_lost_task(
+    test_repository, generic_reference_data, failure_classifications, monkeypatch, settings
+):
+    """The decisions of a push whose task got lost are applied by the next one."""
+    settings.INTERMITTENT_CLASSIFICATION_DELAY = 0
+    push = Push.objects.create(
+        repository=test_repository,
+        revision="a" * 40,
+        author="test@example.com",
+        time=datetime.datetime.now(),
+    )
+    job_type = JobType.objects.create(name="test-linux1804-64/opt-mochitest-plain")
+    jobs = [
+        _make_job(test_repository, push, job_type, generic_reference_data, "testfailed", 1, guid)
+        for guid in ("job-1", "job-2")
+    ]
+
+    with patch.object(tasks.apply_intermittent_classifications, "apply_async") as lost_task:
+        classify([jobs[0].id], [])
+    assert lost_task.called
+    assert Job.objects.get(id=jobs[0].id).failure_classification_id == 1
+
+    # once the task should have run, the next decisions schedule another
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + CLASSIFICATION_LOCK_TIMEOUT + 1)
+    classify([jobs[1].id], [])
+
+    assert [Job.objects.get(id=job.id).failure_classification_id for job in jobs] == [8, 8]
@@ -1,12 +1,19 @@
 import json
 
 import pytest
+import requests
 import responses
 from django.conf import settings
 from requests.exceptions import HTTPError
 
-from treeherder.log_parser.failureline import get_group_results, write_failure_lines
-from treeherder.log_parser.tasks import store_failure_lines
+from treeherder.log_parser.failureline import (
+    fetch_log,
+    get_group_results,
+    read_log_lines,
+    store_failure_lines,
+    write_failure_lines,
+)
+from treeherder.log_parser.tasks import parse_logs
 from treeherder.model.models import FailureLine, Group, GroupStatus, Job, JobLog
 
 from ..sampledata import SampleData
@@ -71,6 +78,70 @@ def test_store_error_summary_truncated(activate_responses, test_repository, test
     assert failure.repository == test_repository
 
 
+def test_fetch_log_stops_at_cutoff(activate_responses, test_repository, test_job, monkeypatch):
+    log_path = SampleData().get_log_path("plain-chunked_errorsummary_10_lines.log")
+    log_url = "http://my-log.mozilla.org"
+
+    monkeypatch.setattr(settings, "FAILURE_LINES_CUTOFF", 5)
+
+    with open(log_path) as log_handler:
+        responses.add(responses.GET, log_url, body=log_handler.read(), status=200)
+
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json", url=log_url)
+
+    log_lines = list(fetch_log(log_obj))
+
+    assert len(log_lines) == 5 + 1
+    assert all(isinstance(line, dict) for line in log_lines)
+
+
+def test_read_log_lines_closes_response_at_limit():
+    class EndlessResponse:
+        closed = False
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.closed = True
+
+        def iter_lines(self, chunk_size):
+            while not self.closed:
+                yield b'{"action": "log"}'
+
+    response = EndlessResponse()
+
+    assert read_log_lines(response, 3) == [{"action": "log"}] * 3
+    assert response.closed
+
+
+def test_fetch_log_closes_failed_response(
+    activate_responses, test_repository, test_job, monkeypatch
+):
+    log_url = "http://my-log.mozilla.org"
+    responses.add(responses.GET, log_url, body="", status=404)
+    closed = []
+    monkeypatch.setattr(requests.Response, "close", lambda self: closed.append(self))
+
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json", url=log_url)
+
+    assert fetch_log(log_obj) is None
+    assert closed
+    log_obj.refresh_from_db()
+    assert log_obj.status == JobLog.FAILED
+
+
+def test_fetch_log_empty(activate_responses, test_repository, test_job):
+    log_url = "http://my-log.mozilla.org"
+    responses.add(responses.GET, log_url, body="", status=200)
+
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json", url=log_url)
+
+    assert fetch_log(log_obj) is None
+    log_obj.refresh_from_db()
+    assert log_obj.status == JobLog.PENDING
+
+
 def test_store_error_summary_astral(activate_responses, test_repository, test_job):
     log_path = SampleData().get_log_path("plain-chunked_errorsummary_astral.log")
     log_url = "http://my-log.mozilla.org"
@@ -179,6 +250,31 @@ def test_store_error_summary_group_status(activate_responses, test_repository, t
     assert error_groups.first().name == "dom/workers/test/browser.ini"
 
 
+def test_store_error_summary_group_status_bulk(activate_responses, test_repository, test_job):
+    log_url = "http://my-log.mozilla.org"
+    log_obj = JobLog.objects.create(job=test_job, name="errorsummary_json", url=log_url)
+    existing = Group.objects.create(name="dom/base/test/browser.ini")
+
+    write_failure_lines(
+        log_obj,
+        [
+            {"action": "group_result", "group": "dom/base/test/browser.ini", "status": "OK"},
+            {"action": "group_result", "group": "dom/workers/test/browser.ini", "status": "ERROR"},
+            {"action": "group_result", "group": "dom/workers/test/browser.ini", "status": "OK"},
+            {"action": "group_result", "group": "dom\\bad\\browser.ini", "status": "OK"},
+            {"action": "log", "level": "debug", "message": "test", "line": 1},
+            {"action": "log", "level": "debug", "message": "test 1", "line": 2},
+        ],
+    )
+
+    assert FailureLine.objects.count() == 2
+    assert Group.objects.count() == 2
+    assert GroupStatus.objects.filter(job_log=log_obj).count() == 3
+    assert GroupStatus.objects.filter(group=existing).count() == 1
+    log_obj.refresh_from_db()
+    assert log_obj.status == JobLog.PARSED
+
+
 def test_group_status_duration(activate_responses, test_repository, test_job):
     log_path = SampleData().get_log_path("mochitest-browser-chrome_errorsummary.log")
     log_url = "http://my-log.mozilla.org"
@@ -238,17 +334,14 @@ def test_get_group_results_with_colon(activate_responses, test_job):
 
 
 def mock_full_log_parser(job_logs, mock_parser):
-    from treeherder.log_parser.tasks import store_failure_lines
-
     try:
-        # note: I was using parse_logs, but that is less deterministic
         for jl in job_logs:
             # if job is already parsed
             matching = JobLog.objects.filter(job_id=jl.job.id, name=jl.name, status__in=(1, 3))
             if len(matching) == 1:
                 continue
 
-            store_failure_lines(jl)
+            parse_logs(jl.job.id, [jl.id], "normal")
     except:
         raise
 
@@ -297,7 +390,7 @@ def create_errorsummary_job(base_job, create_jobs, log_filenames):
     index = 0
     for job in jobs:
         log_obj = JobLog.objects.create(job=job, name="errorsummary_json", url=urls[index])
-        store_failure_lines(log_obj)
+        parse_logs(job.id, [log_obj.id], "normal")
         index += 1
 
     return jobs
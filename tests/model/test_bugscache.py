@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 
 import pytest
 
+from treeherder.model.bug_search import bugscache_index, bump_generation, pg_trigrams
 from treeherder.model.models import Bugscache
 
 fifty_days_ago = datetime.now() - timedelta(days=50)
@@ -144,6 +145,64 @@ def test_bug_properties(transactional_db, sample_bugs):
     assert set(suggestions["open_recent"][0].keys()) == expected_keys
 
 
+@pytest.mark.parametrize("resolution", ["", "FIXED"])
+@pytest.mark.parametrize(("search_term", "exp_bugs"), BUG_SEARCHES)
+def test_search_index_matches_postgres(
+    transactional_db, settings, sample_bugs, search_term, exp_bugs, resolution
+):
+    """The in-process index returns what the Postgres query does."""
+    bug_list = sample_bugs["bugs"]
+    for bug in bug_list:
+        bug["resolution"] = resolution
+        bug["last_change_time"] = fifty_days_ago
+    _update_bugscache(bug_list)
+    # an internal issue, whose occurrences are counted
+    Bugscache.objects.create(summary=f"Intermittent {search_term}", modified=fifty_days_ago)
+
+    settings.BUGSCACHE_SEARCH_INDEX = False
+    expected = Bugscache.search(search_term)
+    settings.BUGSCACHE_SEARCH_INDEX = True
+    assert Bugscache.search(search_term) == expected
+
+
+def test_search_index_refresh(transactional_db, settings, sample_bugs):
+    settings.BUGSCACHE_SEARCH_INDEX = True
+    bug_list = sample_bugs["bugs"]
+    for bug in bug_list:
+        bug["resolution"] = ""
+        bug["last_change_time"] = fifty_days_ago
+    _update_bugscache(bug_list)
+    search_term = "test_popup_preventdefault_chrome.xul"
+    assert [b["id"] for b in Bugscache.search(search_term)["open_recent"]] == [455091]
+
+    Bugscache.objects.filter(bugzilla_id=455091).update(resolution="FIXED")
+    Bugscache.objects.filter(bugzilla_id=1054669).delete()
+    bump_generation()
+    # processes only look for a new generation once in a while
+    bugscache_index._generation_checked = None
+
+    assert [b["id"] for b in Bugscache.search(search_term)["all_others"]] == [455091]
+    assert 1054669 not in [b["id"] for b in Bugscache.search("TestSwitchFrame")["open_recent"]]
+    assert bugscache_index.stale == 2
+
+
+def test_pg_trigrams():
+    # as returned by Postgres' show_trgm()
+    assert pg_trigrams("foo_bar.js") == {
+        "  f",
+        " fo",
+        "foo",
+        "oo ",
+        "  b",
+        " ba",
+        "bar",
+        "ar ",
+        "  j",
+        " js",
+        "js ",
+    }
+
+
 @pytest.mark.django_db(transaction=True)
 def test_import(mock_bugscache_bugzilla_request):
     """
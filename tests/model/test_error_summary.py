@@ -1,15 +1,30 @@
 import datetime
+import gzip
+import re
+from glob import glob
+from os.path import join
 from unittest.mock import MagicMock, patch
 
 import pytest
 
+from tests.conftest import SAMPLE_DATA_PATH
+from treeherder.model.bug_search import bump_generation
 from treeherder.model.error_summary import (
+    LINE_CACHE_TIMEOUT,
+    MOZHARNESS_RE,
+    PROCESS_ID_RE_1,
+    PROCESS_ID_RE_2,
+    ErrorLineCounts,
+    bug_suggestion_cache,
     cache_clean_error_line,
+    db_cache,
     get_cleaned_line,
     get_crash_signature,
     get_error_search_term_and_path,
     get_error_summary,
+    normalize_line,
 )
+from treeherder.model.models import Bugscache
 
 LINE_CLEANING_TEST_CASES = (
     (
@@ -382,6 +397,68 @@ def test_cache_error_line_cleaning(line, exp_cache_line_cleaned):
     assert actual_cache_line_cleaned == exp_cache_line_cleaned
 
 
+def _reference_get_cleaned_line(line):
+    """get_cleaned_line as a plain chain of substitutions."""
+    line = PROCESS_ID_RE_1.sub("", MOZHARNESS_RE.sub("", line).strip())
+    line = re.sub(r".cpp:[0-9]+", ".cpp:X", line)
+    line = re.sub(r"\[Child [0-9]+, [a-zA-Z]+ Thread", "[Child X, Y Thread", line)
+    line = re.sub(r"\[Parent [0-9]+, [a-zA-Z]+ Thread", "[Parent X, Y Thread", line)
+    return PROCESS_ID_RE_2.sub("", line)
+
+
+def _reference_cache_clean_error_line(line):
+    """cache_clean_error_line as a plain chain of substitutions."""
+    line = re.sub(r" [0-9]+\.[0-9]+ ", " X ", line)
+    line = re.sub(r" leaked [0-9]+ window(s)", " leaked X window(s)", line)
+    line = re.sub(r" [0-9]+ bytes leaked", " X bytes leaked", line)
+    line = re.sub(r" value=[0-9]+", " value=*", line)
+    line = re.sub(r"ot [0-9]+, expected [0-9]+", "ot X, expected Y", line)
+    line = re.sub(r" http://localhost:[0-9]+/", " http://localhost:X/", line)
+    return re.sub(r" finished in \d+ms", " finished", line)
+
+
+def _sample_error_lines():
+    markers = ("TEST-UNEXPECTED", "PROCESS-CRASH", "Assertion", "ASSERTION", "leaked", " Thread]")
+    for path in sorted(glob(join(SAMPLE_DATA_PATH, "logs", "*.log.gz"))):
+        with gzip.open(path, "rt", errors="replace") as log:
+            yield from (line.rstrip() for line in log if any(m in line for m in markers))
+
+
+# Lines where a substitution depends on the result of an earlier one.
+CHAINED_CLEANING_LINES = (
+    "12:00:00     INFO - PID 123 | [456] Assertion failure: false, at foo.cpp:12",
+    "GECKO(1) | GECKO(2) | [Parent 3, IPC I/O Parent Thread] ###!!! ABORT: at bar.cpp:4",
+    "TEST-UNEXPECTED-FAIL | a.html | took 1.5 leaked 3 windows",
+    "TEST-UNEXPECTED-FAIL | leakcheck | tab 2.0 1024 bytes leaked (nsFoo)",
+    "TEST-UNEXPECTED-FAIL | b.html | got 1, expected 2 value=3 http://localhost:8888/ 1.2 ",
+    "TEST-UNEXPECTED-FAIL | c.html | finished in 12ms finished in 3ms",
+)
+
+
+def test_normalize_line_matches_reference():
+    lines = [line for line, _ in LINE_CLEANING_TEST_CASES]
+    lines.extend(line for line, _ in LINES_TO_CACHE_TEST_CASES)
+    lines.extend(CHAINED_CLEANING_LINES)
+    lines.extend(_sample_error_lines())
+    assert len(lines) > 10000
+
+    for line in lines:
+        clean_line = _reference_get_cleaned_line(line)
+        assert get_cleaned_line(line) == clean_line
+        assert cache_clean_error_line(line) == _reference_cache_clean_error_line(line)
+        if not clean_line:
+            continue
+        normalized = normalize_line(line)
+        assert normalized.clean_line == clean_line
+        assert normalized.cache_clean_line == _reference_cache_clean_error_line(clean_line)
+        search_info = get_error_search_term_and_path(clean_line)
+        assert list(normalized.search_term) == search_info["search_term"]
+        assert normalized.path_end == search_info["path_end"]
+        assert normalized.crash_signature == get_crash_signature(clean_line)
+
+    assert normalize_line.cache_info().currsize <= normalize_line.cache_info().maxsize
+
+
 def _fake_job(repository_name):
     """A minimal stand-in for a Job with just what get_error_summary reads
     before it returns early on an empty queryset."""
@@ -401,10 +478,10 @@ ERROR_LINE_CACHE_KEYROOT_CASES = (
 
 
 @pytest.mark.parametrize(("repository_name", "expected_keyroot"), ERROR_LINE_CACHE_KEYROOT_CASES)
-@patch("treeherder.model.error_summary.MemDBCache")
+@patch("treeherder.model.error_summary.ErrorLineCounts")
 @patch("treeherder.model.error_summary.cache")
 def test_error_line_cache_selected_by_repository_name(
-    mock_cache, mock_memdbcache, repository_name, expected_keyroot
+    mock_cache, mock_error_line_counts, repository_name, expected_keyroot
 ):
     """Only comm-central uses the cc_error_lines cache; everything else uses
     mc_error_lines. The keyroot is chosen from the repository *name*, so a
@@ -415,4 +492,99 @@ def test_error_line_cache_selected_by_repository_name(
     # the error-line cache, so no DB/log processing is needed.
     get_error_summary(_fake_job(repository_name), queryset=[])
 
-    mock_memdbcache.assert_called_once_with(expected_keyroot)
+    mock_error_line_counts.assert_called_once_with(expected_keyroot)
+
+
+@pytest.fixture
+def error_line_counts(cache_backend):
+    return ErrorLineCounts("th_test")
+
+
+def test_error_line_counts(error_line_counts):
+    counts = error_line_counts
+    counts.record("2025-01-01", {"a": 2, "b": 1}, {"a": "rev1"})
+    counts.record("2025-01-02", {"a": 1}, {})
+    # outside of the window of a job of 2025-01-02
+    counts.record("2024-01-01", {"a": 5}, {})
+
+    line_cache = counts.get_line_cache("2025-01-02", {"a", "c"})
+
+    assert len(line_cache) == 21
+    assert line_cache["2025-01-01"] == {"a": 2}
+    assert line_cache["2025-01-02"] == {"a": 1, "new_lines": {}}
+    assert counts.get_line_cache("2025-01-01", {"a"})["2025-01-01"]["new_lines"] == {"a": "rev1"}
+
+
+def test_error_line_counts_first_seen_race(error_line_counts):
+    counts = error_line_counts
+    assert counts.record("2025-01-01", {"a": 1}, {"a": "rev1"}) == set()
+
+    # a concurrent job didn't see the first one's line, but loses the race to mark it
+    assert counts.record("2025-01-01", {"a": 1, "b": 1}, {"a": "rev2", "b": "rev2"}) == {"a"}
+
+    line_cache = counts.get_line_cache("2025-01-01", {"a", "b"})
+    assert line_cache["2025-01-01"] == {
+        "a": 2,
+        "b": 1,
+        "new_lines": {"a": "rev1", "b": "rev2"},
+    }
+
+
+def test_error_line_counts_snapshot_restore(redis_cache):
+    db_cache.clear()
+    counts = ErrorLineCounts("th_test")
+    counts.record("2025-01-01", {"a": 2}, {"a": "rev1"})
+    counts.record("2025-01-02", {"a": 1, "b": 3}, {"b": "rev2"})
+    counts.snapshot(datetime.date(2025, 1, 2))
+
+    assert db_cache.get("th_test_2025-01-02") == {"a": 1, "b": 3, "new_lines": {"b": "rev2"}}
+
+    # redis lost everything, and a job counted a line again since
+    redis_cache.flushdb()
+    counts.record("2025-01-02", {"b": 1}, {})
+
+    expected = {
+        "2025-01-01": {"a": 2},
+        "2025-01-02": {"a": 1, "b": 3, "new_lines": {"b": "rev2"}},
+    }
+    line_cache = counts.get_line_cache("2025-01-02", {"a", "b"})
+    assert {day: line_cache[day] for day in expected} == expected
+    assert 0 < redis_cache.ttl("th_test:restored") <= LINE_CACHE_TIMEOUT
+
+    # restoring over counts that are already there doesn't add them again
+    redis_cache.delete("th_test:restored")
+    line_cache = counts.get_line_cache("2025-01-02", {"a", "b"})
+    assert {day: line_cache[day] for day in expected} == expected
+
+
+def test_error_line_counts_no_snapshot_unless_restored(redis_cache, monkeypatch):
+    db_cache.clear()
+    counts = ErrorLineCounts("th_test")
+    counts.record("2025-01-02", {"a": 1}, {})
+    monkeypatch.setattr(counts, "restore", lambda today=None: False)
+
+    counts.snapshot(datetime.date(2025, 1, 2))
+
+    assert db_cache.get("th_test_2025-01-02") is None
+
+
+@pytest.mark.django_db
+def test_bug_suggestion_cache():
+    Bugscache.objects.create(
+        bugzilla_id=1,
+        summary="Intermittent foo.js | single tracking bug",
+        modified=datetime.datetime.now(),
+    )
+    assert bug_suggestion_cache.get_many(["foo.js"]) == {}
+    suggestions = bug_suggestion_cache.search("foo.js")
+    assert [bug["id"] for bug in suggestions["open_recent"]] == [1]
+
+    # other jobs get the cached suggestions
+    Bugscache.objects.all().delete()
+    assert bug_suggestion_cache.get_many(["foo.js", "bar.js"]) == {"foo.js": suggestions}
+
+    # until the bugs are updated
+    bump_generation()
+    # processes only look for a new generation once in a while
+    bug_suggestion_cache.clear()
+    assert bug_suggestion_cache.get_many(["foo.js"]) == {}
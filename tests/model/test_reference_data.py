@@ -0,0 +1,72 @@
+import pytest
+from django.db import transaction
+
+from treeherder.model.models import Machine
+from treeherder.model.reference_data import ReferenceDataCache
+
+
+@pytest.mark.django_db
+def test_get_id_creates_and_caches(django_assert_num_queries, django_capture_on_commit_callbacks):
+    reference_data = ReferenceDataCache()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        machine_id = reference_data.get_id(Machine, name="t-linux-1")
+    assert Machine.objects.get(name="t-linux-1").id == machine_id
+
+    with django_assert_num_queries(0):
+        assert reference_data.get_id(Machine, name="t-linux-1") == machine_id
+
+    # A new process (empty local cache) is served by the shared cache.
+    reference_data.clear()
+    with django_assert_num_queries(0):
+        assert reference_data.get_id(Machine, name="t-linux-1") == machine_id
+
+    assert reference_data.stats == {"local_hit": 1, "shared_hit": 1, "miss": 1}
+    assert reference_data.hit_rate() == pytest.approx(2 / 3)
+
+
+@pytest.mark.django_db
+def test_get_id_existing_row():
+    machine = Machine.objects.create(name="t-linux-2")
+
+    assert ReferenceDataCache().get_id(Machine, name="t-linux-2") == machine.id
+
+
+@pytest.mark.django_db
+def test_local_cache_is_bounded(django_capture_on_commit_callbacks):
+    reference_data = ReferenceDataCache(max_size=2)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        for name in ("a", "b", "c"):
+            reference_data.get_id(Machine, name=name)
+
+    assert len(reference_data._local) == 2
+
+
+@pytest.mark.django_db
+def test_get_id_not_cached_on_rollback(django_capture_on_commit_callbacks):
+    reference_data = ReferenceDataCache()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(ValueError):
+            with transaction.atomic():
+                reference_data.get_id(Machine, name="t-linux-4")
+                raise ValueError("rolled back")
+
+    assert not reference_data._local
+    machine_id = reference_data.get_id(Machine, name="t-linux-4")
+    assert Machine.objects.get(name="t-linux-4").id == machine_id
+    assert reference_data.stats["miss"] == 2
+
+
+@pytest.mark.django_db
+def test_invalidate():
+    reference_data = ReferenceDataCache()
+    machine_id = reference_data.get_id(Machine, name="t-linux-3")
+
+    Machine.objects.filter(id=machine_id).delete()
+    reference_data.invalidate()
+
+    new_id = reference_data.get_id(Machine, name="t-linux-3")
+    assert new_id != machine_id
+    assert Machine.objects.get(name="t-linux-3").id == new_id
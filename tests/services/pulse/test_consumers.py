@@ -7,6 +7,7 @@ from tests.conftest import IS_WINDOWS
 from treeherder.etl.tasks.pulse_tasks import (
     store_pulse_pushes,
     store_pulse_tasks,
+    store_pulse_tasks_batch,
     store_pulse_tasks_classification,
 )
 from treeherder.services.pulse.consumers import (
@@ -149,6 +150,113 @@ def test_joint_consumer_on_message_call_classification_ingestion(monkeypatch):
     assert mock_called
 
 
+def test_task_consumer_batches_messages(monkeypatch, settings):
+    """Test TaskConsumer hands a full batch of messages to one task and then acks them."""
+    settings.PULSE_TASKS_BATCH_SIZE = 2
+    batches = []
+    monkeypatch.setattr(
+        store_pulse_tasks_batch,
+        "apply_async",
+        lambda args, kwargs, queue: batches.append((args, kwargs, queue)),
+    )
+    monkeypatch.setattr(store_pulse_tasks, "apply_async", MagicMock())
+
+    consumer = TaskConsumer(
+        {"root_url": "https://firefox-ci-tc.services.mozilla.com", "pulse_url": "memory://"},
+        None,
+    )
+    messages = [MagicMock(), MagicMock()]
+    for task, message in zip(("a", "b"), messages):
+        message.delivery_info = {
+            "exchange": "exchange/taskcluster-queue/v1/task-pending",
+            "routing_key": task,
+        }
+    consumer.on_message({"task": "a"}, messages[0])
+    # nothing is sent or acked until the batch is full
+    assert batches == []
+    messages[0].ack.assert_not_called()
+
+    consumer.on_message({"task": "b"}, messages[1])
+
+    store_pulse_tasks.apply_async.assert_not_called()
+    assert batches == [
+        (
+            [
+                [
+                    [{"task": "a"}, "exchange/taskcluster-queue/v1/task-pending", "a"],
+                    [{"task": "b"}, "exchange/taskcluster-queue/v1/task-pending", "b"],
+                ]
+            ],
+            {"root_url": "https://firefox-ci-tc.services.mozilla.com"},
+            "store_pulse_tasks",
+        )
+    ]
+    for message in messages:
+        message.ack.assert_called_once()
+
+
+def test_task_consumer_flushes_partial_batch(monkeypatch, settings):
+    """Test a partial batch is sent once its oldest message has waited long enough."""
+    settings.PULSE_TASKS_BATCH_SIZE = 10
+    settings.PULSE_TASKS_BATCH_WAIT_MS = 0
+    monkeypatch.setattr(store_pulse_tasks_batch, "apply_async", MagicMock())
+
+    consumer = TaskConsumer(
+        {"root_url": "https://firefox-ci-tc.services.mozilla.com", "pulse_url": "memory://"},
+        None,
+    )
+    message = MagicMock()
+    message.delivery_info = {
+        "exchange": "exchange/taskcluster-queue/v1/task-pending",
+        "routing_key": "a",
+    }
+    consumer.on_message({"task": "a"}, message)
+    message.ack.assert_not_called()
+
+    consumer.on_iteration()
+
+    store_pulse_tasks_batch.apply_async.assert_called_once()
+    message.ack.assert_called_once()
+
+
+def test_task_consumer_coalesces_batch(monkeypatch, settings):
+    """Test only the latest event of each task run in a batch is sent, but all are acked."""
+    settings.PULSE_TASKS_BATCH_SIZE = 3
+    monkeypatch.setattr(store_pulse_tasks_batch, "apply_async", MagicMock())
+
+    consumer = TaskConsumer(
+        {"root_url": "https://firefox-ci-tc.services.mozilla.com", "pulse_url": "memory://"},
+        None,
+    )
+    events = [
+        ("a", "exchange/taskcluster-queue/v1/task-running"),
+        ("a", "exchange/taskcluster-queue/v1/task-pending"),
+        ("b", "exchange/taskcluster-queue/v1/task-pending"),
+    ]
+    messages = []
+    for task_id, exchange in events:
+        message = MagicMock()
+        message.delivery_info = {"exchange": exchange, "routing_key": task_id}
+        consumer.on_message({"status": {"taskId": task_id}, "runId": 0}, message)
+        messages.append(message)
+
+    batch = store_pulse_tasks_batch.apply_async.call_args.kwargs["args"][0]
+    assert batch == [
+        [
+            {"status": {"taskId": "a"}, "runId": 0},
+            "exchange/taskcluster-queue/v1/task-running",
+            "a",
+        ],
+        [
+            {"status": {"taskId": "b"}, "runId": 0},
+            "exchange/taskcluster-queue/v1/task-pending",
+            "b",
+        ],
+    ]
+    for message in messages:
+        message.ack.assert_called_once()
+
+
 class DummyPulseConsumer(PulseConsumer):
     queue_suffix = "dummy"
 
@@ -0,0 +1,156 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from treeherder.etl.tasks.pulse_tasks import store_pulse_pushes, store_pulse_tasks
+from treeherder.services.pulse import ingestion
+from treeherder.services.pulse.ingestion import DirectIngestionConsumer, IngestionService
+
+ROOT_URL = "https://firefox-ci-tc.services.mozilla.com"
+
+
+@pytest.fixture
+def service():
+    service = IngestionService(concurrency=2, db_threads=1)
+    service.start()
+    yield service
+    service.stop()
+
+
+@pytest.fixture
+def consumer(service):
+    return DirectIngestionConsumer(
+        {"root_url": ROOT_URL, "pulse_url": "memory://", "tasks": True, "hgmo": True},
+        None,
+        service=service,
+    )
+
+
+def make_message(exchange):
+    message = MagicMock()
+    message.delivery_info = {"exchange": exchange, "routing_key": "primary.abc"}
+    return message
+
+
+def wait_for_ack(consumer, message):
+    deadline = time.monotonic() + 5
+    while not message.ack.called and time.monotonic() < deadline:
+        consumer.on_iteration()
+        time.sleep(0.01)
+    assert message.ack.called
+
+
+def test_task_is_ingested_before_ack(monkeypatch, consumer):
+    runs = [{"status": "completed"}, None]
+
+    async def mock_handle_message(message):
+        assert message == {
+            "exchange": "exchange/taskcluster-queue/v1/task-completed",
+            "payload": {"status": {}},
+            "root_url": ROOT_URL,
+        }
+        return runs
+
+    store_runs = MagicMock()
+    monkeypatch.setattr(ingestion, "handle_message", mock_handle_message)
+    monkeypatch.setattr(ingestion, "store_runs", store_runs)
+    monkeypatch.setattr(store_pulse_tasks, "apply_async", MagicMock())
+
+    message = make_message("exchange/taskcluster-queue/v1/task-completed")
+    consumer.on_message({"status": {}}, message)
+    wait_for_ack(consumer, message)
+
+    store_runs.assert_called_once_with([{"status": "completed"}], ROOT_URL)
+    store_pulse_tasks.apply_async.assert_not_called()
+
+
+def test_push_is_ingested_before_ack(monkeypatch, consumer):
+    process = MagicMock()
+    monkeypatch.setattr(ingestion.PushLoader, "process", process)
+    monkeypatch.setattr(store_pulse_pushes, "apply_async", MagicMock())
+
+    message = make_message("exchange/hgpushes/v1")
+    consumer.on_message({"payload": {}}, message)
+    wait_for_ack(consumer, message)
+
+    process.assert_called_once_with({"payload": {}}, "exchange/hgpushes/v1", ROOT_URL)
+    store_pulse_pushes.apply_async.assert_not_called()
+
+
+def test_failed_message_falls_back_to_celery(monkeypatch, consumer):
+    async def failing_ingest(service, body, exchange, root_url):
+        raise ConnectionError("Taskcluster is down")
+
+    monkeypatch.setattr(ingestion, "ingest_task", failing_ingest)
+    monkeypatch.setattr(store_pulse_tasks, "apply_async", MagicMock())
+
+    message = make_message("exchange/taskcluster-queue/v1/task-running")
+    consumer.on_message({"status": {}}, message)
+    wait_for_ack(consumer, message)
+
+    store_pulse_tasks.apply_async.assert_called_once_with(
+        args=[
+            {"status": {}},
+            "exchange/taskcluster-queue/v1/task-running",
+            "primary.abc",
+            ROOT_URL,
+        ],
+        queue="store_pulse_tasks",
+    )
+
+
+def test_concurrency_is_bounded(service):
+    running = 0
+    most_running = 0
+
+    async def work(service):
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        await service.run_in_db_thread(time.sleep, 0.01)
+        running -= 1
+
+    futures = [service.submit(work) for _ in range(6)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert most_running == 2
+
+
+def test_task_events_are_coalesced(monkeypatch, settings, service):
+    settings.PULSE_DIRECT_INGESTION_COALESCE_MS = 60 * 1000
+    consumer = DirectIngestionConsumer(
+        {"root_url": ROOT_URL, "pulse_url": "memory://", "tasks": True},
+        None,
+        service=service,
+    )
+    ingested = []
+
+    async def mock_ingest_task(service, body, exchange, root_url):
+        ingested.append(exchange)
+
+    monkeypatch.setattr(ingestion, "ingest_task", mock_ingest_task)
+
+    body = {"status": {"taskId": "AJBb7wqZT6K9kz4niYAatg"}, "runId": 0}
+    messages = []
+    for exchange in ("task-pending", "task-completed", "task-running"):
+        message = make_message(f"exchange/taskcluster-queue/v1/{exchange}")
+        consumer.on_message(body, message)
+        messages.append(message)
+
+    # nothing is stored until the coalescing window has passed
+    consumer.on_iteration()
+    assert ingested == []
+
+    for event in consumer.waiting.values():
+        event["due"] = 0
+    for message in messages:
+        wait_for_ack(consumer, message)
+    assert ingested == ["exchange/taskcluster-queue/v1/task-completed"]
+
+    # a late event of the stored run is dropped
+    late = make_message("exchange/taskcluster-queue/v1/task-running")
+    consumer.on_message(body, late)
+    late.ack.assert_called_once()
+    assert not consumer.waiting
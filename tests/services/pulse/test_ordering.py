@@ -0,0 +1,66 @@
+from treeherder.services.pulse.ordering import (
+    RunStates,
+    coalesce_task_messages,
+    partition,
+    run_key,
+)
+
+DEFINED = "exchange/taskcluster-queue/v1/task-defined"
+PENDING = "exchange/taskcluster-queue/v1/task-pending"
+RUNNING = "exchange/taskcluster-queue/v1/task-running"
+COMPLETED = "exchange/taskcluster-queue/v1/task-completed"
+
+
+def event(task_id, run_id=0):
+    body = {"status": {"taskId": task_id}}
+    if run_id is not None:
+        body["runId"] = run_id
+    return body
+
+
+def test_run_key():
+    assert run_key(event("a", 1)) == ("a", 1)
+    # task-defined events have no run yet
+    assert run_key(event("a", None)) == ("a", 0)
+    assert run_key({"task": "a"}) is None
+
+
+def test_coalesce_keeps_most_advanced_event():
+    messages = [
+        (event("a"), PENDING, "m1"),
+        (event("b"), PENDING, "m2"),
+        (event("a"), COMPLETED, "m3"),
+        (event("a"), RUNNING, "m4"),
+        (event("a", 1), PENDING, "m5"),
+        (event("a", None), DEFINED, "m6"),
+    ]
+
+    latest, superseded = coalesce_task_messages(messages)
+
+    assert [m[2] for m in latest] == ["m3", "m2", "m5"]
+    assert sorted(m[2] for m in superseded) == ["m1", "m4", "m6"]
+
+
+def test_coalesce_keeps_unknown_messages():
+    messages = [({"task": "a"}, PENDING, "m1"), ({"task": "a"}, PENDING, "m2")]
+
+    assert coalesce_task_messages(messages) == (messages, [])
+
+
+def test_partition_is_stable():
+    assert partition("AJBb7wqZT6K9kz4niYAatg", 64) == partition("AJBb7wqZT6K9kz4niYAatg", 64)
+    assert {partition(f"task{i}", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_run_states():
+    states = RunStates(max_size=2)
+    states.record(("a", 0), RUNNING)
+
+    assert states.is_stale(("a", 0), PENDING)
+    assert not states.is_stale(("a", 0), COMPLETED)
+    assert not states.is_stale(("a", 1), PENDING)
+
+    states.record(("b", 0), PENDING)
+    states.record(("c", 0), PENDING)
+    # the least recently seen run is forgotten
+    assert not states.is_stale(("a", 0), PENDING)
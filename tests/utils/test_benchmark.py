@@ -0,0 +1,41 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from treeherder.utils.benchmark import LocalHTTPServer, StageTimer, percentile
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 50) == 0.0
+
+
+def test_stage_timer():
+    timer = StageTimer()
+    with timer.time("parse", lines=10, nbytes=100):
+        pass
+    timer.count("parse", lines=5)
+
+    (row,) = timer.summary()
+    assert row["stage"] == "parse"
+    assert row["count"] == 1
+    assert row["lines_per_s"] > 0
+    assert "parse" in timer.format_summary()
+
+
+def test_local_http_server():
+    routes = {
+        "/static": (200, {"Content-Type": "text/plain"}, b"static"),
+        "/dynamic": lambda path: (200, {}, path.encode()),
+    }
+    with LocalHTTPServer(routes) as server:
+        with urllib.request.urlopen(server.url("/static")) as response:
+            assert response.read() == b"static"
+        with urllib.request.urlopen(server.url("/dynamic?x=1")) as response:
+            assert response.read() == b"/dynamic?x=1"
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url("/missing"))
+        assert server.request_count == 3
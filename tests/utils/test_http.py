@@ -0,0 +1,97 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, call
+
+import pytest
+import responses
+from requests.adapters import HTTPAdapter
+
+from treeherder.utils import http
+from treeherder.utils.http import (
+    create_session,
+    get_connection_stats,
+    get_session,
+    make_request,
+)
+
+# Captured at import, before the session-wide `block_unmocked_requests` fixture
+# replaces it, so that single tests can talk to the local server.
+REAL_SEND = HTTPAdapter.send
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        body = b"log line\n"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_session_is_shared():
+    assert get_session() is get_session()
+
+
+def test_session_settings(settings):
+    settings.HTTP_POOL_MAXSIZE = 3
+    settings.HTTP_MAX_RETRIES = 5
+
+    adapter = create_session().get_adapter("https://firefox-ci-tc.services.mozilla.com/")
+
+    assert adapter._pool_maxsize == 3
+    assert adapter.max_retries.total == 5
+
+
+def test_connection_reused(local_server):
+    # Requests' adapter is blocked from the network during tests, so drive the
+    # session's connection pool directly against the local server.
+    session = create_session()
+    pool = session.get_adapter(local_server).poolmanager.connection_from_url(local_server)
+
+    for _ in range(3):
+        response = pool.urlopen("GET", "/")
+        assert response.data == b"log line\n"
+
+    assert get_connection_stats(session) == {"requests": 3, "connections": 1}
+
+
+def test_make_request_connection_stats(local_server, monkeypatch, settings):
+    monkeypatch.setattr(HTTPAdapter, "send", REAL_SEND)
+    monkeypatch.setattr(http, "_session", create_session())
+    monkeypatch.setattr(http, "_session_pid", os.getpid())
+    settings.STATSD_CLIENT = MagicMock()
+
+    assert make_request(local_server).text == "log line\n"
+    assert make_request(local_server).text == "log line\n"
+
+    assert settings.STATSD_CLIENT.incr.call_args_list == [
+        call("http_connection.new"),
+        call("http_connection.reused"),
+    ]
+
+
+@responses.activate
+def test_make_request():
+    url = "http://my-log.mozilla.org/"
+    responses.add(responses.GET, url, body="log line", status=200)
+
+    assert make_request(url).text == "log line"
+    assert make_request(url).text == "log line"
+    assert len(responses.calls) == 2
+    assert responses.calls[0].request.headers["User-Agent"].startswith("treeherder/")
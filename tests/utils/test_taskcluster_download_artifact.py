@@ -2,7 +2,7 @@ import pytest
 import responses
 from requests.models import Response
 
-from treeherder.utils.taskcluster import download_artifact
+from treeherder.utils.taskcluster import download_artifact, list_artifacts
 
 
 @responses.activate
@@ -42,3 +42,29 @@ def test_download_artifact(path, response_config, expected_result):
         assert result.text == expected_result
     else:
         assert result == expected_result
+
+
+@responses.activate
+def test_list_artifacts():
+    root_url = "https://taskcluster.net"
+    task_id = "A35mWTRuQmyj88yMnIF0fA"
+    url = f"{root_url}/api/queue/v1/task/{task_id}/runs/0/artifacts"
+
+    responses.add(
+        responses.GET,
+        url,
+        json={"artifacts": [{"name": "public/logs/live.log"}], "continuationToken": "abc"},
+        match=[responses.matchers.query_param_matcher({})],
+    )
+    responses.add(
+        responses.GET,
+        url,
+        json={"artifacts": [{"name": "public/test_info/errorsummary.log"}]},
+        match=[responses.matchers.query_param_matcher({"continuationToken": "abc"})],
+    )
+
+    expected = [{"name": "public/logs/live.log"}, {"name": "public/test_info/errorsummary.log"}]
+    assert list_artifacts(root_url, task_id, 0) == expected
+    # the listing is cached
+    assert list_artifacts(root_url, task_id, 0) == expected
+    assert len(responses.calls) == 2
@@ -1,11 +1,12 @@
 from threading import local
 
 import pytest
+import responses
 
 from treeherder.etl.exceptions import MissingPushError
 from treeherder.etl.push import store_push_data
-from treeherder.etl.tasks.pulse_tasks import store_pulse_tasks
-from treeherder.model.models import Job
+from treeherder.etl.tasks.pulse_tasks import store_artifact_references, store_pulse_tasks
+from treeherder.model.models import Job, JobLog
 
 
 @pytest.mark.skip("Test needs fixing in bug: 1307289 (plus upgrade from jobs to tasks)")
@@ -37,3 +38,79 @@ def test_retry_missing_revision_succeeds(
     assert Job.objects.count() == 1
     assert Job.objects.values()[0]["guid"] == job["taskId"]
     assert thread_data.retries == 1
+
+
+def test_store_pulse_tasks_batch_retries_failed_messages(monkeypatch):
+    """
+    Ensure that the messages of a batch that fail are each handed to their own
+    store_pulse_tasks task, while the others are stored together.
+    """
+    from treeherder.etl.tasks import pulse_tasks
+
+    async def handle_message(message):
+        if message["payload"] == "bad":
+            raise ValueError("no task definition")
+        return [{"taskId": message["payload"]}]
+
+    processed = []
+
+    def process_jobs(self, pulse_jobs, root_url):
+        processed.extend(pulse_jobs)
+        return [index for index, run in pulse_jobs if run["taskId"] == "missing-push"]
+
+    retried = []
+    monkeypatch.setattr(pulse_tasks, "handle_message", handle_message)
+    monkeypatch.setattr(pulse_tasks.JobLoader, "process_jobs", process_jobs)
+    monkeypatch.setattr(
+        store_pulse_tasks, "apply_async", lambda args, queue: retried.append(args[0])
+    )
+
+    messages = [
+        ["good", "exchange", "a"],
+        ["bad", "exchange", "b"],
+        ["missing-push", "exchange", "c"],
+    ]
+    pulse_tasks.store_pulse_tasks_batch(messages, "https://firefox-ci-tc.services.mozilla.com")
+
+    assert processed == [(0, {"taskId": "good"}), (2, {"taskId": "missing-push"})]
+    assert retried == ["bad", "missing-push"]
+
+
+@responses.activate
+def test_store_artifact_references(test_job, monkeypatch):
+    """
+    Ensure that the errorsummary and perfherder data artifacts of a job whose
+    artifacts weren't listed during ingestion are found and scheduled.
+    """
+    from treeherder.etl import jobs
+
+    artifacts_url = (
+        "https://firefox-ci-tc.services.mozilla.com/api/queue/v1/task/"
+        "V3SVuxO8TFy37En_6HcXLs/runs/0/artifacts"
+    )
+    responses.add(
+        responses.GET,
+        artifacts_url,
+        json={
+            "artifacts": [
+                {"name": "public/logs/live_backing.log"},
+                {"name": "public/test_info/mochitest_errorsummary.log"},
+                {"name": "public/build/perfherder-data-building.json"},
+            ]
+        },
+        status=200,
+    )
+    published = []
+    monkeypatch.setattr(jobs, "_publish_tasks", published.extend)
+
+    store_artifact_references(test_job.id)
+
+    errorsummary = JobLog.objects.get(
+        job=test_job, url=f"{artifacts_url}/public/test_info/mochitest_errorsummary.log"
+    )
+    assert errorsummary.name == "errorsummary_json"
+    perfherder_data = JobLog.objects.get(job=test_job, name="perfherder-data-building.json")
+    assert [(task.task, list(task.args)) for task in published] == [
+        ("log-parser", [test_job.id, [errorsummary.id], "normal"]),
+        ("ingest-perfherder-data", [test_job.id, [perfherder_data.id]]),
+    ]
@@ -419,6 +419,12 @@ CELERY_BEAT_SCHEDULE = {
         "relative": True,
         "options": {"queue": "statsd"},
     },
+    "snapshot-error-line-counts": {
+        "task": "snapshot-error-line-counts",
+        "schedule": timedelta(minutes=15),
+        "relative": True,
+        "options": {"queue": "default"},
+    },
 }
 
 # CORS Headers
@@ -474,6 +480,8 @@ BZ_API_URL = "https://bugzilla.mozilla.org"
 BUGFILER_API_URL = env("BUGZILLA_API_URL", default=BZ_API_URL)
 BUGFILER_API_KEY = env("BUG_FILER_API_KEY", default=None)
 BZ_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Pages of bugs the Bugzilla ETL fetches at once.
+BZ_API_CONCURRENCY = env.int("BZ_API_CONCURRENCY", default=4)
 
 # For intermittents commenter
 COMMENTER_API_KEY = env("BUG_COMMENTER_API_KEY", default=None)
@@ -481,9 +489,57 @@ COMMENTER_API_KEY = env("BUG_COMMENTER_API_KEY", default=None)
 # For performance sheriff bot
 PERF_SHERIFF_API_KEY = env("BUG_PERF_SHERIFF_API_KEY", default=None)
 
+# Pooled HTTP client used for log and artifact downloads (see treeherder.utils.http)
+HTTP_POOL_CONNECTIONS = env.int("HTTP_POOL_CONNECTIONS", default=10)
+HTTP_POOL_MAXSIZE = env.int("HTTP_POOL_MAXSIZE", default=10)
+HTTP_MAX_RETRIES = env.int("HTTP_MAX_RETRIES", default=3)
+HTTP_RETRY_BACKOFF_FACTOR = env.float("HTTP_RETRY_BACKOFF_FACTOR", default=0.5)
+
+# Number of task messages the pulse listener hands to a single store_pulse_tasks_batch
+# task, and the longest it waits to fill a batch. A size of 1 disables batching.
+PULSE_TASKS_BATCH_SIZE = env.int("PULSE_TASKS_BATCH_SIZE", default=1)
+PULSE_TASKS_BATCH_WAIT_MS = env.int("PULSE_TASKS_BATCH_WAIT_MS", default=500)
+
+# With `pulse_listener --direct`, the listener stores task and push messages itself
+# (see treeherder.services.pulse.ingestion): this many messages are processed at once,
+# with this many threads (and so database connections) per listener process.
+PULSE_DIRECT_INGESTION_CONCURRENCY = env.int("PULSE_DIRECT_INGESTION_CONCURRENCY", default=16)
+PULSE_DIRECT_INGESTION_DB_THREADS = env.int("PULSE_DIRECT_INGESTION_DB_THREADS", default=4)
+# Tasks are hashed onto partitions that each store one event at a time, and the events
+# of a task run received within the coalescing window are stored as one.
+PULSE_DIRECT_INGESTION_PARTITIONS = env.int("PULSE_DIRECT_INGESTION_PARTITIONS", default=64)
+PULSE_DIRECT_INGESTION_COALESCE_MS = env.int("PULSE_DIRECT_INGESTION_COALESCE_MS", default=200)
+PULSE_DIRECT_INGESTION_PREFETCH = env.int("PULSE_DIRECT_INGESTION_PREFETCH", default=256)
+
+# Taskcluster API client used by pulse ingestion (see treeherder.etl.taskcluster_pulse.client).
+# Task definitions are immutable, so each worker caches the ones it has fetched; when
+# shared, they are also cached in redis for the other workers.
+TASKCLUSTER_CONNECTION_LIMIT = env.int("TASKCLUSTER_CONNECTION_LIMIT", default=50)
+TASK_DEFINITION_CACHE_SIZE = env.int("TASK_DEFINITION_CACHE_SIZE", default=10000)
+TASK_DEFINITION_CACHE_TTL = env.int("TASK_DEFINITION_CACHE_TTL", default=60 * 60)
+TASK_DEFINITION_CACHE_SHARED = env.bool("TASK_DEFINITION_CACHE_SHARED", default=False)
+
+# Leave listing a completed task's artifacts (to find its errorsummary and perfherder
+# data) out of pulse ingestion, doing it in a store_artifact_references task instead.
+LAZY_ARTIFACT_LINKS = env.bool("LAZY_ARTIFACT_LINKS", default=False)
+
+# Maximum number of reference data ids (machines, job types, etc) each ingestion
+# process keeps in memory, see treeherder.model.reference_data.
+REFERENCE_DATA_CACHE_SIZE = env.int("REFERENCE_DATA_CACHE_SIZE", default=20000)
+
+# Search the bug summaries for bug suggestions in an in-process index rather than
+# with a query per search term, see treeherder.model.bug_search.
+BUGSCACHE_SEARCH_INDEX = env.bool("BUGSCACHE_SEARCH_INDEX", default=False)
+
 # Log Parsing
 MAX_ERROR_LINES = 40
 FAILURE_LINES_CUTOFF = 150
+# Schedule a single parse_logs task per job for all of its pending logs, rather
+# than one task per log.
+LOG_PARSER_BATCH_PER_JOB = env.bool("LOG_PARSER_BATCH_PER_JOB", default=False)
+# Seconds the intermittent (re)classifications of a push are collected for before
+# a single task applies them, see treeherder.log_parser.intermittents.
+INTERMITTENT_CLASSIFICATION_DELAY = env.int("INTERMITTENT_CLASSIFICATION_DELAY", default=10)
 
 # Count internal issue annotations in a limited time window (before prompting user to file a bug in Bugzilla)
 INTERNAL_OCCURRENCES_DAYS_WINDOW = 7
@@ -36,22 +36,22 @@ def store_text_log_summary_artifact(job, text_log_summary_artifact):
     # get error summary immediately (to warm the cache)
     # Conflicts may have occured during the insert, but we pass the queryset for performance
     bugs = error_summary.get_error_summary(job, queryset=log_errors)
-    for suggestion in bugs:
-        if (suggestion["failure_new_in_rev"] or suggestion["counter"] == 0) and job.result not in [
-            "success",
-            "unknown",
-            "usercancel",
-            "retry",
-        ]:
-            # classify job as `new failure` - for filtering, etc.
-            job.failure_classification_id = 6
-            job.save(update_fields=["failure_classification_id"])
-            # for every log_errors (TLE object) there is a corresponding bugs/suggestion
-            for tle in log_errors:
-                if tle.line_number == suggestion["line_number"]:
-                    tle.new_failure = True
-                    tle.save(update_fields=["new_failure"])
-                    break
+    if job.result in ["success", "unknown", "usercancel", "retry"]:
+        return
+
+    # for every log_errors (TLE object) there is a corresponding bugs/suggestion
+    new_failure_lines = {
+        suggestion["line_number"]
+        for suggestion in bugs
+        if suggestion["failure_new_in_rev"] or suggestion["counter"] == 0
+    }
+    if new_failure_lines:
+        TextLogError.objects.filter(job=job, line_number__in=new_failure_lines).update(
+            new_failure=True
+        )
+        # classify job as `new failure` - for filtering, etc.
+        job.failure_classification_id = 6
+        job.save(update_fields=["failure_classification_id"])
 
 
 def store_job_artifacts(artifact_data):
@@ -0,0 +1,230 @@
+"""
+Backfill jobs from the Taskcluster API, e.g. to (re-)ingest every task of a push.
+
+The work is pipelined: a producer on the event loop lists the tasks and turns
+their runs into pulse jobs, with many Taskcluster API requests in flight over
+one shared connection pool, and hands them through a bounded queue to a pool
+of threads that store them in bulk.  Slow API calls then overlap with database
+writes instead of adding to them, and the queue stops the producer from
+running ahead of the database.
+
+The ids of the stored tasks can be appended to a checkpoint file, so that an
+interrupted backfill resumes where it stopped.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import taskcluster.aio
+from django.db import close_old_connections
+
+from treeherder.etl.exceptions import MissingPushError
+from treeherder.etl.job_loader import JobLoader
+from treeherder.etl.taskcluster_pulse.client import get_session
+from treeherder.etl.taskcluster_pulse.handler import EXCHANGE_EVENT_MAP, handle_message
+
+logger = logging.getLogger(__name__)
+
+STATE_TO_EXCHANGE = {state: exchange for exchange, state in EXCHANGE_EVENT_MAP.items()}
+
+# Put on the queue once per writer, after the last task.
+DONE = object()
+
+
+class Checkpoint:
+    """The ids of the tasks already stored, optionally persisted to a file."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path) as checkpoint_file:
+                self.done = {line.strip() for line in checkpoint_file if line.strip()}
+
+    def __contains__(self, task_id):
+        return task_id in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def add(self, task_ids):
+        self.done.update(task_ids)
+        if self.path and task_ids:
+            with open(self.path, "a") as checkpoint_file:
+                checkpoint_file.writelines(f"{task_id}\n" for task_id in task_ids)
+
+
+async def list_task_group(task_group_id, root_url):
+    """Yield the ``{"status": ..., "task": ...}`` of each task in a task group."""
+    queue = taskcluster.aio.Queue({"rootUrl": root_url}, session=get_session())
+    query = {}
+    while True:
+        response = await queue.listTaskGroup(task_group_id, query=query)
+        for task in response["tasks"]:
+            yield task
+        continuation_token = response.get("continuationToken")
+        if continuation_token is None:
+            return
+        query = {"continuationToken": continuation_token}
+
+
+async def fetch_tasks(task_ids, root_url):
+    """Yield the ``{"status": ..., "task": ...}`` of each of ``task_ids``."""
+    queue = taskcluster.aio.Queue({"rootUrl": root_url}, session=get_session())
+    for task_id in task_ids:
+        status, task = await asyncio.gather(queue.status(task_id), queue.task(task_id))
+        yield {"status": status["status"], "task": task}
+
+
+async def task_to_jobs(task, root_url):
+    """Return the pulse jobs of every run of a task, as its pulse messages would."""
+    task_id = task["status"]["taskId"]
+    runs = task["status"]["runs"]
+    jobs = []
+    # If we iterate in order of the runs, we will not be able to mark older runs as
+    # "retry" instead of exception
+    for run in reversed(runs):
+        message = {
+            "exchange": STATE_TO_EXCHANGE[run["state"]],
+            "payload": {
+                "status": {
+                    "taskId": task_id,
+                    "runs": runs,
+                },
+                "runId": run["runId"],
+            },
+            "root_url": root_url,
+        }
+        jobs.extend(job for job in await handle_message(message, task["task"]) if job)
+    return jobs
+
+
+class BackfillEngine:
+    """
+    Store the jobs of a stream of tasks, see the module docstring.
+
+    ``concurrency`` bounds the tasks being fetched and transformed at once,
+    ``workers`` the threads (and so database connections) storing them, and
+    ``batch_size`` the tasks whose jobs each worker stores in one go.  If given,
+    ``ingest_missing_push(project, revision)`` is called for jobs whose push
+    hasn't been ingested yet, before storing them again.
+    """
+
+    def __init__(
+        self,
+        root_url,
+        workers=4,
+        batch_size=50,
+        concurrency=50,
+        checkpoint=None,
+        ingest_missing_push=None,
+    ):
+        self.root_url = root_url
+        self.workers = workers
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint if checkpoint is not None else Checkpoint()
+        self.ingest_missing_push = ingest_missing_push
+        self.stats = {"tasks": 0, "skipped": 0, "jobs": 0, "failed": 0}
+
+    async def run(self, tasks):
+        """Store the jobs of ``tasks``, an async iterable of tasks, returning the stats."""
+        queue = asyncio.Queue(maxsize=2 * self.workers * self.batch_size)
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="backfill-db") as executor:
+            writers = [
+                asyncio.ensure_future(self._write(queue, executor)) for _ in range(self.workers)
+            ]
+            try:
+                await self._produce(tasks, queue)
+            finally:
+                for _ in writers:
+                    await queue.put(DONE)
+                await asyncio.gather(*writers)
+        logger.info("Backfill finished: %s", self.stats)
+        return self.stats
+
+    async def _produce(self, tasks, queue):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        in_flight = set()
+        async for task in tasks:
+            if task["status"]["taskId"] in self.checkpoint:
+                self.stats["skipped"] += 1
+                continue
+            await semaphore.acquire()
+            future = asyncio.ensure_future(self._transform(task, queue, semaphore))
+            in_flight.add(future)
+            future.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+
+    async def _transform(self, task, queue, semaphore):
+        task_id = task["status"]["taskId"]
+        try:
+            jobs = await task_to_jobs(task, self.root_url)
+            # tasks without jobs are queued too, so they are checkpointed
+            await queue.put((task_id, jobs))
+        except Exception:
+            logger.exception("Failed to transform task %s", task_id)
+            self.stats["failed"] += 1
+        finally:
+            # only once queued, so a full queue holds the producer back
+            semaphore.release()
+
+    async def _write(self, queue, executor):
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch = []
+            item = await queue.get()
+            while item is not DONE:
+                batch.append(item)
+                if len(batch) >= self.batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+            done = item is DONE
+            if not batch:
+                continue
+
+            try:
+                failed = await loop.run_in_executor(executor, self._store, batch)
+            except Exception:
+                logger.exception("Failed to store a batch of %s tasks", len(batch))
+                failed = {task_id for task_id, _ in batch}
+            stored = [(task_id, jobs) for task_id, jobs in batch if task_id not in failed]
+            self.checkpoint.add([task_id for task_id, _ in stored])
+            self.stats["tasks"] += len(stored)
+            self.stats["failed"] += len(failed)
+            self.stats["jobs"] += sum(len(jobs) for _, jobs in stored)
+            logger.info("Stored %s tasks, %s to go", self.stats["tasks"], queue.qsize())
+
+    def _store(self, batch):
+        """Store the jobs of a batch of tasks, returning the ids of the tasks that failed."""
+        # The executor's threads are long lived, so give up stale connections.
+        close_old_connections()
+        try:
+            jobs = [(task_id, job) for task_id, task_jobs in batch for job in task_jobs]
+            failed = set(JobLoader().process_jobs(jobs, self.root_url))
+            if failed and self.ingest_missing_push:
+                failed = {
+                    task_id
+                    for task_id, job in jobs
+                    if task_id in failed and not self._store_with_push(job)
+                }
+            return failed
+        finally:
+            close_old_connections()
+
+    def _store_with_push(self, job):
+        try:
+            try:
+                JobLoader().process_job(job, self.root_url)
+            except MissingPushError:
+                logger.warning("The push was not in the DB. We are going to try that first")
+                self.ingest_missing_push(job["origin"]["project"], job["origin"]["revision"])
+                JobLoader().process_job(job, self.root_url)
+        except Exception:
+            logger.exception("Failed to store job %s", job.get("taskId"))
+            return False
+        return True
@@ -1,79 +1,111 @@
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import count
 
 import dateutil.parser
 import requests
 from django.conf import settings
-from django.db.models import Count, Max
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Subquery
 
+from treeherder.model.bug_search import bump_generation
 from treeherder.model.models import BugJobMap, Bugscache
 from treeherder.utils.http import fetch_json, make_request
 
 logger = logging.getLogger(__name__)
 
+# The number of bugs fetched per request.
+BUGS_PAGE_SIZE = 500
+# The Bugscache fields a bug from Bugzilla updates.
+BUG_FIELDS = [
+    "status",
+    "resolution",
+    "summary",
+    "dupe_of",
+    "crash_signature",
+    "keywords",
+    "modified",
+    "whiteboard",
+    "processed_update",
+]
+
 
 def reopen_request(url, method, headers, json):
     make_request(url, method=method, headers=headers, json=json)
 
 
+def reopen_bug(bugzilla_id, job_id, repository):
+    """Ask Bugzilla to reopen a bug, returning whether it did."""
+    log_url = f"https://treeherder.mozilla.org/logviewer?job_id={job_id}&repo={repository}"
+
+    comment = {"body": "New failure instance: " + log_url}
+    url = settings.BUGFILER_API_URL + "/rest/bug/" + str(bugzilla_id)
+    headers = {
+        "x-bugzilla-api-key": settings.BUGFILER_API_KEY,
+        "Accept": "application/json",
+    }
+    data = {
+        "status": "REOPENED",
+        "comment": comment,
+        "comment_tags": "treeherder",
+    }
+
+    try:
+        reopen_request(url, method="PUT", headers=headers, json=data)
+    except requests.exceptions.HTTPError as e:
+        try:
+            message = e.response.json()["message"]
+        except (ValueError, KeyError):
+            message = e.response.text
+        logger.error(f"Reopening bug {str(bugzilla_id)} failed: {message}")
+        return False
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Reopening bug {str(bugzilla_id)} failed: {e}")
+        return False
+    return True
+
+
 def reopen_intermittent_bugs(minimum_failures_to_reopen=1):
     # Don't reopen bugs from non-production deployments.
     if settings.BUGFILER_API_KEY is None:
         return
 
-    incomplete_bugs = set(
-        Bugscache.objects.filter(resolution="INCOMPLETE", bugzilla_id__isnull=False).values_list(
-            "bugzilla_id", flat=True
-        )
-    )
     # Intermittent bugs get closed after 3 weeks of inactivity if other conditions don't apply:
     # https://github.com/mozilla/relman-auto-nag/blob/c7439e247677333c1cd8c435234b3ef3adc49680/auto_nag/scripts/close_intermittents.py#L17
     recent_days = 7
-    recently_used_bugs = set(
+    # The most recent classification with the bug, whose job the reopening comment links to.
+    latest_mapping = BugJobMap.objects.filter(bug_id=OuterRef("bug_id")).order_by("-created")
+    bugs_to_reopen = (
         BugJobMap.objects.filter(created__gt=(datetime.now() - timedelta(recent_days)))
-        .filter(bug__bugzilla_id__isnull=False)
-        .values("bug__bugzilla_id")
-        .annotate(num_failures=Count("bug__bugzilla_id"))
+        .filter(bug__resolution="INCOMPLETE", bug__bugzilla_id__isnull=False)
+        .values("bug_id", "bug__bugzilla_id")
+        .annotate(num_failures=Count("id"))
         .filter(num_failures__gte=minimum_failures_to_reopen)
-        .values_list("bug__bugzilla_id", flat=True)
-    )
-    bugs_to_reopen = incomplete_bugs & recently_used_bugs
-
-    for bugzilla_id in bugs_to_reopen:
-        bug_data = (
-            BugJobMap.objects.filter(bug__bugzilla_id=bugzilla_id)
-            .select_related("job__repository")
-            .order_by("-created")
-            .values("job_id", "job__repository__name")[0]
+        .annotate(
+            mapping_id=Subquery(latest_mapping.values("id")[:1]),
+            job_id=Subquery(latest_mapping.values("job_id")[:1]),
+            repository=Subquery(latest_mapping.values("job__repository__name")[:1]),
         )
-        job_id = bug_data.get("job_id")
-        repository = bug_data.get("job__repository__name")
-        log_url = f"https://treeherder.mozilla.org/logviewer?job_id={job_id}&repo={repository}"
-
-        comment = {"body": "New failure instance: " + log_url}
-        url = settings.BUGFILER_API_URL + "/rest/bug/" + str(bugzilla_id)
-        headers = {
-            "x-bugzilla-api-key": settings.BUGFILER_API_KEY,
-            "Accept": "application/json",
-        }
-        data = {
-            "status": "REOPENED",
-            "comment": comment,
-            "comment_tags": "treeherder",
-        }
+        .values_list("bug__bugzilla_id", "mapping_id", "job_id", "repository")
+    )
 
-        try:
-            reopen_request(url, method="PUT", headers=headers, json=data)
-            # NOTE: this will only toggle 1 bug_job_map entry, not all (if there are retriggers)
-            BugJobMap.objects.filter(job_id=job_id, bug__bugzilla_id=bugzilla_id).update(
-                bug_open=True
-            )
-        except requests.exceptions.HTTPError as e:
+    reopened = []
+    with ThreadPoolExecutor(settings.BZ_API_CONCURRENCY, thread_name_prefix="bugzilla") as executor:
+        futures = {
+            executor.submit(reopen_bug, bugzilla_id, job_id, repository): mapping_id
+            for bugzilla_id, mapping_id, job_id, repository in bugs_to_reopen
+        }
+        for future, mapping_id in futures.items():
             try:
-                message = e.response.json()["message"]
-            except (ValueError, KeyError):
-                message = e.response.text
-            logger.error(f"Reopening bug {str(bugzilla_id)} failed: {message}")
+                if future.result():
+                    reopened.append(mapping_id)
+            except Exception:
+                # the bugs the other requests reopened are still marked as such
+                logger.exception("Reopening a bug failed")
+    # NOTE: this will only toggle 1 bug_job_map entry per bug, not all (if there are retriggers)
+    BugJobMap.objects.filter(id__in=reopened).update(bug_open=True)
 
 
 def fetch_intermittent_bugs(additional_params, limit, duplicate_chain_length):
@@ -100,6 +132,161 @@ def fetch_intermittent_bugs(additional_params, limit, duplicate_chain_length):
     return response.get("bugs", [])
 
 
+def fetch_bug_pages(params, duplicate_chain_length, stop_at_short_page=False):
+    """
+    Yield the bugs of each page of ``params`` (an iterable of request parameters)
+    in order, with up to ``settings.BZ_API_CONCURRENCY`` pages being fetched at
+    once over the shared HTTP session.
+
+    With ``stop_at_short_page``, ``params`` may be endless: the pages after the
+    first one that isn't full aren't fetched, or are discarded.
+    """
+    params = iter(params)
+    with ThreadPoolExecutor(settings.BZ_API_CONCURRENCY, thread_name_prefix="bugzilla") as executor:
+
+        def submit(page_params):
+            return executor.submit(
+                fetch_intermittent_bugs, page_params, BUGS_PAGE_SIZE, duplicate_chain_length
+            )
+
+        futures = deque(
+            submit(page_params)
+            for _, page_params in zip(range(settings.BZ_API_CONCURRENCY), params)
+        )
+        while futures:
+            bugs = futures.popleft().result()
+            yield bugs
+            if stop_at_short_page and len(bugs) < BUGS_PAGE_SIZE:
+                executor.shutdown(cancel_futures=True)
+                return
+            next_params = next(params, None)
+            if next_params is not None:
+                futures.append(submit(next_params))
+
+
+def get_bug_fields(bug, max_summary_length, max_whiteboard_length):
+    # we currently don't support timezones in treeherder, so
+    # just ignore it when importing/updating the bug to avoid
+    # a ValueError
+    return {
+        "status": bug.get("status", ""),
+        "resolution": bug.get("resolution", ""),
+        "summary": bug.get("summary", "")[:max_summary_length],
+        "dupe_of": bug.get("dupe_of", None),
+        "crash_signature": bug.get("cf_crash_signature", ""),
+        "keywords": ",".join(bug["keywords"]),
+        "modified": dateutil.parser.parse(bug["last_change_time"], ignoretz=True),
+        "whiteboard": bug.get("whiteboard", "")[:max_whiteboard_length],
+        "processed_update": True,
+    }
+
+
+def store_bugs(bugs):
+    """
+    Insert or update the Bugscache rows of ``bugs`` (``{bugzilla_id: fields}``),
+    along with placeholders for the bugs they are duplicates of, in bulk.
+    """
+    dupes_of = {fields["dupe_of"] for fields in bugs.values() if fields["dupe_of"] is not None}
+    with transaction.atomic():
+        existing = {
+            bug.bugzilla_id: bug
+            for bug in Bugscache.objects.filter(bugzilla_id__in=set(bugs) | dupes_of)
+        }
+        to_create = [
+            Bugscache(
+                bugzilla_id=dupe_of,
+                modified=datetime(1971, 1, 1),
+                summary="(no bug data fetched)",
+                processed_update=False,
+            )
+            for dupe_of in dupes_of
+            if dupe_of not in existing and dupe_of not in bugs
+        ]
+        to_update = []
+        for bugzilla_id, fields in bugs.items():
+            bug = existing.get(bugzilla_id)
+            if bug is None:
+                to_create.append(Bugscache(bugzilla_id=bugzilla_id, **fields))
+                continue
+            for name, value in fields.items():
+                setattr(bug, name, value)
+            to_update.append(bug)
+        Bugscache.objects.bulk_create(to_create)
+        Bugscache.objects.bulk_update(to_update, BUG_FIELDS)
+
+
+def store_bug(bugzilla_id, fields):
+    """Insert or update a single bug, as ``store_bugs`` does."""
+    dupe_of = fields["dupe_of"]
+    if dupe_of is not None and not Bugscache.objects.filter(bugzilla_id=dupe_of).exists():
+        Bugscache.objects.update_or_create(
+            bugzilla_id=dupe_of,
+            defaults={
+                "modified": datetime(1971, 1, 1),
+                "summary": "(no bug data fetched)",
+                "processed_update": False,
+            },
+        )
+    Bugscache.objects.update_or_create(bugzilla_id=bugzilla_id, defaults=fields)
+
+
+def update_duplicates(duplicates_to_bugs):
+    """
+    Point the duplicate bugs at the open bugs of ``duplicates_to_bugs``, and give
+    them their modification date, in bulk.  Duplicates of bugs that aren't in
+    the Bugscache are left alone.
+    """
+    modified = dict(
+        Bugscache.objects.filter(bugzilla_id__in=set(duplicates_to_bugs.values())).values_list(
+            "bugzilla_id", "modified"
+        )
+    )
+    duplicates = []
+    for bug in Bugscache.objects.filter(bugzilla_id__in=list(duplicates_to_bugs)).only(
+        "id", "bugzilla_id"
+    ):
+        openish = duplicates_to_bugs[bug.bugzilla_id]
+        if openish in modified:
+            bug.dupe_of = openish
+            bug.modified = modified[openish]
+            duplicates.append(bug)
+    Bugscache.objects.bulk_update(duplicates, ["dupe_of", "modified"], batch_size=1000)
+
+
+def move_duplicate_annotations():
+    """Switch the classifications of jobs from duplicate bugs to their open ones."""
+    duplicate_annotations = BugJobMap.objects.filter(
+        bug__bugzilla_id__isnull=False,
+        bug__dupe_of__isnull=False,
+    ).filter(Exists(Bugscache.objects.filter(bugzilla_id=OuterRef("bug__dupe_of"))))
+    # Delete annotations with duplicate bug for jobs which have also been
+    # classified with its open bug, or with another duplicate of it (all but one).
+    duplicate_annotations.filter(
+        Exists(
+            BugJobMap.objects.filter(
+                job_id=OuterRef("job_id"), bug__bugzilla_id=OuterRef("bug__dupe_of")
+            )
+        )
+        | Exists(
+            BugJobMap.objects.filter(
+                job_id=OuterRef("job_id"),
+                bug__bugzilla_id__isnull=False,
+                bug__dupe_of=OuterRef("bug__dupe_of"),
+                id__lt=OuterRef("id"),
+            )
+        )
+    ).delete()
+    duplicate_annotations.update(
+        bug_id=Subquery(
+            Bugscache.objects.filter(
+                bugzilla_id=Subquery(
+                    Bugscache.objects.filter(id=OuterRef(OuterRef("bug_id"))).values("dupe_of")[:1]
+                )
+            ).values("id")[:1]
+        )
+    )
+
+
 class BzApiBugProcess:
     minimum_failures_to_reopen = 3
 
@@ -158,43 +345,40 @@ class BzApiBugProcess:
                 if len(bugs_to_process) == 0:
                     break
 
-            bug_list = []
-            bugs_count_limit = 500
-            bugs_offset = 0
-
-            # Keep querying Bugzilla until there are no more results.
-            while True:
-                if duplicate_chain_length == 0:
-                    additional_params = {
-                        "keywords": "intermittent-failure",
-                        "last_change_time": last_change_time_string,
-                        "offset": bugs_offset,
-                    }
-                else:
-                    additional_params = {
-                        "id": ",".join(
-                            list(
-                                map(
-                                    str,
-                                    bugs_to_process[bugs_offset : bugs_offset + bugs_count_limit],
-                                )
+            if duplicate_chain_length == 0:
+                # Keep querying Bugzilla until there are no more results.
+                pages = fetch_bug_pages(
+                    (
+                        {
+                            "keywords": "intermittent-failure",
+                            "last_change_time": last_change_time_string,
+                            "offset": offset,
+                        }
+                        for offset in count(0, BUGS_PAGE_SIZE)
+                    ),
+                    duplicate_chain_length,
+                    stop_at_short_page=True,
+                )
+            else:
+                pages = fetch_bug_pages(
+                    (
+                        {
+                            "id": ",".join(
+                                map(str, bugs_to_process[offset : offset + BUGS_PAGE_SIZE])
                             )
-                        ),
-                    }
-                bug_results_chunk = fetch_intermittent_bugs(
-                    additional_params, bugs_count_limit, duplicate_chain_length
+                        }
+                        for offset in range(0, len(bugs_to_process), BUGS_PAGE_SIZE)
+                    ),
+                    duplicate_chain_length,
                 )
-                bug_list += bug_results_chunk
-                bugs_offset += bugs_count_limit
-                if duplicate_chain_length == 0 and len(bug_results_chunk) < bugs_count_limit:
-                    break
-                if duplicate_chain_length > 0 and bugs_offset >= len(bugs_to_process):
-                    break
 
             bugs_to_process_next = set()
+            fetched_bugs = False
 
-            if bug_list:
-                if duplicate_chain_length == 0:
+            for bug_list in pages:
+                if not bug_list:
+                    continue
+                if duplicate_chain_length == 0 and not fetched_bugs:
                     Bugscache.objects.exclude(summary="(no bug data fetched)").exclude(
                         bugzilla_id__in=BugJobMap.objects.distinct("bug__bugzilla_id").values_list(
                             "bug__bugzilla_id", flat=True
@@ -203,45 +387,14 @@ class BzApiBugProcess:
                     Bugscache.objects.filter(bugzilla_id__isnull=False).update(
                         processed_update=False
                     )
+                fetched_bugs = True
 
-                for bug in bug_list:
-                    # we currently don't support timezones in treeherder, so
-                    # just ignore it when importing/updating the bug to avoid
-                    # a ValueError
-                    try:
-                        dupe_of = bug.get("dupe_of", None)
-                        if (
-                            dupe_of is not None
-                            and not Bugscache.objects.filter(bugzilla_id=dupe_of).exists()
-                        ):
-                            Bugscache.objects.update_or_create(
-                                bugzilla_id=dupe_of,
-                                defaults={
-                                    "modified": datetime(1971, 1, 1),
-                                    "summary": "(no bug data fetched)",
-                                    "processed_update": False,
-                                },
-                            )
-                        Bugscache.objects.update_or_create(
-                            bugzilla_id=bug["id"],
-                            defaults={
-                                "status": bug.get("status", ""),
-                                "resolution": bug.get("resolution", ""),
-                                "summary": bug.get("summary", "")[:max_summary_length],
-                                "dupe_of": dupe_of,
-                                "crash_signature": bug.get("cf_crash_signature", ""),
-                                "keywords": ",".join(bug["keywords"]),
-                                "modified": dateutil.parser.parse(
-                                    bug["last_change_time"], ignoretz=True
-                                ),
-                                "whiteboard": bug.get("whiteboard", "")[:max_whiteboard_length],
-                                "processed_update": True,
-                            },
-                        )
-                    except Exception as e:
-                        logger.error("error inserting bug '%s' into db: %s", bug, e)
-                        insert_errors_observed = True
-                        continue
+                stored_bugs, errors_observed = self._store_page(
+                    bug_list, max_summary_length, max_whiteboard_length
+                )
+                insert_errors_observed |= errors_observed
+                for bug in stored_bugs:
+                    dupe_of = bug.get("dupe_of", None)
                     if dupe_of is not None:
                         openish = (
                             duplicates_to_bugs[dupe_of]
@@ -305,39 +458,10 @@ class BzApiBugProcess:
         # the bug against which they have been set as duplicate to prevent them
         # from getting dropped - they are still needed to match the failure line
         # against the bug summary.
-        for bug_duplicate, bug_openish in duplicates_to_bugs.items():
-            bug_openish_object = Bugscache.objects.filter(bugzilla_id=bug_openish)
-            if len(bug_openish_object) == 0:
-                # Script does not have access to open bug but to duplicate
-                continue
-            Bugscache.objects.filter(bugzilla_id=bug_duplicate).update(
-                dupe_of=bug_openish, modified=bug_openish_object[0].modified
-            )
+        update_duplicates(duplicates_to_bugs)
 
         # Switch classifications from duplicate bugs to open ones.
-        duplicates_db = set(
-            Bugscache.objects.filter(dupe_of__isnull=False, bugzilla_id__isnull=False).values_list(
-                "bugzilla_id", flat=True
-            )
-        )
-        bugs_used = set(
-            BugJobMap.objects.filter(bug__bugzilla_id__isnull=False).values_list(
-                "bug__bugzilla_id", flat=True
-            )
-        )
-        duplicates_used = duplicates_db & bugs_used
-        for bugzilla_id in duplicates_used:
-            dupe_of = Bugscache.objects.get(bugzilla_id=bugzilla_id).dupe_of
-            # Jobs both already classified with new duplicate and its open bug.
-            jobs_openish = list(
-                BugJobMap.objects.filter(bug__bugzilla_id=dupe_of).values_list("job_id", flat=True)
-            )
-            # Delete annotations with duplicate bug for jobs which have also
-            # been classified with the open bug of a duplicate bug.
-            BugJobMap.objects.filter(bug__bugzilla_id=bugzilla_id, job_id__in=jobs_openish).delete()
-            BugJobMap.objects.filter(bug__bugzilla_id=bugzilla_id).update(
-                bug_id=Bugscache.objects.get(bugzilla_id=dupe_of)
-            )
+        move_duplicate_annotations()
 
         # Delete open bugs and related duplicates if modification date (of open
         # bug) is too old.
@@ -358,4 +482,39 @@ class BzApiBugProcess:
                 modified__gt=last_change_time_max, bugzilla_id__isnull=False
             ).update(modified=last_change_time_max)
 
+        # Make the bug suggestion indexes pick up the changes.
+        bump_generation()
+
         reopen_intermittent_bugs(self.minimum_failures_to_reopen)
+
+    def _store_page(self, bug_list, max_summary_length, max_whiteboard_length):
+        """
+        Store a page of bugs from Bugzilla, returning the bugs stored and whether
+        some of them couldn't be.
+        """
+        errors_observed = False
+        bugs = {}
+        stored_bugs = []
+        for bug in bug_list:
+            try:
+                bugs[bug["id"]] = get_bug_fields(bug, max_summary_length, max_whiteboard_length)
+            except Exception as e:
+                logger.error("error inserting bug '%s' into db: %s", bug, e)
+                errors_observed = True
+                continue
+            stored_bugs.append(bug)
+
+        try:
+            store_bugs(bugs)
+        except Exception:
+            # Find out which bugs are at fault, one by one.
+            stored_bugs, bug_list = [], stored_bugs
+            for bug in bug_list:
+                try:
+                    store_bug(bug["id"], bugs[bug["id"]])
+                except Exception as e:
+                    logger.error("error inserting bug '%s' into db: %s", bug, e)
+                    errors_observed = True
+                    continue
+                stored_bugs.append(bug)
+        return stored_bugs, errors_observed
@@ -9,7 +9,7 @@ from django.conf import settings
 
 from treeherder.etl.common import to_timestamp
 from treeherder.etl.exceptions import MissingPushError
-from treeherder.etl.jobs import store_job_data
+from treeherder.etl.jobs import load_job_logs, store_job_data, store_job_data_bulk
 from treeherder.etl.schema import get_json_schema
 from treeherder.etl.taskcluster_pulse.handler import ignore_task
 from treeherder.model.models import Push, Repository
@@ -62,50 +62,103 @@ class JobLoader:
     PLATFORM_FIELD_MAP = {"build_platform": "buildMachine", "machine_platform": "runMachine"}
 
     def process_job(self, pulse_job, root_url):
-        with settings.STATSD_CLIENT.timer("process_job_validate"):
-            is_valid = self._is_valid_job(pulse_job)
-        if is_valid:
+        prepared = self._prepare_job(pulse_job)
+        if prepared:
+            repository, transformed_job = prepared
+            with settings.STATSD_CLIENT.timer("process_job_store"):
+                store_job_data(repository, [transformed_job])
+            # Returning the transformed_job is only for testing purposes
+            return transformed_job
+
+    def process_jobs(self, pulse_jobs, root_url):
+        """
+        Validate, transform and store several jobs, in bulk per repository.
+
+        ``pulse_jobs`` is a list of ``(key, pulse_job)`` pairs, and the keys of
+        the jobs that could not be stored are returned, so that the caller can
+        retry them individually.  Should a bulk store fail, its jobs are stored
+        one at a time instead, so one bad job doesn't fail the whole batch.
+        """
+        failed = []
+        by_repository = {}
+        for key, pulse_job in pulse_jobs:
             try:
-                with settings.STATSD_CLIENT.timer("process_job_transform"):
-                    project = pulse_job["origin"]["project"]
-                    newrelic.agent.add_custom_attribute("project", project)
-
-                    repository = Repository.objects.get(name=project)
-                    if repository.active_status != "active":
-                        (real_task_id, _) = task_and_retry_ids(pulse_job["taskId"])
-                        logger.debug(
-                            "Task %s belongs to a repository that is not active.", real_task_id
-                        )
-                        return
-
-                    # Set origin data based on the repo url
-                    parsed_url = urlparse(repository.url)
-                    is_github = parsed_url.netloc == "github.com"
-                    pulse_job["origin"]["kind"] = parsed_url.netloc
-
-                    if origin_id := pulse_job["origin"].pop("id", None):
-                        key = "pullRequestID" if is_github else "pushLogID"
-                        pulse_job["origin"][key] = origin_id
-
-                    if is_github and parsed_url.path:
-                        path_parts = parsed_url.path.strip("/").split("/")
-                        if len(path_parts) >= 2:
-                            pulse_job["origin"]["owner"] = path_parts[0]
-
-                    transformed_job = None
+                prepared = self._prepare_job(pulse_job)
+            except Exception:
+                # e.g. a MissingPushError, which the individual retry will wait out
+                failed.append(key)
+                continue
+            if prepared:
+                repository, transformed_job = prepared
+                by_repository.setdefault(repository.id, (repository, []))[1].append(
+                    (key, transformed_job)
+                )
+
+        for repository, jobs in by_repository.values():
+            try:
+                with settings.STATSD_CLIENT.timer("process_jobs_store"):
+                    store_job_data_bulk(repository, [job for _, job in jobs])
+            except Exception:
+                logger.warning(
+                    "Bulk storing %s jobs for %s failed, storing them one at a time",
+                    len(jobs),
+                    repository.name,
+                    exc_info=True,
+                )
+                settings.STATSD_CLIENT.incr("process_jobs_store.fallback")
+                for key, job in jobs:
                     try:
-                        self.validate_revision(repository, pulse_job)
-                        transformed_job = self.transform(pulse_job)
-                    except AttributeError:
-                        logger.warning("Skipping job due to bad attribute", exc_info=1)
-
-                if transformed_job:
-                    with settings.STATSD_CLIENT.timer("process_job_store"):
-                        store_job_data(repository, [transformed_job])
-                        # Returning the transformed_job is only for testing purposes
-                        return transformed_job
-            except Repository.DoesNotExist:
-                logger.info("Job with unsupported project: %s", project)
+                        store_job_data(repository, [job])
+                    except Exception:
+                        failed.append(key)
+        return failed
+
+    def _prepare_job(self, pulse_job):
+        """Return the repository and transformed job for ``pulse_job``, if it should be stored."""
+        with settings.STATSD_CLIENT.timer("process_job_validate"):
+            is_valid = self._is_valid_job(pulse_job)
+        if not is_valid:
+            return None
+        try:
+            with settings.STATSD_CLIENT.timer("process_job_transform"):
+                project = pulse_job["origin"]["project"]
+                newrelic.agent.add_custom_attribute("project", project)
+
+                repository = Repository.objects.get(name=project)
+                if repository.active_status != "active":
+                    (real_task_id, _) = task_and_retry_ids(pulse_job["taskId"])
+                    logger.debug(
+                        "Task %s belongs to a repository that is not active.", real_task_id
+                    )
+                    return None
+
+                # Set origin data based on the repo url
+                parsed_url = urlparse(repository.url)
+                is_github = parsed_url.netloc == "github.com"
+                pulse_job["origin"]["kind"] = parsed_url.netloc
+
+                if origin_id := pulse_job["origin"].pop("id", None):
+                    key = "pullRequestID" if is_github else "pushLogID"
+                    pulse_job["origin"][key] = origin_id
+
+                if is_github and parsed_url.path:
+                    path_parts = parsed_url.path.strip("/").split("/")
+                    if len(path_parts) >= 2:
+                        pulse_job["origin"]["owner"] = path_parts[0]
+
+                transformed_job = None
+                try:
+                    self.validate_revision(repository, pulse_job)
+                    transformed_job = self.transform(pulse_job)
+                except AttributeError:
+                    logger.warning("Skipping job due to bad attribute", exc_info=1)
+        except Repository.DoesNotExist:
+            logger.info("Job with unsupported project: %s", project)
+            return None
+
+        if transformed_job:
+            return repository, transformed_job
+        return None
 
     def validate_revision(self, repository, pulse_job):
         revision = pulse_job["origin"].get("revision")
@@ -191,8 +244,32 @@ class JobLoader:
         except Exception:
             pass
 
+        # The artifacts of a run that started weren't listed during ingestion (see
+        # add_artifact_uploaded_links), so have them looked up once the job is stored.
+        if (
+            settings.LAZY_ARTIFACT_LINKS
+            and pulse_job["state"] == "completed"
+            and "timeStarted" in pulse_job
+            and "taskcluster_task_id" in x["job"]
+        ):
+            x["job"]["artifact_references_pending"] = True
+
         return x
 
+    def store_artifact_references(self, job, links):
+        """
+        Store the errorsummary and perfherder data references found in the
+        "artifact uploaded" ``links`` of a stored job, scheduling them for parsing.
+        """
+        job_info = {"jobInfo": {"links": links}}
+        load_job_logs(
+            job,
+            job.result,
+            job.repository,
+            self._get_errorsummary_log_references(job_info),
+            self._get_perfherder_data_references(job_info),
+        )
+
     def _get_job_symbol(self, job):
         return "{}{}".format(job["display"].get("jobSymbol", ""), job["display"].get("chunkId", ""))
 
@@ -6,8 +6,10 @@ from datetime import datetime
 from hashlib import sha1
 
 import newrelic.agent
+from celery import group
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.utils import IntegrityError
 
 from treeherder.etl.common import get_guid_root
@@ -27,9 +29,43 @@ from treeherder.model.models import (
     ReferenceDataSignatures,
     TaskclusterMetadata,
 )
+from treeherder.model.reference_data import reference_data_cache
 
 logger = logging.getLogger(__name__)
 
+SHERIFFED_REPOS = {
+    "autoland",
+    "mozilla-central",
+    "mozilla-beta",
+    "mozilla-release",
+    "mozilla-esr115",
+    "mozilla-esr140",
+    "mozilla-esr153",
+    "reference-browser",
+    "toolchains",
+}
+
+# Fields of an existing job that are updated when newer data for it is ingested.
+JOB_UPDATE_FIELDS = (
+    "guid",
+    "signature_id",
+    "build_platform_id",
+    "machine_platform_id",
+    "machine_id",
+    "option_collection_hash",
+    "job_type_id",
+    "job_group_id",
+    "product_id",
+    "result",
+    "state",
+    "tier",
+    "submit_time",
+    "start_time",
+    "end_time",
+    "last_modified",
+    "push_id",
+)
+
 
 def _get_number(s):
     try:
@@ -77,32 +113,7 @@ def _remove_existing_jobs(data):
     return new_data
 
 
-@settings.STATSD_CLIENT.timer("load_job")
-def _load_job(repository, job_datum, push_id):
-    """
-    Load a job into the treeherder database
-
-    If the job is a ``retry`` the ``job_guid`` will have a special
-    suffix on it.  But the matching ``pending``/``running`` job will not.
-    So we append the suffixed ``job_guid`` to ``retry_job_guids``
-    so that we can update the job_id_lookup later with the non-suffixed
-    ``job_guid`` (root ``job_guid``). Then we can find the right
-    ``pending``/``running`` job and update it with this ``retry`` job.
-    """
-    build_platform, _ = BuildPlatform.objects.get_or_create(
-        os_name=job_datum.get("build_platform", {}).get("os_name", "unknown"),
-        platform=job_datum.get("build_platform", {}).get("platform", "unknown"),
-        architecture=job_datum.get("build_platform", {}).get("architecture", "unknown"),
-    )
-
-    machine_platform, _ = MachinePlatform.objects.get_or_create(
-        os_name=job_datum.get("machine_platform", {}).get("os_name", "unknown"),
-        platform=job_datum.get("machine_platform", {}).get("platform", "unknown"),
-        architecture=job_datum.get("machine_platform", {}).get("architecture", "unknown"),
-    )
-
-    option_names = job_datum.get("option_collection", [])
-    option_collection_hash = OptionCollection.calculate_hash(option_names)
+def _create_option_collection(option_collection_hash, option_names):
     if not OptionCollection.objects.filter(option_collection_hash=option_collection_hash).exists():
         # in the unlikely event that we haven't seen this set of options
         # before, add the appropriate database rows
@@ -114,22 +125,54 @@ def _load_job(repository, job_datum, push_id):
             OptionCollection.objects.create(
                 option_collection_hash=option_collection_hash, option=option
             )
+    return option_collection_hash
 
-    machine, _ = Machine.objects.get_or_create(name=job_datum.get("machine", "unknown"))
 
-    job_type, _ = JobType.objects.get_or_create(
-        symbol=job_datum.get("job_symbol") or "unknown", name=job_datum.get("name") or "unknown"
-    )
+def _get_job_values(repository, job_datum):
+    """
+    Resolve the reference data of ``job_datum`` and return the values of the
+    ``Job`` fields derived from it, keyed by field name.
+    """
+    build_platform = {
+        "os_name": job_datum.get("build_platform", {}).get("os_name", "unknown"),
+        "platform": job_datum.get("build_platform", {}).get("platform", "unknown"),
+        "architecture": job_datum.get("build_platform", {}).get("architecture", "unknown"),
+    }
+    build_platform_id = reference_data_cache.get_id(BuildPlatform, **build_platform)
 
-    job_group, _ = JobGroup.objects.get_or_create(
-        name=job_datum.get("group_name") or "unknown",
-        symbol=job_datum.get("group_symbol") or "unknown",
+    machine_platform = {
+        "os_name": job_datum.get("machine_platform", {}).get("os_name", "unknown"),
+        "platform": job_datum.get("machine_platform", {}).get("platform", "unknown"),
+        "architecture": job_datum.get("machine_platform", {}).get("architecture", "unknown"),
+    }
+    machine_platform_id = reference_data_cache.get_id(MachinePlatform, **machine_platform)
+
+    option_names = job_datum.get("option_collection", [])
+    option_collection_hash = OptionCollection.calculate_hash(option_names)
+    reference_data_cache.resolve(
+        OptionCollection,
+        {"option_collection_hash": option_collection_hash},
+        lambda: _create_option_collection(option_collection_hash, option_names),
     )
 
+    machine_id = reference_data_cache.get_id(Machine, name=job_datum.get("machine", "unknown"))
+
+    job_type = {
+        "symbol": job_datum.get("job_symbol") or "unknown",
+        "name": job_datum.get("name") or "unknown",
+    }
+    job_type_id = reference_data_cache.get_id(JobType, **job_type)
+
+    job_group = {
+        "name": job_datum.get("group_name") or "unknown",
+        "symbol": job_datum.get("group_symbol") or "unknown",
+    }
+    job_group_id = reference_data_cache.get_id(JobGroup, **job_group)
+
     product_name = job_datum.get("product_name", "unknown")
     if not product_name.strip():
         product_name = "unknown"
-    product, _ = Product.objects.get_or_create(name=product_name)
+    product_id = reference_data_cache.get_id(Product, name=product_name)
 
     job_guid = job_datum["job_guid"]
     job_guid = job_guid[0:50]
@@ -147,7 +190,11 @@ def _load_job(repository, job_datum, push_id):
 
     reference_data_name = job_datum.get("reference_data_name", None)
 
-    default_failure_classification = FailureClassification.objects.get(name="not classified")
+    default_failure_classification_id = reference_data_cache.resolve(
+        FailureClassification,
+        {"name": "not classified"},
+        lambda: FailureClassification.objects.get(name="not classified").id,
+    )
 
     sh = sha1()
     sh.update(
@@ -157,16 +204,16 @@ def _load_job(repository, job_datum, push_id):
                 [
                     build_system_type,
                     repository.name,
-                    build_platform.os_name,
-                    build_platform.platform,
-                    build_platform.architecture,
-                    machine_platform.os_name,
-                    machine_platform.platform,
-                    machine_platform.architecture,
-                    job_group.name,
-                    job_group.symbol,
-                    job_type.name,
-                    job_type.symbol,
+                    build_platform["os_name"],
+                    build_platform["platform"],
+                    build_platform["architecture"],
+                    machine_platform["os_name"],
+                    machine_platform["platform"],
+                    machine_platform["architecture"],
+                    job_group["name"],
+                    job_group["symbol"],
+                    job_type["name"],
+                    job_type["symbol"],
                     option_collection_hash,
                     reference_data_name,
                 ],
@@ -180,23 +227,24 @@ def _load_job(repository, job_datum, push_id):
     if not reference_data_name:
         reference_data_name = signature_hash
 
-    signature, _ = ReferenceDataSignatures.objects.get_or_create(
+    signature_id = reference_data_cache.get_id(
+        ReferenceDataSignatures,
         name=reference_data_name,
         signature=signature_hash,
         build_system_type=build_system_type,
         repository=repository.name,
         defaults={
             "first_submission_timestamp": time.time(),
-            "build_os_name": build_platform.os_name,
-            "build_platform": build_platform.platform,
-            "build_architecture": build_platform.architecture,
-            "machine_os_name": machine_platform.os_name,
-            "machine_platform": machine_platform.platform,
-            "machine_architecture": machine_platform.architecture,
-            "job_group_name": job_group.name,
-            "job_group_symbol": job_group.symbol,
-            "job_type_name": job_type.name,
-            "job_type_symbol": job_type.symbol,
+            "build_os_name": build_platform["os_name"],
+            "build_platform": build_platform["platform"],
+            "build_architecture": build_platform["architecture"],
+            "machine_os_name": machine_platform["os_name"],
+            "machine_platform": machine_platform["platform"],
+            "machine_architecture": machine_platform["architecture"],
+            "job_group_name": job_group["name"],
+            "job_group_symbol": job_group["symbol"],
+            "job_type_name": job_type["name"],
+            "job_type_symbol": job_type["symbol"],
             "option_collection_hash": option_collection_hash,
         },
     )
@@ -209,6 +257,45 @@ def _load_job(repository, job_datum, push_id):
     start_time = datetime.fromtimestamp(_get_number(job_datum.get("start_timestamp")))
     end_time = datetime.fromtimestamp(_get_number(job_datum.get("end_timestamp")))
 
+    return {
+        "guid": job_guid,
+        "signature_id": signature_id,
+        "build_platform_id": build_platform_id,
+        "machine_platform_id": machine_platform_id,
+        "machine_id": machine_id,
+        "option_collection_hash": option_collection_hash,
+        "job_type_id": job_type_id,
+        "job_group_id": job_group_id,
+        "product_id": product_id,
+        "failure_classification_id": default_failure_classification_id,
+        "who": who,
+        "reason": reason,
+        "result": result,
+        "state": state,
+        "tier": tier,
+        "submit_time": submit_time,
+        "start_time": start_time,
+        "end_time": end_time,
+    }
+
+
+@settings.STATSD_CLIENT.timer("load_job")
+def _load_job(repository, job_datum, push_id):
+    """
+    Load a job into the treeherder database
+
+    If the job is a ``retry`` the ``job_guid`` will have a special
+    suffix on it.  But the matching ``pending``/``running`` job will not.
+    So we append the suffixed ``job_guid`` to ``retry_job_guids``
+    so that we can update the job_id_lookup later with the non-suffixed
+    ``job_guid`` (root ``job_guid``). Then we can find the right
+    ``pending``/``running`` job and update it with this ``retry`` job.
+    """
+    values = _get_job_values(repository, job_datum)
+    values["push_id"] = push_id
+    values["last_modified"] = datetime.now()
+    job_guid = values["guid"]
+
     # first, try to create the job with the given guid (if it doesn't
     # exist yet)
     job_guid_root = get_guid_root(job_guid)
@@ -218,31 +305,7 @@ def _load_job(repository, job_datum, push_id):
         # it, but allow it to skip if it's the same guid.  The odds are
         # extremely high that this is a pending and running job that came in
         # quick succession and are being processed by two different workers.
-        Job.objects.get_or_create(
-            guid=job_guid,
-            defaults={
-                "repository": repository,
-                "signature": signature,
-                "build_platform": build_platform,
-                "machine_platform": machine_platform,
-                "machine": machine,
-                "option_collection_hash": option_collection_hash,
-                "job_type": job_type,
-                "job_group": job_group,
-                "product": product,
-                "failure_classification": default_failure_classification,
-                "who": who,
-                "reason": reason,
-                "result": result,
-                "state": state,
-                "tier": tier,
-                "submit_time": submit_time,
-                "start_time": start_time,
-                "end_time": end_time,
-                "last_modified": datetime.now(),
-                "push_id": push_id,
-            },
-        )
+        Job.objects.get_or_create(guid=job_guid, defaults={"repository": repository, **values})
     # Can't just use the ``job`` we would get from the ``get_or_create``
     # because we need to try the job_guid_root instance first for update,
     # rather than a possible retry job instance.
@@ -263,80 +326,112 @@ def _load_job(repository, job_datum, push_id):
             pass
 
     # Update job with any data that would have changed
-    Job.objects.filter(id=job.id).update(
-        guid=job_guid,
-        signature=signature,
-        build_platform=build_platform,
-        machine_platform=machine_platform,
-        machine=machine,
-        option_collection_hash=option_collection_hash,
-        job_type=job_type,
-        job_group=job_group,
-        product=product,
-        result=result,
-        state=state,
-        tier=tier,
-        submit_time=submit_time,
-        start_time=start_time,
-        end_time=end_time,
-        last_modified=datetime.now(),
-        push_id=push_id,
+    Job.objects.filter(id=job.id).update(**{field: values[field] for field in JOB_UPDATE_FIELDS})
+
+    tasks = _load_job_logs(
+        job,
+        values["result"],
+        repository,
+        job_datum.get("log_references", []),
+        job_datum.get("perfherder_data_references", []),
     )
+    if job_datum.get("artifact_references_pending"):
+        tasks.append(_get_artifact_references_task(job, values["result"], repository))
+    _publish_tasks(tasks)
 
+    return job_guid
+
+
+def load_job_logs(job, result, repository, log_refs, perfherder_data_refs):
+    """
+    Create the ``JobLog`` rows of a job's log and perfherder data references,
+    and schedule the ones that are pending for parsing.
+    """
+    _publish_tasks(_load_job_logs(job, result, repository, log_refs, perfherder_data_refs))
+
+
+def _load_job_logs(job, result, repository, log_refs, perfherder_data_refs):
+    """Create a job's ``JobLog`` rows, returning the tasks that parse the pending ones."""
     job_log_status_map = dict([(k, v) for (v, k) in JobLog.STATUSES])
-    log_refs = job_datum.get("log_references", [])
-    job_logs = []
-    if log_refs:
-        for log in log_refs:
-            name = log.get("name") or "unknown"
-            name = name[0:50]
-
-            url = log.get("url") or "unknown"
-            url = url[0:255]
-
-            mapped_status = job_log_status_map.get(log.get("parse_status"))
-            if mapped_status:
-                parse_status = mapped_status
-            else:
-                parse_status = JobLog.PENDING
-
-            jl, _ = JobLog.objects.get_or_create(
-                job=job, name=name, url=url, defaults={"status": parse_status}
-            )
+    log_refs = [_get_log_reference(log, job_log_status_map) for log in log_refs]
+    perfherder_data_refs = [
+        _get_log_reference(ref, job_log_status_map) for ref in perfherder_data_refs
+    ]
+    job_logs_by_key = _create_job_logs(
+        [(job, name, url, parse_status) for name, url, parse_status in log_refs]
+        + [(job, name, url, parse_status) for name, url, parse_status in perfherder_data_refs]
+    )
 
-            job_logs.append(jl)
+    job_logs = [job_logs_by_key[(job.id, name, url)] for name, url, _ in log_refs]
+    perfherder_datas = [
+        job_logs_by_key[(job.id, name, url)] for name, url, _ in perfherder_data_refs
+    ]
+    tasks = _get_log_parsing_tasks(job, job_logs, result, repository)
+    tasks.extend(_get_perfherder_ingest_tasks(job, perfherder_datas))
+    return tasks
 
-        _schedule_log_parsing(job, job_logs, result, repository)
 
-    perfherder_data_refs = job_datum.get("perfherder_data_references", [])
-    perfherder_datas = []
-    if perfherder_data_refs:
-        for perfherder_data in perfherder_data_refs:
-            name = perfherder_data.get("name") or "unknown"
-            name = name[0:50]
+def _create_job_logs(log_refs):
+    """
+    Create the ``JobLog`` rows of ``(job, name, url, status)`` references, keeping
+    the status of any that already exist, and return them by ``(job_id, name, url)``.
+    """
+    if not log_refs:
+        return {}
+    JobLog.objects.bulk_create(
+        [JobLog(job=job, name=name, url=url, status=status) for job, name, url, status in log_refs],
+        ignore_conflicts=True,
+    )
+    return {
+        (job_log.job_id, job_log.name, job_log.url): job_log
+        for job_log in JobLog.objects.filter(job__in={job.id for job, _, _, _ in log_refs})
+    }
 
-            url = perfherder_data.get("url") or "unknown"
-            url = url[0:255]
 
-            mapped_status = job_log_status_map.get(perfherder_data.get("parse_status"))
-            if mapped_status:
-                parse_status = mapped_status
-            else:
-                parse_status = JobLog.PENDING
+def _get_log_reference(log, job_log_status_map):
+    """Return the ``JobLog`` name, url and status for a log reference."""
+    name = log.get("name") or "unknown"
+    name = name[0:50]
 
-            jl, _ = JobLog.objects.get_or_create(
-                job=job, name=name, url=url, defaults={"status": parse_status}
-            )
+    url = log.get("url") or "unknown"
+    url = url[0:255]
 
-            perfherder_datas.append(jl)
+    mapped_status = job_log_status_map.get(log.get("parse_status"))
+    if mapped_status:
+        parse_status = mapped_status
+    else:
+        parse_status = JobLog.PENDING
 
-        _schedule_perfherder_ingest(job, perfherder_datas)
+    return name, url, parse_status
 
-    return job_guid
+
+def _get_log_parser_queue(log_name, result, repository):
+    """Return the queue and priority for parsing a log of a job with the given result."""
+    # TODO: Replace the use of different queues for failures vs not with the
+    # RabbitMQ priority feature (since the idea behind separate queues was
+    # only to ensure failures are dealt with first if there is a backlog).
+    if result == "success":
+        return "log_parser", "normal"
+
+    if log_name == "errorsummary_json":
+        queue = "log_parser_fail_json"
+    else:
+        queue = "log_parser_fail_raw"
+    if repository.name in SHERIFFED_REPOS:
+        queue += "_sheriffed"
+    else:
+        queue += "_unsheriffed"
+    return queue, "failures"
 
 
-def _schedule_log_parsing(job, job_logs, result, repository):
-    """Kick off the initial task that parses the log data.
+def _publish_tasks(tasks):
+    """Publish task signatures as one group, so they share a broker connection."""
+    if tasks:
+        group(tasks).apply_async()
+
+
+def _get_log_parsing_tasks(job, job_logs, result, repository):
+    """Return the initial tasks that parse the log data.
 
     log_data is a list of job log objects and the result for that job
     """
@@ -345,19 +440,8 @@ def _schedule_log_parsing(job, job_logs, result, repository):
     from treeherder.log_parser.tasks import parse_logs
 
     task_types = {"errorsummary_json", "live_backing_log"}
-    sheriffed_repos = {
-        "autoland",
-        "mozilla-central",
-        "mozilla-beta",
-        "mozilla-release",
-        "mozilla-esr115",
-        "mozilla-esr140",
-        "mozilla-esr153",
-        "reference-browser",
-        "toolchains",
-    }
 
-    job_log_ids = []
+    pending_logs = []
     for job_log in job_logs:
         # a log can be submitted already parsed.  So only schedule
         # a parsing task if it's ``pending``
@@ -370,39 +454,61 @@ def _schedule_log_parsing(job, job_logs, result, repository):
         if job_log.name not in task_types:
             continue
 
-        job_log_ids.append(job_log.id)
-
-        # TODO: Replace the use of different queues for failures vs not with the
-        # RabbitMQ priority feature (since the idea behind separate queues was
-        # only to ensure failures are dealt with first if there is a backlog).
-        if result != "success":
-            if job_log.name == "errorsummary_json":
-                queue = "log_parser_fail_json"
-                priority = "failures"
-            else:
-                queue = "log_parser_fail_raw"
-                priority = "failures"
-            if repository.name in sheriffed_repos:
-                queue += "_sheriffed"
-            else:
-                queue += "_unsheriffed"
-        else:
-            queue = "log_parser"
-            priority = "normal"
+        queue, priority = _get_log_parser_queue(job_log.name, result, repository)
+        pending_logs.append((job_log, queue, priority))
 
-        parse_logs.apply_async(queue=queue, args=[job.id, [job_log.id], priority])
+    if not pending_logs:
+        return []
+
+    if settings.LOG_PARSER_BATCH_PER_JOB:
+        # Parse all of the job's logs in one task, so they share the job lookup and
+        # the intermittent check runs once.  The errorsummary queue wins if present,
+        # since that's the log that drives classification.
+        _, queue, priority = next(
+            (item for item in pending_logs if item[0].name == "errorsummary_json"),
+            pending_logs[0],
+        )
+        job_log_ids = [job_log.id for job_log, _, _ in pending_logs]
+        return [parse_logs.signature(args=[job.id, job_log_ids, priority], queue=queue)]
+
+    return [
+        parse_logs.signature(args=[job.id, [job_log.id], priority], queue=queue)
+        for job_log, queue, priority in pending_logs
+    ]
 
 
-def _schedule_perfherder_ingest(job, job_logs):
+def _get_artifact_references_task(job, result, repository):
+    """
+    Return the task that finds the job's errorsummary and perfherder data
+    artifacts, whose listing was left out of ingestion.
+    """
+    from treeherder.etl.tasks.pulse_tasks import store_artifact_references
+
+    # The errorsummary drives classification, so use its queue.
+    queue, _ = _get_log_parser_queue("errorsummary_json", result, repository)
+    return store_artifact_references.signature(args=[job.id], queue=queue)
+
+
+def _get_perfherder_ingest_tasks(job, job_logs):
     from treeherder.perf.tasks import ingest_perfherder_data
 
+    tasks = []
     for job_log in job_logs:
         if job_log.status != JobLog.PENDING:
             continue
 
         job_log_name = job_log.name.replace("-", "_")
         if job_log_name.startswith("perfherder_data"):
-            ingest_perfherder_data.apply_async(queue="perf_ingest", args=[job.id, [job_log.id]])
+            tasks.append(
+                ingest_perfherder_data.signature(args=[job.id, [job_log.id]], queue="perf_ingest")
+            )
+    return tasks
+
+
+def _get_push_id(repository, revision):
+    revision_field = "revision__startswith" if len(revision) < 40 else "revision"
+    filter_kwargs = {"repository": repository, revision_field: revision}
+    return Push.objects.values_list("id", flat=True).get(**filter_kwargs)
 
 
 def store_job_data(repository, original_data):
@@ -465,7 +571,7 @@ def store_job_data(repository, original_data):
     if not data:
         return
 
-    superseded_job_guid_placeholders = []
+    superseded_guids = []
 
     # TODO: Refactor this now that store_job_data() is only over called with one job at a time.
     for datum in data:
@@ -480,18 +586,12 @@ def store_job_data(repository, original_data):
             revision = datum["revision"]
             superseded = datum.get("superseded", [])
 
-            revision_field = "revision__startswith" if len(revision) < 40 else "revision"
-            filter_kwargs = {"repository": repository, revision_field: revision}
-            push_id = Push.objects.values_list("id", flat=True).get(**filter_kwargs)
+            push_id = _get_push_id(repository, revision)
 
             # load job
-            job_guid = _load_job(repository, job, push_id)
+            _load_job(repository, job, push_id)
 
-            for superseded_guid in superseded:
-                superseded_job_guid_placeholders.append(
-                    # superseded by guid, superseded guid
-                    [job_guid, superseded_guid]
-                )
+            superseded_guids.extend(superseded)
         except Exception as e:
             # Surface the error immediately unless running in production, where we'd
             # rather report it on New Relic and not block storing the remaining jobs.
@@ -510,8 +610,166 @@ def store_job_data(repository, original_data):
             continue
 
     # Update the result/state of any jobs that were superseded by those ingested above.
-    if superseded_job_guid_placeholders:
-        for job_guid, superseded_by_guid in superseded_job_guid_placeholders:
-            Job.objects.filter(guid=superseded_by_guid).update(
-                result="superseded", state="completed"
+    if superseded_guids:
+        Job.objects.filter(guid__in=superseded_guids).update(result="superseded", state="completed")
+
+
+def _get_push_ids(repository, revisions):
+    """Map each of ``revisions`` to its push id, in one query for full length revisions."""
+    push_ids = dict(
+        Push.objects.filter(
+            repository=repository, revision__in=[r for r in revisions if len(r) >= 40]
+        ).values_list("revision", "id")
+    )
+    for revision in revisions:
+        if revision not in push_ids:
+            push_ids[revision] = _get_push_id(repository, revision)
+    return push_ids
+
+
+def _split_conflicting_jobs(data):
+    """
+    Split ``data`` into rounds that each contain at most one job per guid root.
+
+    Several events for the same task (e.g. ``pending`` then ``running``, or a
+    ``retry`` run and its successor) may arrive in one batch.  Placing each in
+    a later round than the previous one for the same task applies them in
+    order, exactly as if they had been stored one at a time.
+    """
+    rounds = []
+    last_round = {}
+    for datum in data:
+        root = get_guid_root(datum["job"]["job_guid"])
+        index = last_round.get(root, -1) + 1
+        if index == len(rounds):
+            rounds.append([])
+        rounds[index].append(datum)
+        last_round[root] = index
+    return rounds
+
+
+@settings.STATSD_CLIENT.timer("load_jobs")
+def _load_jobs(repository, data, job_values_by_datum):
+    """
+    Load a round of jobs (see ``_split_conflicting_jobs``) using set-based queries.
+
+    ``job_values_by_datum`` maps ``id(datum)`` to the ``_get_job_values`` of
+    each datum, resolved beforehand.
+
+    This is the bulk equivalent of calling ``_load_job`` for each job.  Log
+    parsing and perfherder ingestion are not scheduled here, since the caller
+    may still roll back; instead a list of ``(job, result, job_logs,
+    perfherder_logs, artifact_references_pending)`` tuples is returned for it
+    to schedule once committed.
+    """
+    push_ids = _get_push_ids(repository, {datum["revision"] for datum in data})
+    now = datetime.now()
+
+    job_values = []
+    for datum in data:
+        values = dict(job_values_by_datum[id(datum)])
+        values["push_id"] = push_ids[datum["revision"]]
+        values["last_modified"] = now
+        job_values.append((values, datum["job"]))
+
+    guids = {values["guid"] for values, _ in job_values}
+    roots = {get_guid_root(guid) for guid in guids}
+    jobs_by_guid = {job.guid: job for job in Job.objects.filter(guid__in=guids | roots)}
+
+    # As in ``_load_job``, only create a job if neither its guid nor its root
+    # exists yet, and tolerate another worker having just created it.
+    new_jobs = [
+        Job(repository=repository, **values)
+        for values, _ in job_values
+        if values["guid"] not in jobs_by_guid and get_guid_root(values["guid"]) not in jobs_by_guid
+    ]
+    if new_jobs:
+        Job.objects.bulk_create(new_jobs, ignore_conflicts=True)
+        jobs_by_guid.update(
+            (job.guid, job) for job in Job.objects.filter(guid__in=[j.guid for j in new_jobs])
+        )
+
+    jobs = []
+    taskcluster_metadata = []
+    for values, job_datum in job_values:
+        # Update the job_guid_root instance in preference to a retry job instance.
+        job = jobs_by_guid.get(get_guid_root(values["guid"])) or jobs_by_guid[values["guid"]]
+        if all([k in job_datum for k in ["taskcluster_task_id", "taskcluster_retry_id"]]):
+            taskcluster_metadata.append(
+                TaskclusterMetadata(
+                    job=job,
+                    task_id=job_datum["taskcluster_task_id"],
+                    retry_id=job_datum["taskcluster_retry_id"],
+                )
             )
+        for field in JOB_UPDATE_FIELDS:
+            setattr(job, field, values[field])
+        jobs.append((job, job_datum))
+
+    TaskclusterMetadata.objects.bulk_create(taskcluster_metadata, ignore_conflicts=True)
+    Job.objects.bulk_update([job for job, _ in jobs], JOB_UPDATE_FIELDS)
+
+    # Create the logs of every job at once, keeping the status of any that exist.
+    job_log_status_map = dict([(k, v) for (v, k) in JobLog.STATUSES])
+    log_refs = []
+    for job, job_datum in jobs:
+        for ref_type in ("log_references", "perfherder_data_references"):
+            for log in job_datum.get(ref_type, []):
+                name, url, parse_status = _get_log_reference(log, job_log_status_map)
+                log_refs.append((job, ref_type, name, url, parse_status))
+    job_logs_by_key = _create_job_logs(
+        [(job, name, url, parse_status) for job, _, name, url, parse_status in log_refs]
+    )
+
+    loaded = {
+        job.id: (job, job.result, [], [], job_datum.get("artifact_references_pending", False))
+        for job, job_datum in jobs
+    }
+    for job, ref_type, name, url, _ in log_refs:
+        logs = loaded[job.id][2 if ref_type == "log_references" else 3]
+        logs.append(job_logs_by_key[(job.id, name, url)])
+    return list(loaded.values())
+
+
+def store_job_data_bulk(repository, original_data):
+    """
+    Store a batch of job data instances, using set-based queries.
+
+    Takes the same data as ``store_job_data``, but writes every job of the
+    batch with a handful of queries inside one transaction, so that either all
+    of the jobs are stored or none are.  Errors are always raised, leaving it
+    to the caller to fall back to storing the jobs one at a time.
+    """
+    data = copy.deepcopy(original_data)
+    if not data:
+        return
+
+    # Reference data is resolved outside of the transaction: the rows it
+    # creates are committed (and cached) even if the batch is rolled back, so
+    # the one at a time fallback finds them.
+    job_values_by_datum = {id(datum): _get_job_values(repository, datum["job"]) for datum in data}
+
+    loaded = []
+    superseded = []
+    with transaction.atomic():
+        for data_round in _split_conflicting_jobs(data):
+            # the state transition checks are repeated for each round, so that
+            # they see the jobs stored by the previous one
+            data_round = _remove_existing_jobs(data_round)
+            if not data_round:
+                continue
+            loaded.extend(_load_jobs(repository, data_round, job_values_by_datum))
+            for datum in data_round:
+                superseded.extend(datum.get("superseded", []))
+
+        if superseded:
+            Job.objects.filter(guid__in=superseded).update(result="superseded", state="completed")
+
+    # Publish the tasks of every job in the batch together.
+    tasks = []
+    for job, result, job_logs, perfherder_logs, artifact_references_pending in loaded:
+        tasks.extend(_get_log_parsing_tasks(job, job_logs, result, repository))
+        tasks.extend(_get_perfherder_ingest_tasks(job, perfherder_logs))
+        if artifact_references_pending:
+            tasks.append(_get_artifact_references_task(job, result, repository))
+    _publish_tasks(tasks)
@@ -0,0 +1,112 @@
+from datetime import datetime
+
+import simplejson as json
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from treeherder.etl.push import store_push_data
+from treeherder.model.models import Commit, Push, Repository
+from treeherder.utils.benchmark import StageTimer, maybe_profile
+
+
+def make_synthetic_pushes(num_pushes, commits_per_push, seed):
+    """Return pushes shaped like large merges, each with ``commits_per_push`` commits."""
+    pushes = []
+    for p in range(num_pushes):
+        commits = [
+            {
+                "revision": f"{seed:04x}{p:06x}{c:06x}".ljust(40, "0"),
+                "author": f"Author {c % 50} <author{c % 50}@mozilla.com>",
+                "comment": f"Bug {1000000 + c} - Synthetic commit {c} of push {p}, r=reviewer",
+            }
+            for c in range(commits_per_push)
+        ]
+        pushes.append(
+            {
+                "revision": commits[-1]["revision"],
+                "author": "sheriff@mozilla.com",
+                "push_timestamp": 1700000000 + p,
+                "revisions": commits,
+            }
+        )
+    return pushes
+
+
+def store_push_data_row_by_row(repository, pushes):
+    """Store pushes with an ``update_or_create`` per row, as before the bulk upserts."""
+    for push_dict in pushes:
+        with transaction.atomic():
+            push, _ = Push.objects.update_or_create(
+                repository=repository,
+                revision=push_dict["revision"],
+                defaults={
+                    "author": push_dict["author"],
+                    "time": datetime.utcfromtimestamp(push_dict["push_timestamp"]),
+                    "branch": push_dict.get("branch"),
+                },
+            )
+            for revision in push_dict["revisions"]:
+                Commit.objects.update_or_create(
+                    push=push,
+                    revision=revision["revision"],
+                    defaults={"author": revision["author"], "comments": revision["comment"]},
+                )
+
+
+class Command(BaseCommand):
+    """Management command to benchmark storing pushes with many commits"""
+
+    help = """
+    Stores synthetic pushes (by default shaped like a 1000-commit merge) into the
+    given repository, with both the bulk upserts and the old row-by-row path, and
+    reports timings, throughput and query counts.  Each run is rolled back.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("repository", help="Name of the repository to store pushes into")
+        parser.add_argument("--pushes", type=int, default=5, help="Number of pushes per run")
+        parser.add_argument("--commits", type=int, default=1000, help="Number of commits per push")
+        parser.add_argument("--repeat", type=int, default=3, help="Number of runs per path")
+        parser.add_argument(
+            "--profile-output",
+            default=None,
+            help="Write a cProfile (pstats) profile of the whole run to this path",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        repository = Repository.objects.get(name=options["repository"])
+        timer = StageTimer()
+        queries = {}
+        paths = (("bulk", store_push_data), ("row_by_row", store_push_data_row_by_row))
+
+        with maybe_profile(options["profile_output"]):
+            for run in range(options["repeat"]):
+                pushes = make_synthetic_pushes(options["pushes"], options["commits"], seed=run)
+                num_commits = options["pushes"] * options["commits"]
+                for name, store in paths:
+                    with transaction.atomic():
+                        # the first store inserts, storing again updates every row
+                        for step in ("insert", "update"):
+                            stage = f"{name}_{step}"
+                            with CaptureQueriesContext(connection) as captured:
+                                with timer.time(stage, lines=num_commits):
+                                    store(repository, pushes)
+                            queries[stage] = len(captured)
+                        # Leave the database as we found it.
+                        transaction.set_rollback(True)
+
+        if options["json"]:
+            summary = timer.summary()
+            for row in summary:
+                row["queries"] = queries[row["stage"]]
+            self.stdout.write(json.dumps(summary, indent=2))
+        else:
+            self.stdout.write(
+                f"{options['pushes']} pushes x {options['commits']} commits, "
+                f"{options['repeat']} runs (lines/s is commits/s)"
+            )
+            self.stdout.write(timer.format_summary())
+            for stage, count in queries.items():
+                self.stdout.write(f"{stage}: {count} queries per run")
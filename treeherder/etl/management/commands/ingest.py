@@ -1,25 +1,18 @@
 import asyncio
-import inspect
 import logging
 import os
-from concurrent.futures import ThreadPoolExecutor
-from threading import BoundedSemaphore
 
-import aiohttp
 import requests
-import taskcluster
-import taskcluster.aio
 import taskcluster_urls as liburls
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import connection
 
 from treeherder.client.thclient import TreeherderClient
 from treeherder.config.settings import GITHUB_TOKEN
-from treeherder.etl.job_loader import JobLoader, MissingPushError
+from treeherder.etl.backfill import BackfillEngine, Checkpoint, fetch_tasks, list_task_group
 from treeherder.etl.push_loader import PushLoader
 from treeherder.etl.pushlog import HgPushlogProcess, last_push_id_from_server
-from treeherder.etl.taskcluster_pulse.handler import EXCHANGE_EVENT_MAP, handle_message
+from treeherder.etl.taskcluster_pulse.client import close_session
 from treeherder.model.models import Repository
 from treeherder.utils import github
 from treeherder.utils.github import fetch_api, fetch_api_full_url
@@ -27,25 +20,6 @@ from treeherder.utils.github import fetch_api, fetch_api_full_url
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Executor to run threads in parallel
-executor = ThreadPoolExecutor()
-
-state_to_exchange = {}
-for key, value in EXCHANGE_EVENT_MAP.items():
-    state_to_exchange[value] = key
-
-# Semaphore to limit the number of threads opening DB connections when processing jobs
-conn_sem = BoundedSemaphore(50)
-
-
-class Connection:
-    def __enter__(self):
-        conn_sem.acquire()
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        connection.close()
-        conn_sem.release()
-
 
 def ingest_pr(pr_url, root_url):
     if not pr_url.endswith("/"):
@@ -90,17 +64,19 @@ def ingest_hg_push(options):
             last_push_id,
             fetch_push_id,
         )
-    elif options["ingest_all_tasks"]:
-        gecko_decision_task = get_decision_task_id(project, commit, repo.tc_root_url)
-        logger.info("## START ##")
-        loop = asyncio.get_event_loop()
-        loop.run_until_complete(process_tasks(gecko_decision_task, repo.tc_root_url))
-        logger.info("## END ##")
-    else:
+    elif not options["ingest_all_tasks"]:
         logger.info("You can ingest all tasks for a push with -a/--ingest-all-tasks.")
 
+    # The push is stored first, so that its jobs can be stored in bulk.
     _ingest_hg_push(project, commit, fetch_push_id)
 
+    if options["ingest_all_tasks"]:
+        gecko_decision_task = get_decision_task_id(project, commit, repo.tc_root_url)
+        logger.info("## START ##")
+        engine = make_backfill_engine(repo.tc_root_url, options)
+        run_backfill(engine.run(list_task_group(gecko_decision_task, repo.tc_root_url)))
+        logger.info("## END ##")
+
 
 def _ingest_hg_push(project, revision, fetch_push_id=None):
     # get reference to repo
@@ -114,125 +90,25 @@ def _ingest_hg_push(project, revision, fetch_push_id=None):
     process.run(pushlog_url, project, changeset=revision, last_push_id=fetch_push_id)
 
 
-async def ingest_task(task_id, root_url):
-    # Limiting the connection pool just in case we have too many
-    conn = aiohttp.TCPConnector(limit=10)
-    # Remove default timeout limit of 5 minutes
-    timeout = aiohttp.ClientTimeout(total=0)
-    async with taskcluster.aio.createSession(connector=conn, timeout=timeout) as session:
-        async_queue = taskcluster.aio.Queue({"rootUrl": root_url}, session=session)
-        results = await asyncio.gather(async_queue.status(task_id), async_queue.task(task_id))
-        await handle_task(
-            {
-                "status": results[0]["status"],
-                "task": results[1],
-            },
-            root_url,
-        )
-
-
-async def handle_task(task, root_url):
-    task_id = task["status"]["taskId"]
-    runs = task["status"]["runs"]
-    # If we iterate in order of the runs, we will not be able to mark older runs as
-    # "retry" instead of exception
-    for run in reversed(runs):
-        message = {
-            "exchange": state_to_exchange[run["state"]],
-            "payload": {
-                "status": {
-                    "taskId": task_id,
-                    "runs": runs,
-                },
-                "runId": run["runId"],
-            },
-            "root_url": root_url,
-        }
-
-        try:
-            task_runs = await handle_message(message, task["task"])
-        except Exception as e:
-            logger.exception(e)
-
-        if task_runs:
-            # Schedule and run jobs inside the thread pool executor
-            job_futures = [
-                routine_to_future(process_job_with_threads, run, root_url) for run in task_runs
-            ]
-            await await_futures(job_futures)
-
-
-async def fetch_group_tasks(task_group_id, root_url):
-    tasks = []
-    query = {}
-    continuation_token = ""
-    # Limiting the connection pool just in case we have too many
-    conn = aiohttp.TCPConnector(limit=10)
-    # Remove default timeout limit of 5 minutes
-    timeout = aiohttp.ClientTimeout(total=0)
-    async with taskcluster.aio.createSession(connector=conn, timeout=timeout) as session:
-        async_queue = taskcluster.aio.Queue({"rootUrl": root_url}, session=session)
-        while True:
-            if continuation_token:
-                query = {"continuationToken": continuation_token}
-            response = await async_queue.listTaskGroup(task_group_id, query=query)
-            tasks.extend(response["tasks"])
-            continuation_token = response.get("continuationToken")
-            if continuation_token is None:
-                break
-            logger.info("Requesting more tasks. %s tasks so far...", len(tasks))
-        return tasks
-
-
-async def process_tasks(task_group_id, root_url):
-    try:
-        tasks = await fetch_group_tasks(task_group_id, root_url)
-        logger.info("We have %s tasks to process", len(tasks))
-    except Exception as e:
-        logger.exception(e)
-
-    if not tasks:  # No tasks to process
-        return
-
-    # Schedule and run tasks inside the thread pool executor
-    task_futures = [routine_to_future(handle_task, task, root_url) for task in tasks]
-    await await_futures(task_futures)
-
-
-async def routine_to_future(func, *args):
-    """Arrange for a function to be executed in the thread pool executor.
-    Returns an asyncio.Futures object.
-    """
-
-    def _wrap_coroutine(func, *args):
-        """Wraps a coroutine into a regular routine to be ran by threads."""
-        asyncio.run(func(*args))
-
-    event_loop = asyncio.get_event_loop()
-    if inspect.iscoroutinefunction(func):
-        return await event_loop.run_in_executor(executor, _wrap_coroutine, func, *args)
-    return await event_loop.run_in_executor(executor, func, *args)
+def make_backfill_engine(root_url, options):
+    return BackfillEngine(
+        root_url,
+        workers=options["workers"],
+        batch_size=options["batch_size"],
+        concurrency=options["concurrency"],
+        checkpoint=Checkpoint(options["checkpoint"]),
+        ingest_missing_push=ingest_push,
+    )
 
 
-async def await_futures(fs):
-    """Await for each asyncio.Futures given by fs to copmlete."""
-    for fut in fs:
+def run_backfill(coroutine):
+    async def backfill():
         try:
-            await fut
-        except Exception as e:
-            logger.exception(e)
-
+            return await coroutine
+        finally:
+            await close_session()
 
-def process_job_with_threads(pulse_job, root_url):
-    task_id = pulse_job.get("taskId", "unknown")
-    logger.info("Loading into DB:\t%s", task_id)
-    with Connection():
-        try:
-            JobLoader().process_job(pulse_job, root_url)
-        except MissingPushError:
-            logger.warning("The push was not in the DB. We are going to try that first")
-            ingest_push(pulse_job["origin"]["project"], pulse_job["origin"]["revision"])
-            JobLoader().process_job(pulse_job, root_url)
+    return asyncio.run(backfill())
 
 
 def find_task_id(index_path, root_url):
@@ -458,9 +334,31 @@ class Command(BaseCommand):
         parser.add_argument(
             "--last-n-pushes", type=int, help="fetch the last N pushes from the repository"
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of threads (and database connections) storing tasks",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of tasks whose jobs each worker stores at once",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Number of tasks fetched from Taskcluster at once",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=None,
+            help="File recording the tasks stored, so that an interrupted run can resume",
+        )
 
     def handle(self, *args, **options):
-        loop = asyncio.get_event_loop()
         type_of_ingestion = options["ingestion_type"][0]
         root_url = options["root_url"]
 
@@ -478,7 +376,8 @@ class Command(BaseCommand):
 
         if type_of_ingestion == "task":
             assert options["taskId"]
-            loop.run_until_complete(ingest_task(options["taskId"], root_url))
+            engine = make_backfill_engine(root_url, options)
+            run_backfill(engine.run(fetch_tasks([options["taskId"]], root_url)))
         elif type_of_ingestion == "pr":
             assert options["prUrl"]
             ingest_pr(options["prUrl"], root_url)
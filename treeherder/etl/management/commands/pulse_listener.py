@@ -1,7 +1,14 @@
+import functools
+
 import environ
 from django.core.management.base import BaseCommand
 
-from treeherder.services.pulse import JointConsumer, prepare_joint_consumers
+from treeherder.services.pulse import (
+    DirectIngestionConsumer,
+    IngestionService,
+    JointConsumer,
+    prepare_joint_consumers,
+)
 
 env = environ.Env()
 
@@ -12,10 +19,20 @@ class Command(BaseCommand):
     This adds the pushes to a celery queue called ```store_tasks_pushes``` and
     ```store_pulse_pushes```which does the actual storing of the pushes
     in the database.
+
+    With ``--direct``, tasks and pushes are instead stored by the listener itself,
+    and only handed to those queues if that fails.
     """
 
     help = "Read tasks and pushes from a set of pulse exchanges and queue for ingestion"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--direct",
+            action="store_true",
+            help="Store tasks and pushes in this process, rather than via the Celery queues",
+        )
+
     def handle(self, *args, **options):
         # Specifies the Pulse services from which Treeherder will ingest push
         # information.  Sources can include properties `hgmo`, `github`, or both, to
@@ -41,11 +58,21 @@ class Command(BaseCommand):
             ],
         )
 
-        listener_params = (JointConsumer, pulse_sources, [lambda key: f"#.{key}", None])
+        consumer_class = JointConsumer
+        service = None
+        if options["direct"]:
+            service = IngestionService()
+            service.start()
+            consumer_class = functools.partial(DirectIngestionConsumer, service=service)
+
+        listener_params = (consumer_class, pulse_sources, [lambda key: f"#.{key}", None])
         consumer = prepare_joint_consumers(listener_params)
 
         try:
             consumer.run()
         except KeyboardInterrupt:
             pass
+        finally:
+            if service:
+                service.stop()
         self.stdout.write("Pulse and Task listening stopped......")
@@ -8,26 +8,72 @@ from treeherder.model.models import Commit, Push
 logger = logging.getLogger(__name__)
 
 
+# Commits are upserted in batches of this many rows, to bound statement size on big merges.
+COMMIT_BATCH_SIZE = 500
+
+
 def store_push(repository, push_dict):
-    push_revision = push_dict.get("revision")
-    if not push_dict.get("revision"):
-        raise ValueError("Push must have a revision associated with it!")
+    store_pushes(repository, [push_dict])
+
+
+def store_pushes(repository, pushes):
+    """
+    Store a batch of pushes and their commits in one transaction.
+
+    Pushes are upserted (by repository and revision) with a single statement,
+    as are their commits (by push and revision), rather than with an
+    ``update_or_create`` per row.  A later duplicate of a push, or of a commit
+    within a push, wins, as it would when stored one at a time.
+    """
+    push_rows = {}
+    for push_dict in pushes:
+        if not push_dict.get("revision"):
+            raise ValueError("Push must have a revision associated with it!")
+        push_rows[push_dict["revision"]] = push_dict
+    if not push_rows:
+        return
+
     with transaction.atomic():
-        push, _ = Push.objects.update_or_create(
-            repository=repository,
-            revision=push_revision,
-            defaults={
-                "author": push_dict["author"],
-                "time": datetime.utcfromtimestamp(push_dict["push_timestamp"]),
-                "branch": push_dict.get("branch"),
-            },
+        Push.objects.bulk_create(
+            [
+                Push(
+                    repository=repository,
+                    revision=revision,
+                    author=push_dict["author"],
+                    time=datetime.utcfromtimestamp(push_dict["push_timestamp"]),
+                    branch=push_dict.get("branch"),
+                )
+                for revision, push_dict in push_rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["repository", "revision"],
+            update_fields=["author", "time", "branch"],
         )
-        for revision in push_dict["revisions"]:
-            Commit.objects.update_or_create(
-                push=push,
-                revision=revision["revision"],
-                defaults={"author": revision["author"], "comments": revision["comment"]},
+        push_ids = dict(
+            Push.objects.filter(repository=repository, revision__in=push_rows).values_list(
+                "revision", "id"
             )
+        )
+
+        commit_rows = {}
+        for revision, push_dict in push_rows.items():
+            for commit in push_dict["revisions"]:
+                commit_rows[(push_ids[revision], commit["revision"])] = commit
+        Commit.objects.bulk_create(
+            [
+                Commit(
+                    push_id=push_id,
+                    revision=revision,
+                    author=commit["author"],
+                    comments=commit["comment"],
+                )
+                for (push_id, revision), commit in commit_rows.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["push", "revision"],
+            update_fields=["author", "comments"],
+            batch_size=COMMIT_BATCH_SIZE,
+        )
 
 
 def store_push_data(repository, pushes):
@@ -60,5 +106,4 @@ def store_push_data(repository, pushes):
         logger.info("No new pushes to store")
         return
 
-    for push in pushes:
-        store_push(repository, push)
+    store_pushes(repository, pushes)
@@ -6,7 +6,7 @@ import requests
 from django.core.cache import cache
 
 from treeherder.etl.exceptions import CollectionNotStoredError
-from treeherder.etl.push import store_push
+from treeherder.etl.push import store_push, store_pushes
 from treeherder.model.models import Repository
 from treeherder.utils.http import fetch_json
 
@@ -114,23 +114,30 @@ class HgPushlogProcess:
         errors = []
         repository = Repository.objects.get(name=repository_name)
 
+        # A push without commits means it was marked as obsolete (see bug 1286426).
+        # Without them it's not possible to calculate the push revision required for ingestion.
+        transformed = []
         for push in pushes.values():
             if not push["changesets"]:
-                # A push without commits means it was marked as obsolete (see bug 1286426).
-                # Without them it's not possible to calculate the push revision required for ingestion.
                 continue
-
             try:
-                store_push(repository, self.transform_push(push))
+                transformed.append(self.transform_push(push))
             except Exception:
                 newrelic.agent.notice_error()
-                errors.append(
-                    {
-                        "project": repository,
-                        "collection": "result_set",
-                        "message": traceback.format_exc(),
-                    }
-                )
+                errors.append(self._error(repository))
+
+        try:
+            store_pushes(repository, transformed)
+        except Exception:
+            # Store the pushes one at a time, so that a bad push doesn't prevent
+            # the others from being stored.
+            logger.warning("Failed to store pushes in bulk, storing them one at a time")
+            for push in transformed:
+                try:
+                    store_push(repository, push)
+                except Exception:
+                    newrelic.agent.notice_error()
+                    errors.append(self._error(repository))
 
         if errors:
             raise CollectionNotStoredError(errors)
@@ -140,3 +147,10 @@ class HgPushlogProcess:
             cache.set(cache_key, last_push_id, ONE_WEEK_IN_SECONDS)
 
         return top_revision
+
+    def _error(self, repository):
+        return {
+            "project": repository,
+            "collection": "result_set",
+            "message": traceback.format_exc(),
+        }
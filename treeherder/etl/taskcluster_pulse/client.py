@@ -0,0 +1,159 @@
+"""
+Taskcluster client state shared by every pulse message a worker handles.
+
+Opening an HTTP session per message throws away the connection (and TLS
+handshake) to the Taskcluster API each time, and the several events of one
+task (defined, pending, running, completed) would each fetch the same, immutable,
+task definition.  Instead a worker keeps one pooled session per event loop,
+and keeps the task definitions it has seen in a TTL'd LRU cache.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import aiohttp
+import taskcluster.aio
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_session():
+    """
+    Return the pooled aiohttp session of the running event loop, creating it on first use.
+
+    aiohttp sessions can only be used from the loop they were created on, so
+    each loop (normally just the one per worker process) gets its own.  The
+    session is shared, so callers must not close it.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = taskcluster.aio.createSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.TASKCLUSTER_CONNECTION_LIMIT, ttl_dns_cache=300
+            )
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """Close the running event loop's session, e.g. before closing the loop."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+class TaskDefinitionCache:
+    """
+    Cache task definitions, keyed by ``(root_url, task_id)``.
+
+    Entries live in a size-bounded, process-local LRU and expire after
+    ``settings.TASK_DEFINITION_CACHE_TTL`` seconds.  With
+    ``settings.TASK_DEFINITION_CACHE_SHARED`` the (redis) cache is used as a
+    second level, so that the events of one task share a fetch even when
+    handled by different workers.  Cached definitions are shared, so callers
+    must not modify them.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.stats = {"local_hit": 0, "shared_hit": 0, "miss": 0}
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _cache_key(self, root_url, task_id):
+        return f"task_definition:{root_url}:{task_id}"
+
+    def _record(self, outcome):
+        self.stats[outcome] += 1
+        settings.STATSD_CLIENT.incr(f"task_definition_cache.{outcome}")
+
+    def _store_local(self, key, task):
+        max_size = self.max_size or settings.TASK_DEFINITION_CACHE_SIZE
+        with self._lock:
+            self._local[key] = (time.monotonic() + settings.TASK_DEFINITION_CACHE_TTL, task)
+            self._local.move_to_end(key)
+            while len(self._local) > max_size:
+                self._local.popitem(last=False)
+
+    def get(self, root_url, task_id):
+        """Return the cached definition of the task, or None."""
+        key = self._cache_key(root_url, task_id)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires, task = entry
+                if expires > time.monotonic():
+                    self._local.move_to_end(key)
+                    self._record("local_hit")
+                    return task
+                del self._local[key]
+
+        if settings.TASK_DEFINITION_CACHE_SHARED:
+            task = cache.get(key)
+            if task is not None:
+                self._record("shared_hit")
+                self._store_local(key, task)
+                return task
+
+        self._record("miss")
+        return None
+
+    def set(self, root_url, task_id, task):
+        key = self._cache_key(root_url, task_id)
+        self._store_local(key, task)
+        if settings.TASK_DEFINITION_CACHE_SHARED:
+            cache.set(key, task, settings.TASK_DEFINITION_CACHE_TTL)
+
+    async def fetch(self, root_url, task_id, session=None):
+        """
+        Return the definition of the task, from the cache or from the Taskcluster API.
+
+        Concurrent fetches of the same task (e.g. its pending and running
+        events in one batch) share a single API call.
+        """
+        task = self.get(root_url, task_id)
+        if task is not None:
+            return task
+
+        key = self._cache_key(root_url, task_id)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        async def fetch_task():
+            queue = taskcluster.aio.Queue({"rootUrl": root_url}, session=session or get_session())
+            with settings.STATSD_CLIENT.timer("taskcluster_fetch_definition"):
+                return await queue.task(task_id)
+
+        inflight = asyncio.ensure_future(fetch_task())
+        self._inflight[key] = inflight
+        try:
+            task = await asyncio.shield(inflight)
+        finally:
+            self._inflight.pop(key, None)
+        self.set(root_url, task_id, task)
+        return task
+
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        if not total:
+            return 0.0
+        return (self.stats["local_hit"] + self.stats["shared_hit"]) / total
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+
+task_definition_cache = TaskDefinitionCache()
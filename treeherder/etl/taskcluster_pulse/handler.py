@@ -11,6 +11,7 @@ import taskcluster_urls
 from django.conf import settings
 
 from treeherder.etl.schema import get_json_schema
+from treeherder.etl.taskcluster_pulse.client import get_session, task_definition_cache
 from treeherder.etl.taskcluster_pulse.parse_route import parse_route
 from treeherder.utils.logging_context import log_context
 
@@ -143,8 +144,12 @@ def ignore_task(task, task_id, root_url, project):
                 pass
         else:
             # The decision task is the ultimate source for determining this information
-            queue = taskcluster.Queue({"rootUrl": root_url})
-            decision_task = queue.task(task["taskGroupId"])
+            # Every task of the push shares the decision task, so it's usually cached.
+            decision_task = task_definition_cache.get(root_url, task["taskGroupId"])
+            if decision_task is None:
+                queue = taskcluster.Queue({"rootUrl": root_url})
+                decision_task = queue.task(task["taskGroupId"])
+                task_definition_cache.set(root_url, task["taskGroupId"], decision_task)
             scopes = decision_task["metadata"].get("source")
             ignore = True
             for scope in scopes:
@@ -172,56 +177,51 @@ def ignore_task(task, task_id, root_url, project):
 # treeherder job information in task.extra.treeherder are accepted
 # This will generate a list of messages that need to be ingested by Treeherder
 async def handle_message(message, task_definition=None):
-    async with taskcluster.aio.createSession() as session:
-        jobs = []
-        task_id = message["payload"]["status"]["taskId"]
-        # task-defined messages don't have runId since the task has no runs yet
-        run_id = message["payload"].get("runId", 0)
-
-        # Attach task_id/run_id as GCP log labels to every line emitted while
-        # ingesting this task (route parsing, task filtering, validation, etc.).
-        with log_context(task_id=task_id, run_id=str(run_id), component="ingestion"):
-            if task_definition:
-                task = task_definition
-            else:
-                async_queue = taskcluster.aio.Queue(
-                    {"rootUrl": message["root_url"]}, session=session
-                )
-                with settings.STATSD_CLIENT.timer("taskcluster_fetch_definition"):
-                    task = await async_queue.task(task_id)
+    jobs = []
+    task_id = message["payload"]["status"]["taskId"]
+    # task-defined messages don't have runId since the task has no runs yet
+    run_id = message["payload"].get("runId", 0)
+
+    # Attach task_id/run_id as GCP log labels to every line emitted while
+    # ingesting this task (route parsing, task filtering, validation, etc.).
+    with log_context(task_id=task_id, run_id=str(run_id), component="ingestion"):
+        if task_definition:
+            task = task_definition
+        else:
+            task = await task_definition_cache.fetch(message["root_url"], task_id)
 
-            try:
-                parsed_route = parse_route_info("tc-treeherder", task_id, task["routes"], task)
-            except PulseHandlerError as e:
-                logger.debug("%s", str(e))
-                return jobs
-
-            if ignore_task(task, task_id, message["root_url"], parsed_route["project"]):
-                return jobs
-
-            logger.debug("Message received for task %s", task_id)
-
-            # Validation failures are common and logged, so do nothing more.
-            if not validate_task(task, task_id, run_id):
-                return jobs
-
-            task_type = EXCHANGE_EVENT_MAP.get(message["exchange"])
-
-            if not task_type:
-                raise Exception("Unknown exchange: {exchange}".format(exchange=message["exchange"]))
-            elif task_type == "unscheduled":
-                jobs.append(handle_task_defined(parsed_route, task, message))
-            elif task_type == "pending":
-                jobs.append(handle_task_pending(parsed_route, task, message))
-            elif task_type == "running":
-                jobs.append(handle_task_running(parsed_route, task, message))
-            elif task_type in ("completed", "failed"):
-                jobs.append(await handle_task_completed(parsed_route, task, message, session))
-            elif task_type == "exception":
-                jobs.append(await handle_task_exception(parsed_route, task, message, session))
+        try:
+            parsed_route = parse_route_info("tc-treeherder", task_id, task["routes"], task)
+        except PulseHandlerError as e:
+            logger.debug("%s", str(e))
+            return jobs
+
+        if ignore_task(task, task_id, message["root_url"], parsed_route["project"]):
+            return jobs
+
+        logger.debug("Message received for task %s", task_id)
 
+        # Validation failures are common and logged, so do nothing more.
+        if not validate_task(task, task_id, run_id):
             return jobs
 
+        task_type = EXCHANGE_EVENT_MAP.get(message["exchange"])
+
+        if not task_type:
+            raise Exception("Unknown exchange: {exchange}".format(exchange=message["exchange"]))
+        elif task_type == "unscheduled":
+            jobs.append(handle_task_defined(parsed_route, task, message))
+        elif task_type == "pending":
+            jobs.append(handle_task_pending(parsed_route, task, message))
+        elif task_type == "running":
+            jobs.append(handle_task_running(parsed_route, task, message))
+        elif task_type in ("completed", "failed"):
+            jobs.append(await handle_task_completed(parsed_route, task, message, get_session()))
+        elif task_type == "exception":
+            jobs.append(await handle_task_exception(parsed_route, task, message, get_session()))
+
+        return jobs
+
 
 # Builds the basic Treeherder job message that's universal for all
 # messsage types.
@@ -424,31 +424,21 @@ async def fetch_artifacts(root_url, task_id, run_id, session):
 
     continuation_token = res.get("continuationToken")
     while continuation_token is not None:
-        continuation = {"continuationToken": res["continuationToken"]}
+        continuation = {"continuationToken": continuation_token}
 
         try:
             res = await async_queue.listArtifacts(task_id, run_id, continuation)
         except Exception:
             break
 
-        artifacts = artifacts.concat(res["artifacts"])
+        artifacts.extend(res["artifacts"])
         continuation_token = res.get("continuationToken")
 
     return artifacts
 
 
-# we no longer store these in the job_detail table, but we still need to
-# fetch them in order to determine if there is an error_summary log;
-# TODO refactor this when there is a way to only retrieve the error_summary
-# artifact: https://bugzilla.mozilla.org/show_bug.cgi?id=1629716
-async def add_artifact_uploaded_links(root_url, task_id, run_id, job, session):
-    artifacts = []
-    try:
-        artifacts = await fetch_artifacts(root_url, task_id, run_id, session)
-    except Exception:
-        logger.debug("Artifacts could not be found for task: %s run: %s", task_id, run_id)
-        return job
-
+def get_artifact_links(root_url, task_id, run_id, artifacts):
+    """Build the "artifact uploaded" job info links for a task run's artifacts."""
     seen = {}
     links = []
     for artifact in artifacts:
@@ -476,6 +466,25 @@ async def add_artifact_uploaded_links(root_url, task_id, run_id, job, session):
                 ),
             }
         )
+    return links
+
+
+# we no longer store these in the job_detail table, but we still need to
+# fetch them in order to determine if there is an error_summary log;
+# TODO refactor this when there is a way to only retrieve the error_summary
+# artifact: https://bugzilla.mozilla.org/show_bug.cgi?id=1629716
+# With LAZY_ARTIFACT_LINKS this is skipped, and the listing is instead fetched
+# by the store_artifact_references task once the job has been stored.
+async def add_artifact_uploaded_links(root_url, task_id, run_id, job, session):
+    if settings.LAZY_ARTIFACT_LINKS:
+        return job
+
+    artifacts = []
+    try:
+        artifacts = await fetch_artifacts(root_url, task_id, run_id, session)
+    except Exception:
+        logger.debug("Artifacts could not be found for task: %s run: %s", task_id, run_id)
+        return job
 
-    job["jobInfo"]["links"] = links
+    job["jobInfo"]["links"] = get_artifact_links(root_url, task_id, run_id, artifacts)
     return job
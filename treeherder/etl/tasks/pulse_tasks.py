@@ -9,7 +9,9 @@ from django.conf import settings
 
 from treeherder.etl.job_loader import JobLoader
 from treeherder.etl.push_loader import PushLoader
-from treeherder.etl.taskcluster_pulse.handler import handle_message
+from treeherder.etl.taskcluster_pulse.handler import get_artifact_links, handle_message
+from treeherder.model.models import Job
+from treeherder.utils.taskcluster import list_artifacts
 from treeherder.workers.task import retryable_task
 
 # NOTE: default values for root_url parameters can be removed once all tasks that lack
@@ -42,6 +44,69 @@ def store_pulse_tasks(
             JobLoader().process_job(run, root_url)
 
 
+async def handle_messages(messages, root_url):
+    """Handle several pulse messages concurrently, returning their runs or exceptions."""
+    return await asyncio.gather(
+        *[
+            handle_message({"exchange": exchange, "payload": pulse_job, "root_url": root_url})
+            for pulse_job, exchange, _ in messages
+        ],
+        return_exceptions=True,
+    )
+
+
+@retryable_task(name="store-pulse-tasks-batch", max_retries=10)
+def store_pulse_tasks_batch(messages, root_url="https://firefox-ci-tc.services.mozilla.com"):
+    """
+    Fetches the tasks of a batch of pulse messages from Taskcluster and stores
+    their jobs in bulk.
+
+    ``messages`` is a list of ``[pulse_job, exchange, routing_key]``.  Any
+    message that fails is handed on to its own ``store_pulse_tasks`` task, so
+    that it is retried independently of the rest of the batch.
+    """
+    loop = asyncio.get_event_loop()
+    newrelic.agent.add_custom_attribute("batch_size", len(messages))
+    with settings.STATSD_CLIENT.timer("pulse_handle_messages"):
+        results = loop.run_until_complete(handle_messages(messages, root_url))
+
+    failed = set()
+    runs = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            failed.add(index)
+        else:
+            runs.extend((index, run) for run in result if run)
+    failed.update(JobLoader().process_jobs(runs, root_url))
+
+    settings.STATSD_CLIENT.incr("pulse_tasks_batch.messages", len(messages))
+    if failed:
+        settings.STATSD_CLIENT.incr("pulse_tasks_batch.retried", len(failed))
+    for index in sorted(failed):
+        pulse_job, exchange, routing_key = messages[index]
+        store_pulse_tasks.apply_async(
+            args=[pulse_job, exchange, routing_key, root_url], queue="store_pulse_tasks"
+        )
+
+
+@retryable_task(name="store-artifact-references", max_retries=10)
+def store_artifact_references(job_id):
+    """
+    Lists the artifacts of a completed job's task run, and stores its
+    errorsummary and perfherder data references.
+    """
+    newrelic.agent.add_custom_attribute("job_id", str(job_id))
+    job = Job.objects.select_related("repository", "taskcluster_metadata").get(id=job_id)
+    task_id = job.taskcluster_metadata.task_id
+    run_id = job.taskcluster_metadata.retry_id
+    root_url = job.repository.tc_root_url
+
+    with settings.STATSD_CLIENT.timer("taskcluster_list_artifacts"):
+        artifacts = list_artifacts(root_url, task_id, run_id)
+    links = get_artifact_links(root_url, task_id, run_id, artifacts)
+    JobLoader().store_artifact_references(job, links)
+
+
 @retryable_task(name="store-pulse-pushes", max_retries=10)
 def store_pulse_pushes(
     body, exchange, routing_key, root_url="https://firefox-ci-tc.services.mozilla.com"
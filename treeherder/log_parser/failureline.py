@@ -1,9 +1,9 @@
-import json
 import logging
 from collections import defaultdict
 from itertools import islice
 
 import newrelic.agent
+import simplejson as json
 from django.conf import settings
 from django.db import transaction
 from django.db.utils import DataError, IntegrityError, OperationalError
@@ -11,7 +11,7 @@ from requests.exceptions import HTTPError
 
 from treeherder.etl.text import astral_filter
 from treeherder.model.models import FailureLine, Group, GroupStatus, JobLog
-from treeherder.utils.http import fetch_text
+from treeherder.utils.http import make_request
 
 logger = logging.getLogger(__name__)
 
@@ -25,18 +25,41 @@ def store_failure_lines(job_log):
 
 def fetch_log(job_log):
     try:
-        log_text = fetch_text(job_log.url)
+        response = make_request(job_log.url, stream=True)
     except HTTPError as e:
         job_log.update_status(JobLog.FAILED)
-        if e.response is not None and e.response.status_code in (403, 404):
-            logger.warning("Unable to retrieve log for %s: %s", job_log.url, e)
-            return
+        if e.response is not None:
+            # The body of a failed log request is never read, so release its connection.
+            e.response.close()
+            if e.response.status_code in (403, 404):
+                logger.warning("Unable to retrieve log for %s: %s", job_log.url, e)
+                return
         raise
 
-    if not log_text:
+    # Only the first FAILURE_LINES_CUTOFF + 1 lines are ever stored (the extra one
+    # becomes the "truncated" marker), so stop downloading once we have those.
+    log_lines = read_log_lines(response, settings.FAILURE_LINES_CUTOFF + 1)
+    if not log_lines:
         return
 
-    return (json.loads(item) for item in log_text.splitlines())
+    return log_lines
+
+
+# Large enough to keep the number of reads per log low, small enough that we don't
+# download much more than we need once the cutoff is reached.
+LOG_CHUNK_SIZE = 64 * 1024
+
+
+def read_log_lines(response, limit):
+    """Decode up to ``limit`` NDJSON lines from a streamed response.
+
+    The response is closed once the limit is reached, so the remainder of the
+    body is never downloaded."""
+    with response:
+        # Split on raw bytes, as `iter_lines(decode_unicode=True)` would also split on
+        # Unicode newline characters that may legitimately appear inside JSON strings.
+        lines = (line for line in response.iter_lines(chunk_size=LOG_CHUNK_SIZE) if line)
+        return [json.loads(line.decode("utf-8")) for line in islice(lines, limit)]
 
 
 def write_failure_lines(job_log, log_iter):
@@ -105,8 +128,8 @@ def get_kwargs(failure_line):
     return {key: failure_line[key] for key in _failure_line_keys if key in failure_line}
 
 
-def create_failure_line(job_log, failure_line):
-    return FailureLine.objects.create(
+def build_failure_line(job_log, failure_line):
+    return FailureLine(
         repository=job_log.job.repository,
         job_guid=job_log.job.guid,
         job_log=job_log,
@@ -114,9 +137,7 @@ def create_failure_line(job_log, failure_line):
     )
 
 
-def create_group_result(job_log, line):
-    group_path = line["group"]
-
+def is_valid_group_path(job_log, group_path):
     # Log to New Relic if it's not in a form we like.  We can enter
     # Bugs to upstream to remedy them.
     if "\\" in group_path or len(group_path) > 255:
@@ -124,30 +145,61 @@ def create_group_result(job_log, line):
             "malformed_test_group",
             {
                 "message": "Group paths must be relative, with no backslashes and <255 chars",
-                "group": line["group"],
+                "group": group_path,
                 "group_path": group_path,
                 "length": len(group_path),
                 "repository": job_log.job.repository,
                 "job_guid": job_log.job.guid,
             },
         )
+        return False
+    return True
+
+
+def get_group_ids(names):
+    """Map each group name to its id, creating any missing groups in bulk.
+
+    `names` must be ordered as the groups should be created, so ids follow the
+    order in which the groups first appear in the log."""
+    group_ids = dict(Group.objects.filter(name__in=names).values_list("name", "id"))
+    missing = [name for name in names if name not in group_ids]
+    if missing:
+        # Another log parser may create the same groups concurrently, so ignore
+        # conflicts and read back whatever ids ended up stored.
+        Group.objects.bulk_create([Group(name=name) for name in missing], ignore_conflicts=True)
+        group_ids.update(Group.objects.filter(name__in=missing).values_list("name", "id"))
+    return group_ids
+
+
+def get_group_duration(line):
+    duration = line.get("duration", 0)
+    if type(duration) not in [float, int]:
+        duration = 0
     else:
-        group, _ = Group.objects.get_or_create(name=group_path[:255])
-        duration = line.get("duration", 0)
-        if type(duration) not in [float, int]:
-            duration = 0
-        else:
-            duration = int(duration)
-        # duration > 2 hours (milliseconds) or negative, something is wrong
-        if duration > 7200 * 1000 or duration < 0:
-            duration = 0
-        duration = int(duration / 1000)
-        GroupStatus.objects.create(
-            job_log=job_log,
-            group=group,
-            status=GroupStatus.get_status(line["status"]),
-            duration=duration,
-        )
+        duration = int(duration)
+    # duration > 2 hours (milliseconds) or negative, something is wrong
+    if duration > 7200 * 1000 or duration < 0:
+        duration = 0
+    return int(duration / 1000)
+
+
+def create_group_results(job_log, group_results):
+    lines = [line for line in group_results if is_valid_group_path(job_log, line["group"])]
+    if not lines:
+        return []
+
+    group_ids = get_group_ids(list(dict.fromkeys(line["group"][:255] for line in lines)))
+    return GroupStatus.objects.bulk_create(
+        [
+            GroupStatus(
+                job_log=job_log,
+                group_id=group_ids[line["group"][:255]],
+                status=GroupStatus.get_status(line["status"]),
+                duration=get_group_duration(line),
+            )
+            for line in lines
+        ]
+    )
 
 
 def create(job_log, log_list):
@@ -169,12 +221,13 @@ def create(job_log, log_list):
         else:
             failure_lines.append(line)
 
-    for group in group_results:
-        create_group_result(job_log, group)
+    create_group_results(job_log, group_results)
 
-    failure_line_results = [
-        create_failure_line(job_log, failure_line) for failure_line in failure_lines
-    ]
+    # A duplicate (job_log, line) raises IntegrityError for the whole batch, which
+    # write_failure_lines recovers from by excluding the stored lines and retrying.
+    failure_line_results = FailureLine.objects.bulk_create(
+        [build_failure_line(job_log, failure_line) for failure_line in failure_lines]
+    )
     job_log.update_status(JobLog.PARSED)
     return failure_line_results
 
@@ -1,38 +1,422 @@
+"""
+Mark the failures of a job intermittent once the same tests pass on retriggers
+or on the neighbouring pushes.
+
+Whether a group (a test manifest) passes is decided on the results of the jobs
+of the same type over a window of recent pushes.  Those results are kept in the
+default cache per (repository, job type, push) as each job's errorsummary is
+stored, along with running tallies of how often each group passed and failed,
+so that checking a job reads the window's tallies instead of joining the
+group results of all its jobs again.  The pushes that aren't in the cache (yet,
+or anymore) are loaded from the database first.
+
+The jobs to (un)mark aren't updated right away: the decisions are queued per
+push, and a single task per push applies the latest decision for each job in
+bulk a few seconds later, so that checks of retriggers running concurrently
+don't keep flipping the same jobs.
+"""
+
 import datetime
+import hashlib
+import time
+from collections import Counter
+
+import simplejson as json
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.encoding import force_str
 
+from treeherder.model.error_summary import get_redis
 from treeherder.model.models import Group, GroupStatus, Job, Push, TextLogError
 
+# not classified, intermittent, new_failure, intermittent needs bug; TODO: consider 7 == autoclassified
+COUNTED_CLASSIFICATIONS = [1, 4, 6, 8]
+# primarily ignore retry/usercancel/unknown
+COUNTED_RESULTS = ["success", "testfailed"]
+STATUS_NAMES = {GroupStatus.OK: "ok", GroupStatus.ERROR: "error"}
+# Long enough for the pushes of the last 36 hours, which later pushes look back on.
+GROUP_TALLIES_TIMEOUT = 86400 * 2
+CLASSIFICATION_QUEUE_TIMEOUT = 86400 * 2
+# Longer than applying a push's decisions should ever take.
+CLASSIFICATION_LOCK_TIMEOUT = 5 * 60
+# Replaces a job's group results in the jobs hash (KEYS[1]) of a push, and
+# moves the tallies hash (KEYS[2]) along.  ARGV: job id, results, timeout.
+RECORD_JOB_SCRIPT = """
+local old = redis.call("HGET", KEYS[1], ARGV[1])
+if old ~= ARGV[2] then
+    if old then
+        for group, status in pairs(cjson.decode(old)) do
+            redis.call("HINCRBY", KEYS[2], status .. ":" .. group, -1)
+        end
+    end
+    redis.call("HSET", KEYS[1], ARGV[1], ARGV[2])
+    for group, status in pairs(cjson.decode(ARGV[2])) do
+        redis.call("HINCRBY", KEYS[2], status .. ":" .. group, 1)
+    end
+end
+redis.call("EXPIRE", KEYS[1], ARGV[3])
+redis.call("EXPIRE", KEYS[2], ARGV[3])
+"""
+
+
+def get_base_name(job_type_name):
+    """The job type name without its "-cf" suffix and chunk number."""
+    base_name = job_type_name.strip("-cf")
+    try:
+        int(base_name.split("-")[-1])
+        base_name = "-".join(base_name.split("-")[:-1])
+    except ValueError:
+        pass
+    return base_name
 
-def classify(jobs_to_classify, jobs_to_unclassify):
-    # TODO: consider job.result=(busted, exception)
-    if jobs_to_classify:
-        target_jobs = Job.objects.filter(
-            id__in=jobs_to_classify, result="testfailed", failure_classification_id__in=[1, 6]
+
+def tally(results):
+    """Count a job's ``{group: "ok" or "error"}`` results into tallies."""
+    return Counter(f"{status}:{group}" for group, status in results.items())
+
+
+class PushGroups:
+    """The group results of the jobs of a type in one push, and their tallies."""
+
+    def __init__(self, jobs=None, tallies=None, loaded=False):
+        # job id -> {group: "ok" or "error"}
+        self.jobs = jobs or {}
+        # "ok:<group>" or "error:<group>" -> number of jobs
+        self.tallies = tallies or Counter()
+        self.loaded = loaded
+
+    def record(self, job_id, results):
+        old = self.jobs.get(job_id)
+        if old is not None:
+            self.tallies.subtract(tally(old))
+        self.jobs[job_id] = results
+        self.tallies.update(tally(results))
+
+    def discard(self, job_ids):
+        for job_id in job_ids:
+            self.tallies.subtract(tally(self.jobs.pop(job_id)))
+
+    def ran(self, group):
+        return self.tallies[f"ok:{group}"] + self.tallies[f"error:{group}"] > 0
+
+    def passing(self, group):
+        """Whether ``group`` passed in at least half of the jobs it ran in."""
+        return self.ran(group) and self.tallies[f"ok:{group}"] >= self.tallies[f"error:{group}"]
+
+
+class GroupTallies:
+    """
+    The group results of the jobs of a type, per push, see the module docstring.
+
+    With redis behind the default cache, each push has a hash of job id ->
+    results, and a hash of tallies that a script updates along with them, so
+    that concurrent log parsers don't lose each other's updates.  Other cache
+    backends (e.g. in the tests) get a key per push.
+    """
+
+    def __init__(self, repository_id, job_type_name):
+        self.repository_id = repository_id
+        self.job_type_name = job_type_name
+        self.redis = get_redis()
+        self._record_script = (
+            self.redis.register_script(RECORD_JOB_SCRIPT) if self.redis is not None else None
+        )
+
+    def _key(self, push_id):
+        # Job type names may have characters that some cache backends' keys can't.
+        digest = hashlib.sha1(self.job_type_name.encode("utf-8")).hexdigest()
+        return f"intermittent_groups:{self.repository_id}:{digest}:{push_id}"
+
+    def _counts(self, job_type_name):
+        # As the groups query used to select them.
+        return job_type_name.startswith(self.job_type_name) and (
+            get_base_name(job_type_name) == self.job_type_name
         )
-        if target_jobs:
-            target_jobs.update(failure_classification_id=8)
 
-    if jobs_to_unclassify:
+    def _statuses(self):
+        return GroupStatus.objects.filter(status__in=list(STATUS_NAMES)).exclude(
+            group__name__exact=""
+        )
+
+    def record(self, push_id, jobs, loaded=False):
+        """
+        Store the results of ``jobs`` (``{job_id: {group: "ok" or "error"}}``) in
+        a push, replacing those they had.  ``loaded`` marks the push as holding
+        all of its jobs.
+        """
+        if self.redis is not None:
+            key = self._key(push_id)
+            pipeline = self.redis.pipeline(transaction=False)
+            for job_id, results in jobs.items():
+                self._record_script(
+                    keys=[f"{key}:jobs", f"{key}:tallies"],
+                    args=[job_id, json.dumps(results, sort_keys=True), GROUP_TALLIES_TIMEOUT],
+                    client=pipeline,
+                )
+            if loaded:
+                pipeline.hset(f"{key}:tallies", "loaded", 1)
+                pipeline.expire(f"{key}:tallies", GROUP_TALLIES_TIMEOUT)
+            pipeline.execute()
+            return
+
+        push = cache.get(self._key(push_id)) or PushGroups()
+        for job_id, results in jobs.items():
+            push.record(job_id, results)
+        push.loaded = push.loaded or loaded
+        cache.set(self._key(push_id), push, GROUP_TALLIES_TIMEOUT)
+
+    def record_job(self, job):
+        """Store the group results of ``job``, e.g. once its errorsummary was parsed."""
+        if not self._counts(job.job_type.name):
+            return
+        results = {}
+        for group, status in (
+            self._statuses()
+            .filter(job_log__job=job)
+            .values_list("group__name", "status")
+            .order_by("id")
+        ):
+            results.setdefault(group, STATUS_NAMES[status])
+        if results:
+            self.record(job.push_id, {job.id: results})
+
+    def _read(self, push_ids):
+        if self.redis is None:
+            found = cache.get_many([self._key(push_id) for push_id in push_ids])
+            return {push_id: found.get(self._key(push_id)) or PushGroups() for push_id in push_ids}
+
+        pipeline = self.redis.pipeline(transaction=False)
+        for push_id in push_ids:
+            pipeline.hgetall(f"{self._key(push_id)}:jobs")
+            pipeline.hgetall(f"{self._key(push_id)}:tallies")
+        replies = pipeline.execute()
+        pushes = {}
+        for push_id, jobs, tallies in zip(push_ids, replies[::2], replies[1::2]):
+            tallies = {force_str(field): int(count) for field, count in tallies.items()}
+            loaded = bool(tallies.pop("loaded", None))
+            pushes[push_id] = PushGroups(
+                {int(job_id): json.loads(results) for job_id, results in jobs.items()},
+                Counter(tallies),
+                loaded,
+            )
+        return pushes
+
+    def _load(self, push_ids):
+        """Store the group results of every job of ``push_ids`` from the database."""
+        jobs = {push_id: {} for push_id in push_ids}
+        for push_id, job_id, job_type_name, group, status in (
+            self._statuses()
+            .filter(
+                job_log__job__push__id__in=push_ids,
+                job_log__job__repository__id=self.repository_id,
+                job_log__job__job_type__name__startswith=self.job_type_name,
+            )
+            .values_list(
+                "job_log__job__push__id",
+                "job_log__job__id",
+                "job_log__job__job_type__name",
+                "group__name",
+                "status",
+            )
+            .order_by("id")
+        ):
+            if self._counts(job_type_name):
+                jobs[push_id].setdefault(job_id, {}).setdefault(group, STATUS_NAMES[status])
+        for push_id, push_jobs in jobs.items():
+            self.record(push_id, push_jobs, loaded=True)
+
+    def get_pushes(self, push_ids):
+        """Return the ``PushGroups`` of ``push_ids``, loading those the cache lacks."""
+        pushes = self._read(push_ids)
+        missing = [push_id for push_id, push in pushes.items() if not push.loaded]
+        if missing:
+            self._load(missing)
+            pushes.update(self._read(missing))
+        return pushes
+
+
+class ClassificationQueue:
+    """
+    The intermittent (re)classifications decided for the jobs of a push, until
+    ``apply_classifications`` applies them.
+
+    With redis behind the default cache, the decisions are a list, which is
+    drained atomically, and the time of the latest decision applied to each job
+    a hash.  Other cache backends (e.g. in the tests) get a key for each.
+    """
+
+    def __init__(self, push_id):
+        self.push_id = push_id
+        self.key = f"intermittent_classifications:{push_id}"
+        self.redis = get_redis()
+
+    def put(self, decisions):
+        """Queue ``decisions``, lists of ``[job_id, intermittent, decided_at]``."""
+        if self.redis is not None:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.rpush(self.key, *[json.dumps(decision) for decision in decisions])
+            pipeline.expire(self.key, CLASSIFICATION_QUEUE_TIMEOUT)
+            pipeline.execute()
+        else:
+            queued = cache.get(self.key, [])
+            cache.set(self.key, queued + decisions, CLASSIFICATION_QUEUE_TIMEOUT)
+
+    def drain(self):
+        """Return the queued decisions, oldest first, and empty the queue."""
+        if self.redis is None:
+            decisions = cache.get(self.key, [])
+            cache.delete(self.key)
+            return decisions
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.lrange(self.key, 0, -1)
+        pipeline.delete(self.key)
+        decisions, _ = pipeline.execute()
+        return [json.loads(decision) for decision in decisions]
+
+    def pending(self):
+        if self.redis is None:
+            return bool(cache.get(self.key))
+        return bool(self.redis.llen(self.key))
+
+    def get_applied(self):
+        """Return ``{job_id: decided_at}`` of the latest decisions applied."""
+        if self.redis is None:
+            return cache.get(f"{self.key}:applied", {})
+        applied = self.redis.hgetall(f"{self.key}:applied")
+        return {int(job_id): float(decided_at) for job_id, decided_at in applied.items()}
+
+    def set_applied(self, applied):
+        if not applied:
+            return
+        if self.redis is None:
+            cache.set(
+                f"{self.key}:applied",
+                {**self.get_applied(), **applied},
+                CLASSIFICATION_QUEUE_TIMEOUT,
+            )
+            return
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hset(f"{self.key}:applied", mapping=applied)
+        pipeline.expire(f"{self.key}:applied", CLASSIFICATION_QUEUE_TIMEOUT)
+        pipeline.execute()
+
+    def schedule(self):
+        """Make sure a task will apply the queued decisions."""
+        from treeherder.log_parser.tasks import apply_intermittent_classifications
+
+        # Only until the task should have run, so that the decisions of a push
+        # whose task got lost are picked up by the next one scheduled.
+        timeout = settings.INTERMITTENT_CLASSIFICATION_DELAY + CLASSIFICATION_LOCK_TIMEOUT
+        if cache.add(f"{self.key}:scheduled", 1, timeout):
+            apply_intermittent_classifications.apply_async(
+                args=[self.push_id],
+                countdown=settings.INTERMITTENT_CLASSIFICATION_DELAY,
+                queue="log_parser",
+            )
+
+    def lock(self):
+        return cache.add(f"{self.key}:lock", 1, CLASSIFICATION_LOCK_TIMEOUT)
+
+    def unlock(self):
+        cache.delete(f"{self.key}:lock")
+
+
+def classify(jobs_to_classify, jobs_to_unclassify, decided_at=None):
+    """
+    Queue the jobs to mark as intermittent, and those to unmark, for their push's
+    ``apply_classifications`` task.
+    """
+    # TODO: consider job.result=(busted, exception)
+    decided_at = decided_at or time.time()
+    # jobs to unclassify that are also to classify end up unclassified
+    decisions = {job_id: True for job_id in jobs_to_classify}
+    decisions.update((job_id, False) for job_id in jobs_to_unclassify)
+    if not decisions:
+        return
+
+    by_push = {}
+    for job_id, push_id in Job.objects.filter(id__in=decisions).values_list("id", "push_id"):
+        by_push.setdefault(push_id, []).append([job_id, decisions[job_id], decided_at])
+    for push_id, push_decisions in by_push.items():
+        queue = ClassificationQueue(push_id)
+        queue.put(push_decisions)
+        queue.schedule()
+
+
+def _apply(queue, decisions):
+    applied = queue.get_applied()
+    # The latest decision for a job wins, unless a later one was applied already.
+    latest = {}
+    for job_id, intermittent, decided_at in sorted(decisions, key=lambda d: d[2]):
+        if decided_at >= applied.get(job_id, 0):
+            latest[job_id] = (intermittent, decided_at)
+    if not latest:
+        return
+
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update()
+            .filter(id__in=latest, result="testfailed")
+            .only("id", "failure_classification")
+        )
         # TODO: query text_log_error for new_failure and use 6 if previously set
-        new_jobs = (
+        new_failures = set(
             TextLogError.objects.filter(
-                job__id__in=jobs_to_unclassify, new_failure=True, job__failure_classification_id=8
+                job__id__in=[
+                    job.id
+                    for job in jobs
+                    if not latest[job.id][0] and job.failure_classification_id == 8
+                ],
+                new_failure=True,
             )
-            .values("job__id")
+            .values_list("job__id", flat=True)
             .distinct()
         )
-        jobs_to_newfailure = [j["job__id"] for j in new_jobs]
-        jobs_to_regular_failure = list(set(jobs_to_unclassify) - set(jobs_to_newfailure))
+        changed = []
+        for job in jobs:
+            intermittent, _ = latest[job.id]
+            # Only jobs still classified as the decision expects are changed, so
+            # that e.g. a sheriff's classification since isn't overwritten.
+            if intermittent and job.failure_classification_id in [1, 6]:
+                job.failure_classification_id = 8
+            elif not intermittent and job.failure_classification_id == 8:
+                # classification_id: 6 == new failure needs classification, 1 == no classified
+                job.failure_classification_id = 6 if job.id in new_failures else 1
+            else:
+                continue
+            changed.append(job)
+        if changed:
+            Job.objects.bulk_update(changed, ["failure_classification"])
+        queue.set_applied({job_id: decided_at for job_id, (_, decided_at) in latest.items()})
+
 
-        # classification_id: 6 == new failure needs classification, 1 == no classified
-        if jobs_to_newfailure:
-            target_jobs = Job.objects.filter(id__in=jobs_to_newfailure, result="testfailed")
-            if target_jobs:
-                target_jobs.update(failure_classification_id=6)
-        if jobs_to_regular_failure:
-            target_jobs = Job.objects.filter(id__in=jobs_to_regular_failure, result="testfailed")
-            if target_jobs:
-                target_jobs.update(failure_classification_id=1)
+def apply_classifications(push_id):
+    """
+    Apply the classifications queued for the jobs of a push in bulk.
+
+    Only one worker at a time applies a push's decisions: the others leave the
+    decisions they'd find to it.
+    """
+    queue = ClassificationQueue(push_id)
+    # Decisions queued from now on need another run.
+    cache.delete(f"{queue.key}:scheduled")
+    while queue.lock():
+        try:
+            decisions = queue.drain()
+            while decisions:
+                try:
+                    _apply(queue, decisions)
+                except Exception:
+                    # for the retry
+                    queue.put(decisions)
+                    raise
+                decisions = queue.drain()
+        finally:
+            queue.unlock()
+        # Decisions queued after the last drain found the lock taken.
+        if not queue.pending():
+            break
 
 
 def _check_and_mark_infra(current_job, job_ids, push_ids):
@@ -104,17 +488,30 @@ def _check_and_mark_infra(current_job, job_ids, push_ids):
     return jobs_to_classify, jobs_to_unclassify
 
 
+def _group_job_ids(current_job, jtname, ids):
+    """The ids of the jobs with group results in the window, variants included."""
+    return list(
+        set(
+            Group.objects.filter(
+                job_logs__job__push__id__in=ids,
+                job_logs__job__repository__id=current_job.repository.id,
+                job_logs__job__job_type__name__startswith=jtname,
+                job_logs__job__failure_classification__id__in=COUNTED_CLASSIFICATIONS,
+                job_logs__job__result__in=COUNTED_RESULTS,
+                group_result__status__in=[GroupStatus.OK, GroupStatus.ERROR],
+            )
+            .exclude(name__exact="")
+            .values_list("job_logs__job__id", flat=True)
+        )
+    )
+
+
 def check_and_mark_intermittent(job_id):
-    current_job = Job.objects.get(id=job_id)
-    jtname = current_job.job_type.name.strip("-cf")
+    decided_at = time.time()
+    current_job = Job.objects.select_related("job_type", "push", "repository").get(id=job_id)
+    jtname = get_base_name(current_job.job_type.name)
     ids = [current_job.push.id]
 
-    try:
-        _ = int(jtname.split("-")[-1])
-        jtname = "-".join(jtname.split("-")[:-1])
-    except ValueError:
-        pass
-
     # if we are not on try, look at recent history
     if current_job.repository.id != 4:
         start_date = current_job.push.time - datetime.timedelta(hours=36)
@@ -139,126 +536,53 @@ def check_and_mark_intermittent(job_id):
             ids.append(id)
             counter += 1
 
-    all_groups = (
-        Group.objects.filter(
-            job_logs__job__push__id__range=(ids[-1], ids[0]),
-            # Filter on job.repository_id directly rather than push.repository_id:
-            # a job's repository always matches its push's repository, so this is
-            # equivalent but lets PostgreSQL drop the join to the push table and
-            # use the (repository, job_type, push) index on job.
-            job_logs__job__repository__id=current_job.repository.id,
-            job_logs__job__job_type__name__startswith=jtname,
-            job_logs__job__failure_classification__id__in=[
-                1,
-                4,
-                6,
-                8,
-            ],  # not classified, intermittent, new_failure, intermittent needs bug; TODO: consider 7 == autoclassified
-            job_logs__job__result__in=[
-                "success",
-                "testfailed",
-            ],  # primarily ignore retry/usercancel/unknown
-            group_result__status__in=[GroupStatus.OK, GroupStatus.ERROR],
-        )
-        .exclude(name__exact="")
-        .values(
-            "name",
-            "job_logs__job__id",
-            "group_result__status",
-            "job_logs__job__job_type__name",
-            "job_logs__job__push__id",
-            "job_logs__job__failure_classification__id",
-        )
-        .order_by("-job_logs__job__push__id")
-    )
+    group_tallies = GroupTallies(current_job.repository.id, jtname)
+    group_tallies.record_job(current_job)
+    pushes = group_tallies.get_pushes(ids)
 
+    # store job:fc_id so we can reference what needs changed
+    job_classifications = dict(
+        Job.objects.filter(
+            id__in=[job for push in pushes.values() for job in push.jobs],
+            failure_classification_id__in=COUNTED_CLASSIFICATIONS,
+            result__in=COUNTED_RESULTS,
+        ).values_list("id", "failure_classification_id")
+    )
+    # jobs classified otherwise since (e.g. by a sheriff) no longer count
+    for push in pushes.values():
+        push.discard([job for job in push.jobs if job not in job_classifications])
+
+    distinct_job_ids = list(job_classifications)
+    if len(distinct_job_ids) <= 1:
+        # variants of the job type count here too
+        distinct_job_ids = _group_job_ids(current_job, jtname, ids)
     # If no groups, look for infra
-    distinct_job_ids = list(set([f["job_logs__job__id"] for f in all_groups]))
     if len(distinct_job_ids) == 1:
         to_classify, to_unclassify = _check_and_mark_infra(current_job, distinct_job_ids, ids)
-        return classify(to_classify, to_unclassify)
-
-    mappings = {}
-    job_classifications = {}
-    for item in all_groups:
-        jobname = item["job_logs__job__job_type__name"].strip("-cf")
-        try:
-            int(jobname.split("-")[-1])
-            jobname = "-".join(jobname.split("-")[:-1])
-        except ValueError:
-            pass
-
-        if jobname != jtname:
-            # we have a variant
-            continue
-
-        # TODO: consider storing a list of job.id that are fc_id=8
-        # store job:fc_id so we can reference what needs changed
-        if item["job_logs__job__id"] not in job_classifications:
-            job_classifications[item["job_logs__job__id"]] = item[
-                "job_logs__job__failure_classification__id"
-            ]
-
-        if item["job_logs__job__push__id"] not in mappings:
-            mappings[item["job_logs__job__push__id"]] = {"groups": {}, "jobs": {}}
-            groups = mappings[item["job_logs__job__push__id"]]["groups"]
-            jobs = mappings[item["job_logs__job__push__id"]]["jobs"]
-
-        if item["name"] not in groups:
-            groups[item["name"]] = {}
-        if item["job_logs__job__id"] not in groups[item["name"]]:
-            groups[item["name"]][item["job_logs__job__id"]] = item["group_result__status"]
-
-        if item["job_logs__job__id"] not in jobs:
-            jobs[item["job_logs__job__id"]] = {}
-        if item["name"] not in jobs[item["job_logs__job__id"]]:
-            jobs[item["job_logs__job__id"]][item["name"]] = item["group_result__status"]
+        return classify(to_classify, to_unclassify, decided_at)
 
     # multi push support - want to look back in history now that we have "future" data
     # a previous job can only change if ALL failing groups have future passing data
     #
-    # current job has new data, lets find all groups that changed status as a result of new data
-    # if no groups, possibly an "infra" error
-    changed_groups = {}
-    current_changed_groups = {}
-    for group in mappings.get(current_job.push.id, {}).get("groups", []):
-        all_data = []
-        current_data = [
-            mappings[current_job.push.id]["groups"][group][j]
-            for j in mappings[current_job.push.id]["groups"][group]
-        ]
-        for id in mappings.keys():
-            all_data.extend(
-                [mappings[id]["groups"][group][j] for j in mappings[id]["groups"].get(group, {})]
-            )
-
-        # if new data changes results, update
-        pass_rate = len([s for s in all_data if s == GroupStatus.OK]) / len(all_data)
-        if pass_rate >= 0.5:
-            changed_groups[group] = True
-        pass_rate = len([s for s in current_data if s == GroupStatus.OK]) / len(current_data)
-        if pass_rate >= 0.5:
-            current_changed_groups[group] = True
-
-    # all changed_groups need to be evaluated on previous 'failed' jobs to ensure all groups in that task are 'passing'
+    # current job has new data, so a group of the current push changed status if
+    # it now passes at least half of the time over all the pushes (for previous
+    # jobs) or in the current push (for its jobs)
+    current_push = pushes[current_job.push.id]
+    window = PushGroups()
+    for push in pushes.values():
+        window.tallies.update(push.tallies)
+
+    def changed(group):
+        return current_push.ran(group) and window.passing(group)
+
+    # all changed groups need to be evaluated on previous 'failed' jobs to ensure all groups in that task are 'passing'
     jobs_to_classify = []  # mark as fcid=8 (known intermittent)
     jobs_to_unclassify = []  # previously parked as fcid=8, new failing data, now fcid=1
-    for id in mappings.keys():
-        for job in mappings[id]["jobs"]:
-            all_green = True
-            current_all_green = True
-            for group in mappings[id]["jobs"][job]:
-                # if group changed to failing and group originally failed
-                if (
-                    mappings[id]["groups"][group][job] == GroupStatus.ERROR
-                    and group not in changed_groups
-                ):
-                    all_green = False
-                if (
-                    mappings[id]["groups"][group][job] == GroupStatus.ERROR
-                    and group not in current_changed_groups
-                ):
-                    current_all_green = False
+    for id, push in pushes.items():
+        for job, results in push.jobs.items():
+            failed_groups = [group for group, status in results.items() if status == "error"]
+            all_green = all(changed(group) for group in failed_groups)
+            current_all_green = all(current_push.passing(group) for group in failed_groups)
 
             if (id == current_job.push.id and current_all_green) or (
                 id != current_job.push.id and len(ids) > 1 and all_green
@@ -270,4 +594,4 @@ def check_and_mark_intermittent(job_id):
     to_classify, to_unclassify = _check_and_mark_infra(current_job, distinct_job_ids, ids)
     jobs_to_classify.extend(to_classify)
     jobs_to_unclassify.extend(to_unclassify)
-    return classify(jobs_to_classify, jobs_to_unclassify)
+    return classify(jobs_to_classify, jobs_to_unclassify, decided_at)
@@ -0,0 +1,402 @@
+import copy
+import datetime
+import gzip
+import random
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from glob import glob
+from os.path import join
+from unittest import mock
+
+import simplejson as json
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from treeherder.etl.bugzilla import get_bug_fields
+from treeherder.log_parser import tasks as log_parser_tasks
+from treeherder.log_parser.intermittents import apply_classifications, check_and_mark_intermittent
+from treeherder.model import error_summary
+from treeherder.model.bug_search import bugscache_index, bump_generation
+from treeherder.model.error_summary import bug_suggestion_cache, normalize_line
+from treeherder.model.models import (
+    Bugscache,
+    Group,
+    GroupStatus,
+    Job,
+    JobLog,
+    Push,
+    Repository,
+    TextLogError,
+)
+from treeherder.utils.benchmark import StageTimer, maybe_profile
+
+DEFAULT_BUGS_DIR = join(settings.SRC_DIR, "tests", "sample_data", "bugscache_population")
+DEFAULT_LOG_DIR = join(settings.SRC_DIR, "tests", "sample_data", "logs")
+
+# The sample log lines replayed as text log errors.
+ERROR_LINE_MARKERS = ("TEST-UNEXPECTED", "PROCESS-CRASH", "Assertion failure", "ASSERTION")
+# The copies of the sample bugs get Bugzilla ids of their own, above those of real bugs.
+BUG_ID_OFFSET = 1_000_000_000
+GROUP_NAME = "benchmark/{n}/browser.toml"
+# Private caches, so that the line counts, suggestions and group tallies of
+# the rolled back jobs and bugs never reach the real ones.
+PRIVATE_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-classification",
+    },
+    "db_cache": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark-classification-db",
+    },
+}
+
+
+def sample_error_lines(log_dir, num_lines, rng):
+    """Return up to ``num_lines`` distinct error lines of the raw logs in ``log_dir``."""
+    lines = set()
+    for path in sorted(glob(join(log_dir, "*.log.gz"))):
+        with gzip.open(path, "rt", errors="replace") as log_file:
+            lines.update(
+                line.rstrip()
+                for line in log_file
+                if any(marker in line for marker in ERROR_LINE_MARKERS)
+            )
+    lines = sorted(lines)
+    return rng.sample(lines, min(num_lines, len(lines)))
+
+
+def load_bugscache(bugs_dir, copies, search_terms, matched, rng):
+    """
+    Store ``copies`` copies of the sample bugs of ``bugs_dir``, plus a bug for
+    the ``matched`` fraction of ``search_terms``, returning the number of bugs.
+    """
+    sample_bugs = []
+    for path in sorted(glob(join(bugs_dir, "*.json"))):
+        with open(path) as bugs_file:
+            sample_bugs.extend(json.load(bugs_file)["bugs"])
+    matched_terms = rng.sample(sorted(search_terms), int(len(search_terms) * matched))
+
+    max_summary_length = Bugscache._meta.get_field("summary").max_length
+    max_whiteboard_length = Bugscache._meta.get_field("whiteboard").max_length
+    bugs = []
+    for copy_number in range(copies):
+        for bug in sample_bugs:
+            bugs.append(dict(bug, summary=f"{bug['summary']} ({copy_number})", dupe_of=None))
+    for term in matched_terms:
+        bugs.append(
+            {
+                "status": "NEW",
+                "summary": f"Intermittent {term}",
+                "keywords": ["intermittent-failure"],
+            }
+        )
+
+    rows = []
+    for bugzilla_id, bug in enumerate(bugs, BUG_ID_OFFSET):
+        last_change_time = datetime.datetime.now() - datetime.timedelta(days=rng.randrange(365))
+        bug["last_change_time"] = last_change_time.isoformat(timespec="seconds")
+        rows.append(
+            Bugscache(
+                bugzilla_id=bugzilla_id,
+                **get_bug_fields(bug, max_summary_length, max_whiteboard_length),
+            )
+        )
+    Bugscache.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def make_jobs(template, push_ids, num_jobs, error_lines, options, rng):
+    """
+    Store ``num_jobs`` failed copies of the ``template`` job over ``push_ids``,
+    each with text log errors drawn from ``error_lines`` and group results.
+    """
+    jobs = []
+    for n in range(num_jobs):
+        job = copy.copy(template)
+        job.id = None
+        job._state.adding = True
+        job.guid = f"benchmark-{uuid.uuid4()}"
+        job.push_id = push_ids[n % len(push_ids)]
+        job.result = "testfailed"
+        job.failure_classification_id = 1
+        jobs.append(job)
+    jobs = Job.objects.bulk_create(jobs)
+
+    TextLogError.objects.bulk_create(
+        [
+            TextLogError(job=job, line=line, line_number=line_number)
+            for job in jobs
+            for line_number, line in enumerate(rng.choices(error_lines, k=options["lines_per_job"]))
+        ],
+        batch_size=1000,
+    )
+
+    Group.objects.bulk_create(
+        [Group(name=GROUP_NAME.format(n=n)) for n in range(options["groups"])],
+        ignore_conflicts=True,
+    )
+    groups = list(
+        Group.objects.filter(name__in=[GROUP_NAME.format(n=n) for n in range(options["groups"])])
+    )
+    job_logs = JobLog.objects.bulk_create(
+        [
+            JobLog(
+                job=job,
+                name="errorsummary_json",
+                url=f"https://example.com/{job.guid}/errorsummary.log",
+                status=JobLog.PARSED,
+            )
+            for job in jobs
+        ]
+    )
+    GroupStatus.objects.bulk_create(
+        [
+            GroupStatus(
+                job_log=job_log,
+                group=group,
+                status=(
+                    GroupStatus.ERROR
+                    if rng.random() < options["group_error_rate"]
+                    else GroupStatus.OK
+                ),
+                duration=rng.randrange(1, 30000),
+            )
+            for job_log in job_logs
+            for group in rng.sample(groups, min(options["groups_per_job"], len(groups)))
+        ],
+        batch_size=1000,
+    )
+    return list(
+        Job.objects.select_related("repository", "push", "job_type")
+        .filter(id__in=[job.id for job in jobs])
+        .order_by("id")
+    )
+
+
+def hit_rate(hits, lookups):
+    return hits / lookups if lookups else 0.0
+
+
+class Command(BaseCommand):
+    """Management command to benchmark bug suggestions and intermittent classification"""
+
+    help = """
+    Loads the bugscache_population sample bugs (scaled up with synthetic copies,
+    plus bugs for some of the replayed lines) and stores failed copies of a job
+    with error lines from the sample logs, then runs every job through
+    get_error_summary (so bug_suggestions_line and Bugscache.search) and
+    check_and_mark_intermittent, applying the queued classifications at the end.
+    Reports per-job latencies, queries per job and cache hit rates.  Everything
+    is stored in the given repository and rolled back, and the caches used are
+    private in-memory ones.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("repository", help="Name of the repository to store jobs into")
+        parser.add_argument(
+            "--job-id",
+            type=int,
+            default=None,
+            help="Job to copy (defaults to the latest job of the repository)",
+        )
+        parser.add_argument("--jobs", type=int, default=1000, help="Number of jobs to replay")
+        parser.add_argument(
+            "--pushes",
+            type=int,
+            default=4,
+            help="Number of pushes, up to the job's, to spread the jobs over",
+        )
+        parser.add_argument(
+            "--lines-per-job", type=int, default=20, help="Number of text log errors per job"
+        )
+        parser.add_argument(
+            "--distinct-lines",
+            type=int,
+            default=2000,
+            help="Number of distinct sample log lines the errors are drawn from",
+        )
+        parser.add_argument(
+            "--bug-copies",
+            type=int,
+            default=100,
+            help="Number of copies of the sample bugs to load into Bugscache",
+        )
+        parser.add_argument(
+            "--matched",
+            type=float,
+            default=0.5,
+            help="Fraction of the search terms of the replayed lines to file a bug for",
+        )
+        parser.add_argument("--groups", type=int, default=50, help="Number of test groups")
+        parser.add_argument(
+            "--groups-per-job", type=int, default=5, help="Number of groups each job ran"
+        )
+        parser.add_argument(
+            "--group-error-rate",
+            type=float,
+            default=0.3,
+            help="Fraction of group results which are errors",
+        )
+        parser.add_argument(
+            "--index",
+            choices=["on", "off"],
+            default=None,
+            help="Override BUGSCACHE_SEARCH_INDEX",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the random choices")
+        parser.add_argument(
+            "--bugs-dir", default=DEFAULT_BUGS_DIR, help="Directory of sample Bugzilla responses"
+        )
+        parser.add_argument(
+            "--log-dir", default=DEFAULT_LOG_DIR, help="Directory of *.log.gz raw logs"
+        )
+        parser.add_argument(
+            "--profile-output",
+            default=None,
+            help="Write a cProfile (pstats) profile of the whole run to this path",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        repository = Repository.objects.get(name=options["repository"])
+        jobs = Job.objects.filter(repository=repository)
+        template = jobs.get(id=options["job_id"]) if options["job_id"] else jobs.latest("id")
+        push_ids = list(
+            Push.objects.filter(repository=repository, id__lte=template.push_id)
+            .order_by("-id")
+            .values_list("id", flat=True)[: options["pushes"]]
+        )
+        error_lines = sample_error_lines(options["log_dir"], options["distinct_lines"], rng)
+        search_terms = {term for line in error_lines for term in normalize_line(line).search_terms}
+
+        timer = StageTimer()
+        queries = Counter()
+        counts = Counter()
+        scheduled = []
+
+        real_bug_suggestions_line = error_summary.bug_suggestions_line
+        real_search = Bugscache.search
+        real_get_many = bug_suggestion_cache.get_many
+
+        def timed_bug_suggestions_line(*args, **kwargs):
+            with timer.time("bug_suggestions_line", lines=1):
+                return real_bug_suggestions_line(*args, **kwargs)
+
+        def timed_search(search_term):
+            counts["searches"] += 1
+            with timer.time("Bugscache.search", lines=1):
+                return real_search(search_term)
+
+        def counted_get_many(terms):
+            found = real_get_many(terms)
+            counts["suggestion_lookups"] += len(terms)
+            counts["suggestion_hits"] += len(found)
+            return found
+
+        def schedule(args=None, **apply_options):
+            # The classifications are applied once every job has been checked.
+            scheduled.extend(args)
+
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(CACHES=PRIVATE_CACHES))
+            # error_summary holds on to the cache backends rather than proxies.
+            stack.enter_context(mock.patch.object(error_summary, "cache", caches["default"]))
+            stack.enter_context(mock.patch.object(error_summary, "db_cache", caches["db_cache"]))
+            if options["index"]:
+                stack.enter_context(
+                    override_settings(BUGSCACHE_SEARCH_INDEX=options["index"] == "on")
+                )
+            stack.enter_context(
+                mock.patch.object(error_summary, "bug_suggestions_line", timed_bug_suggestions_line)
+            )
+            stack.enter_context(mock.patch.object(Bugscache, "search", timed_search))
+            stack.enter_context(
+                mock.patch.object(bug_suggestion_cache, "get_many", counted_get_many)
+            )
+            stack.enter_context(
+                mock.patch.object(
+                    log_parser_tasks.apply_intermittent_classifications, "apply_async", schedule
+                )
+            )
+            stack.enter_context(maybe_profile(options["profile_output"]))
+            stack.enter_context(transaction.atomic())
+
+            with timer.time("load_bugscache"):
+                counts["bugs"] = load_bugscache(
+                    options["bugs_dir"],
+                    options["bug_copies"],
+                    search_terms,
+                    options["matched"],
+                    rng,
+                )
+            with timer.time("make_jobs"):
+                jobs = make_jobs(template, push_ids, options["jobs"], error_lines, options, rng)
+            # Start from cold process caches, as a new worker would.
+            bump_generation()
+            bugscache_index.clear()
+            bug_suggestion_cache.clear()
+            normalize_line.cache_clear()
+
+            for job in jobs:
+                with CaptureQueriesContext(connection) as captured:
+                    with timer.time("job", lines=options["lines_per_job"]):
+                        with timer.time("get_error_summary", lines=options["lines_per_job"]):
+                            error_summary.get_error_summary(
+                                job, queryset=TextLogError.objects.filter(job=job)
+                            )
+                        summary_queries = len(captured)
+                        with timer.time("check_and_mark_intermittent"):
+                            check_and_mark_intermittent(job.id)
+                queries["get_error_summary"] += summary_queries
+                queries["check_and_mark_intermittent"] += len(captured) - summary_queries
+
+            with CaptureQueriesContext(connection) as captured:
+                for push_id in scheduled:
+                    with timer.time("apply_classifications"):
+                        apply_classifications(push_id)
+            queries["apply_classifications"] = len(captured)
+            counts["intermittent"] = Job.objects.filter(
+                id__in=[job.id for job in jobs], failure_classification_id=8
+            ).count()
+            # Leave the database as we found it.
+            transaction.set_rollback(True)
+
+        normalized = normalize_line.cache_info()
+        num_jobs = len(jobs)
+        results = {
+            "jobs": num_jobs,
+            "error_lines": num_jobs * options["lines_per_job"],
+            "bugs": counts["bugs"],
+            "marked_intermittent": counts["intermittent"],
+            "searches": counts["searches"],
+            "queries_per_job": {
+                stage: count / num_jobs if num_jobs else 0.0 for stage, count in queries.items()
+            },
+            "hit_rates": {
+                "bug_suggestion_cache": hit_rate(
+                    counts["suggestion_hits"], counts["suggestion_lookups"]
+                ),
+                "normalize_line": hit_rate(normalized.hits, normalized.hits + normalized.misses),
+            },
+            "stages": timer.summary(),
+        }
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f"{num_jobs} jobs, {results['error_lines']} error lines, {results['bugs']} bugs: "
+            f"{results['searches']} searches, {results['marked_intermittent']} jobs marked "
+            "intermittent (lines/s is error lines/s for the job stages)"
+        )
+        self.stdout.write(timer.format_summary())
+        for stage, per_job in results["queries_per_job"].items():
+            self.stdout.write(f"{stage}: {per_job:.2f} queries per job")
+        for name, rate in results["hit_rates"].items():
+            self.stdout.write(f"{name}: {rate:.1%} hit rate")
@@ -0,0 +1,224 @@
+import gzip
+import os
+import random
+import tempfile
+from os.path import join
+
+import simplejson as json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from treeherder.log_parser import failureline
+from treeherder.log_parser.artifactbuildercollection import (
+    ArtifactBuilderCollection,
+    LogSizeError,
+)
+from treeherder.log_parser.artifactbuilders import (
+    LogViewerArtifactBuilder,
+    PerformanceDataArtifactBuilder,
+)
+from treeherder.model.models import Job, JobLog
+from treeherder.utils.benchmark import LocalHTTPServer, StageTimer, maybe_profile
+from treeherder.utils.http import make_request
+
+DEFAULT_LOG_DIR = join(settings.SRC_DIR, "tests", "sample_data", "logs")
+
+SYNTHETIC_LINES = (
+    "[task 2025-02-14T07:23:20.364Z] 07:23:20     INFO - TEST-PASS | dom/tests/test_{n}.html | ok",
+    "[task 2025-02-14T07:23:20.364Z] 07:23:20     INFO - TEST-START | dom/tests/test_{n}.html",
+    "[task 2025-02-14T07:23:20.364Z] 07:23:20     INFO - GECKO(1234) | [Child {n}] some output",
+)
+SYNTHETIC_ERROR_LINE = (
+    "[task 2025-02-14T07:23:20.364Z] 07:23:20     INFO - TEST-UNEXPECTED-FAIL | "
+    "dom/tests/test_{n}.html | assertion failed - got 1, expected 2"
+)
+SYNTHETIC_PERF_LINE = (
+    '[task 2025-02-14T07:23:20.364Z] PERFHERDER_DATA: {{"framework": {{"name": "build_metrics"}}, '
+    '"suites": [{{"name": "suite_{n}", "value": {n}.5, "lowerIsBetter": true, '
+    '"shouldAlert": false, "subtests": []}}]}}'
+)
+
+
+def write_synthetic_log(path, size_bytes, seed):
+    """Write a gzipped raw log of roughly ``size_bytes`` uncompressed bytes."""
+    rng = random.Random(seed)
+    written = 0
+    n = 0
+    with gzip.open(path, "wt", encoding="utf-8") as log_file:
+        while written < size_bytes:
+            n += 1
+            if n % 5000 == 0:
+                line = SYNTHETIC_PERF_LINE.format(n=n)
+            elif n % 200 == 0:
+                line = SYNTHETIC_ERROR_LINE.format(n=n)
+            else:
+                line = rng.choice(SYNTHETIC_LINES).format(n=n)
+            log_file.write(line + "\n")
+            written += len(line) + 1
+
+
+def write_synthetic_errorsummary(path, num_lines):
+    """Write an NDJSON errorsummary with a mix of group results and test failures."""
+    with open(path, "w") as log_file:
+        for n in range(num_lines):
+            if n % 3:
+                item = {
+                    "action": "group_result",
+                    "group": f"dom/tests/{n}/browser.toml",
+                    "status": "OK" if n % 7 else "ERROR",
+                    "duration": 1000 * n,
+                    "line": n,
+                }
+            else:
+                item = {
+                    "action": "test_result",
+                    "test": f"dom/tests/{n}/browser_test.js",
+                    "subtest": "assertion",
+                    "status": "FAIL",
+                    "expected": "PASS",
+                    "message": "got 1, expected 2",
+                    "line": n,
+                }
+            log_file.write(json.dumps(item) + "\n")
+
+
+def is_errorsummary(name):
+    return "errorsummary" in name and not name.endswith(".gz")
+
+
+def is_raw_log(name):
+    return name.endswith((".log.gz", ".txt.gz"))
+
+
+class Command(BaseCommand):
+    """Management command to benchmark log parsing without network access"""
+
+    help = """
+    Replays raw logs and errorsummary files from a local directory (plus optional
+    synthetic multi-MB logs) through the log parsing pipeline, serving them from an
+    in-process HTTP server, and reports per-stage timings and throughput.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--log-dir",
+            default=DEFAULT_LOG_DIR,
+            help="Directory of *.log.gz/*.txt.gz raw logs and *errorsummary*.log files",
+        )
+        parser.add_argument(
+            "--synthetic-mb",
+            type=int,
+            default=0,
+            help="Also generate a synthetic raw log of this many (uncompressed) MB",
+        )
+        parser.add_argument(
+            "--synthetic-errorsummary-lines",
+            type=int,
+            default=0,
+            help="Also generate a synthetic errorsummary with this many lines",
+        )
+        parser.add_argument("--repeat", type=int, default=1, help="Number of passes over the logs")
+        parser.add_argument(
+            "--job-id",
+            type=int,
+            default=None,
+            help="Also run write_failure_lines against this job, inside a rolled back transaction",
+        )
+        parser.add_argument(
+            "--trace-allocations",
+            action="store_true",
+            help="Report peak traced memory per stage (slows down the run)",
+        )
+        parser.add_argument(
+            "--profile-output",
+            default=None,
+            help="Write a cProfile (pstats) profile of the whole run to this path",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as synthetic_dir:
+            files = self.collect_files(options, synthetic_dir)
+            timer = StageTimer(trace_allocations=options["trace_allocations"])
+            with self.serve(files) as server:
+                with maybe_profile(options["profile_output"], options["trace_allocations"]):
+                    for _ in range(options["repeat"]):
+                        for name in files:
+                            url = server.url(f"/{name}")
+                            if is_raw_log(name):
+                                self.bench_raw_log(timer, url)
+                            else:
+                                self.bench_errorsummary(timer, url, options["job_id"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(timer.summary(), indent=2))
+        else:
+            self.stdout.write(f"{len(files)} logs x {options['repeat']} passes")
+            self.stdout.write(timer.format_summary())
+
+    def collect_files(self, options, synthetic_dir):
+        log_dir = options["log_dir"]
+        files = {
+            name: join(log_dir, name)
+            for name in sorted(os.listdir(log_dir))
+            if is_raw_log(name) or is_errorsummary(name)
+        }
+        if options["synthetic_mb"]:
+            path = join(synthetic_dir, "synthetic.log.gz")
+            write_synthetic_log(path, options["synthetic_mb"] * 1024 * 1024, seed=0)
+            files["synthetic.log.gz"] = path
+        if options["synthetic_errorsummary_lines"]:
+            path = join(synthetic_dir, "synthetic_errorsummary.log")
+            write_synthetic_errorsummary(path, options["synthetic_errorsummary_lines"])
+            files["synthetic_errorsummary.log"] = path
+        return files
+
+    def serve(self, files):
+        routes = {}
+        for name, path in files.items():
+            with open(path, "rb") as log_file:
+                body = log_file.read()
+            headers = {"Content-Encoding": "gzip"} if name.endswith(".gz") else {}
+            routes[f"/{name}"] = (200, headers, body)
+        return LocalHTTPServer(routes)
+
+    def bench_raw_log(self, timer, url):
+        # Download and split only, to separate network/decompression cost from parsing.
+        num_lines = 0
+        num_bytes = 0
+        with timer.time("download"):
+            with make_request(url, stream=True) as response:
+                for line in response.iter_lines():
+                    num_lines += 1
+                    num_bytes += len(line) + 1
+        timer.count("download", lines=num_lines, nbytes=num_bytes)
+
+        stages = (
+            ("error_parser", lambda: [LogViewerArtifactBuilder(url=url)]),
+            ("performance_parser", lambda: [PerformanceDataArtifactBuilder(url=url)]),
+            ("artifact_builder_collection", lambda: None),
+        )
+        for stage, builders in stages:
+            try:
+                with timer.time(stage, lines=num_lines, nbytes=num_bytes):
+                    ArtifactBuilderCollection(url, builders=builders()).parse()
+            except LogSizeError:
+                self.stderr.write(f"Skipping {url} for {stage}: too large")
+
+    def bench_errorsummary(self, timer, url, job_id):
+        limit = settings.FAILURE_LINES_CUTOFF + 1
+        with timer.time("errorsummary_fetch"):
+            log_lines = failureline.read_log_lines(make_request(url, stream=True), limit)
+        timer.count("errorsummary_fetch", lines=len(log_lines))
+
+        if job_id is None:
+            return
+
+        job = Job.objects.get(id=job_id)
+        with transaction.atomic():
+            job_log = JobLog.objects.create(job=job, name="errorsummary_json", url=url)
+            with timer.time("store_failure_lines", lines=len(log_lines)):
+                failureline.store_failure_lines(job_log)
+            # Leave the database as we found it.
+            transaction.set_rollback(True)
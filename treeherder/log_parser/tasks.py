@@ -2,6 +2,7 @@ import logging
 
 import newrelic.agent
 import simplejson as json
+from celery import shared_task
 from celery.exceptions import SoftTimeLimitExceeded
 from requests.exceptions import HTTPError
 
@@ -10,6 +11,7 @@ from treeherder.log_parser.artifactbuildercollection import (
     ArtifactBuilderCollection,
     LogSizeError,
 )
+from treeherder.model.error_summary import ErrorLineCounts
 from treeherder.model.models import Job, JobLog
 from treeherder.utils.logging_context import job_log_labels, log_context
 from treeherder.workers.task import retryable_task
@@ -23,7 +25,7 @@ logger = logging.getLogger(__name__)
 def parse_logs(job_id, job_log_ids, priority):
     newrelic.agent.add_custom_attribute("job_id", str(job_id))
 
-    job = Job.objects.get(id=job_id)
+    job = Job.objects.select_related("repository", "taskcluster_metadata").get(id=job_id)
 
     # Attach task_id/run_id/job_id as GCP log labels to every line emitted while
     # parsing this job's logs (including deeper failure-line processing).
@@ -35,8 +37,10 @@ def parse_logs(job_id, job_log_ids, priority):
                 "Failed to load all expected job ids: %s", ", ".join([str(j) for j in job_log_ids])
             )
 
+        # The intermittent check looks at every errorsummary of the job, so it is
+        # run once below after all of them are stored rather than once per log.
         parser_tasks = {
-            "errorsummary_json": store_failure_lines,
+            "errorsummary_json": failureline.store_failure_lines,
             "live_backing_log": post_log_artifacts,
         }
 
@@ -46,6 +50,8 @@ def parse_logs(job_id, job_log_ids, priority):
         first_exception = None
         completed_names = set()
         for job_log in job_logs:
+            # Share the job already loaded above rather than fetching it per log.
+            job_log.job = job
             newrelic.agent.add_custom_attribute(f"job_log_{job_log.name}_url", job_log.url)
             logger.info("parser_task for %s", job_log.id)
 
@@ -78,19 +84,16 @@ def parse_logs(job_id, job_log_ids, priority):
             else:
                 completed_names.add(job_log.name)
 
+        # Logs that were stored won't be reparsed on retry, so check them now even
+        # if another log failed.
+        if "errorsummary_json" in completed_names:
+            intermittents.check_and_mark_intermittent(job.id)
+
         # Raise so we trigger the retry decorator.
         if first_exception:
             raise first_exception
 
 
-def store_failure_lines(job_log):
-    """Store the failure lines from a log corresponding to the structured
-    errorsummary file."""
-    logger.info("Running store_failure_lines for job %s", job_log.job.id)
-    failureline.store_failure_lines(job_log)
-    intermittents.check_and_mark_intermittent(job_log.job.id)
-
-
 def post_log_artifacts(job_log):
     """Post a list of artifacts to a job."""
     logger.info("Downloading/parsing log for log %s", job_log.id)
@@ -146,3 +149,19 @@ def extract_text_log_artifacts(job_log):
         )
 
     return artifact_list
+
+
+@retryable_task(name="apply-intermittent-classifications", max_retries=10)
+def apply_intermittent_classifications(push_id):
+    """Apply the intermittent (re)classifications queued for the jobs of a push."""
+    intermittents.apply_classifications(push_id)
+
+
+@shared_task(name="snapshot-error-line-counts")
+def snapshot_error_line_counts():
+    """
+    Copy the error line counts from redis to the database, so that they survive
+    redis losing them.
+    """
+    for keyroot in ("mc_error_lines", "cc_error_lines"):
+        ErrorLineCounts(keyroot).snapshot()
@@ -0,0 +1,184 @@
+"""
+An in-process index of the Bugscache summaries, to suggest bugs for error lines
+without a database query per search term.
+
+``Bugscache.search`` looks for the summaries containing a search term, ranks
+them by their pg_trgm similarity to it and keeps the best 50.  The index
+answers the same question from memory: a posting list (a compact array of row
+slots) per three-character substring of the lowercased summaries narrows the
+rows down to those containing every substring of the term, and the survivors
+are checked and ranked the way Postgres does it.
+
+Each process builds its index on first use, and refreshes it once the Bugscache
+generation has been bumped (by ``BzApiBugProcess.run``, or when an issue is
+added): only the rows that changed are indexed again, the slots of the stale
+ones being left empty until they make up a quarter of the index, which is then
+rebuilt from scratch.
+"""
+
+import heapq
+import logging
+import re
+import struct
+import threading
+import time
+from array import array
+
+from django.core.cache import cache
+
+from treeherder.model.models import Bugscache
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever Bugscache rows have been added, updated or deleted, so that
+# every process refreshes its index.
+GENERATION_CACHE_KEY = "bugscache_generation"
+# How often a process checks whether the generation has been bumped.
+GENERATION_CHECK_INTERVAL = 60
+MAX_RESULTS = 50
+# The fields serialize() returns.
+FIELDS = (
+    "id",
+    "bugzilla_id",
+    "status",
+    "resolution",
+    "summary",
+    "dupe_of",
+    "crash_signature",
+    "keywords",
+    "whiteboard",
+)
+# pg_trgm splits text into words of alphanumeric characters.
+WORD_RE = re.compile(r"[^\W_]+")
+NO_SLOTS = array("I")
+
+
+def get_generation():
+    return cache.get(GENERATION_CACHE_KEY, 0)
+
+
+def bump_generation():
+    """Make every process refresh its index, e.g. after Bugscache has been updated."""
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
+
+
+def pg_trigrams(text):
+    """Return the trigrams pg_trgm compares ``text`` by."""
+    trigrams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        trigrams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def similarity(trigrams, other_trigrams):
+    """pg_trgm's ``similarity()``, including its single precision rounding."""
+    shared = len(trigrams & other_trigrams)
+    total = len(trigrams) + len(other_trigrams) - shared
+    if not total:
+        return 0.0
+    return struct.unpack("f", struct.pack("f", shared / total))[0]
+
+
+class BugscacheIndex:
+    """See the module docstring."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked = None
+        self._reset()
+
+    def _reset(self):
+        # slot -> the row's FIELDS, or None once the row has changed
+        self.rows = []
+        self.slots = {}
+        self.postings = {}
+        self.stale = 0
+
+    def _add(self, row):
+        slot = len(self.rows)
+        self.rows.append(row)
+        self.slots[row["id"]] = slot
+        summary = row["summary"].lower()
+        for gram in {summary[i : i + 3] for i in range(len(summary) - 2)}:
+            slots = self.postings.get(gram)
+            if slots is None:
+                slots = self.postings[gram] = array("I")
+            slots.append(slot)
+
+    def refresh(self):
+        """Index the rows that were added or changed, and forget the deleted ones."""
+        rows = {row["id"]: row for row in Bugscache.objects.values(*FIELDS)}
+        with self._lock:
+            for bug_id, slot in list(self.slots.items()):
+                if rows.get(bug_id) != self.rows[slot]:
+                    self.rows[slot] = None
+                    del self.slots[bug_id]
+                    self.stale += 1
+            if self.stale > len(self.rows) / 4:
+                self._reset()
+            added = [row for bug_id, row in rows.items() if bug_id not in self.slots]
+            for row in added:
+                self._add(row)
+        logger.info("Indexed %s Bugscache rows, %s in total", len(added), len(rows))
+
+    def check_generation(self):
+        """Refresh the index if the generation was bumped, or on first use."""
+        now = time.monotonic()
+        if (
+            self._generation_checked is not None
+            and now - self._generation_checked < GENERATION_CHECK_INTERVAL
+        ):
+            return
+        generation = get_generation()
+        if generation != self._generation:
+            self.refresh()
+            self._generation = generation
+        self._generation_checked = now
+
+    def _candidates(self, search_term):
+        if len(search_term) < 3:
+            return range(len(self.rows))
+        grams = {search_term[i : i + 3] for i in range(len(search_term) - 2)}
+        postings = sorted((self.postings.get(gram, NO_SLOTS) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for slots in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(slots)
+        return candidates
+
+    def search(self, search_term):
+        """
+        Return the serialized bugs whose summary contains ``search_term``, most
+        similar first, as ``Bugscache.search`` queries them.
+        """
+        self.check_generation()
+        search_term = search_term.lower()
+        with self._lock:
+            matches = [
+                row
+                for row in map(self.rows.__getitem__, self._candidates(search_term))
+                if row is not None and search_term in row["summary"].lower()
+            ]
+
+        term_trigrams = pg_trigrams(search_term)
+        ranked = heapq.nsmallest(
+            MAX_RESULTS,
+            matches,
+            key=lambda row: (-similarity(term_trigrams, pg_trigrams(row["summary"])), row["id"]),
+        )
+        return [Bugscache(**row).serialize() for row in ranked]
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+        self._generation = None
+        self._generation_checked = None
+
+
+bugscache_index = BugscacheIndex()
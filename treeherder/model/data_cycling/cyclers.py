@@ -17,6 +17,7 @@ from treeherder.model.models import (
     Machine,
     MachinePlatform,
 )
+from treeherder.model.reference_data import reference_data_cache
 from treeherder.perf.exceptions import MaxRuntimeExceededError, NoDataCyclingAtAllError
 from treeherder.perf.models import (
     BackfillReport,
@@ -111,6 +112,8 @@ class TreeherderCycler(DataCycler):
             MachinePlatform,
             also_used_by=[(PerformanceSignature, "platform_id")],
         )
+        # Ingestion caches the ids of reference data, so make it forget the pruned rows.
+        reference_data_cache.invalidate()
 
 
 class PerfherderCycler(DataCycler):
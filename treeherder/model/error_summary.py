@@ -1,10 +1,20 @@
 import datetime
+import functools
+import hashlib
 import logging
 import re
+import time
+from dataclasses import dataclass
+from itertools import chain
 
 import newrelic.agent
+from django.conf import settings
 from django.core.cache import caches
+from django.utils.encoding import force_str
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
 
+from treeherder.model.bug_search import get_generation
 from treeherder.model.models import Bugscache, TextLogError
 
 logger = logging.getLogger(__name__)
@@ -15,8 +25,29 @@ logger = logging.getLogger(__name__)
 BUG_SUGGESTION_CACHE_TIMEOUT = 86400
 LINE_CACHE_TIMEOUT_DAYS = 21
 LINE_CACHE_TIMEOUT = 86400 * LINE_CACHE_TIMEOUT_DAYS
+# Bug suggestions are invalidated by bumping the Bugscache generation; the
+# timeout only gets rid of the entries of old generations.
+BUG_SUGGESTION_MEMO_TIMEOUT = 86400 * 7
+# How often a process checks whether the Bugscache generation has been bumped.
+GENERATION_CHECK_INTERVAL = 60
+# How long parsers wait for another one to restore the error line counts.
+RESTORE_LOCK_TIMEOUT = 60
+# How many distinct error lines normalize_line remembers.
+NORMALIZED_LINE_CACHE_SIZE = 10000
 db_cache = caches["db_cache"]
 cache = caches["default"]
+# Raises the counts of the hash KEYS[1] to those of a snapshot, so that restoring
+# it over counts that survived, or were already restored, doesn't add them again.
+# ARGV: timeout, then line, count pairs.
+RESTORE_COUNTS_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    local count = tonumber(redis.call("HGET", KEYS[1], ARGV[i]) or 0)
+    if count < tonumber(ARGV[i + 1]) then
+        redis.call("HSET", KEYS[1], ARGV[i], ARGV[i + 1])
+    end
+end
+redis.call("EXPIRE", KEYS[1], ARGV[1])
+"""
 
 LEAK_RE = re.compile(r"\d+ bytes leaked \((.+)\)$|leak at (.+)$")
 CRASH_RE = re.compile(r".+ application crashed \[@ (.+)\] \|.+")
@@ -27,92 +58,290 @@ PROCESS_ID_RE_2 = re.compile(r"^\[\d+\] +")
 REFTEST_RE = re.compile(r"\s+[=!]=\s+.*")
 PREFIX_PATTERN = r"^(TEST-UNEXPECTED-\S+|PROCESS-CRASH)\s+\|\s+"
 
+# The substitutions get_cleaned_line and cache_clean_error_line make, in order,
+# each along with a substring its pattern can't match without, so that a line
+# skips the patterns it has nothing for.  They can't be merged into a single
+# pass, as some match the result of an earlier one: removing "PID 1 | " can
+# expose a "[2] " prefix, and " 1.5 " leaves the space " leaked 3 windows" starts with.
+LINE_CLEANING_SUBSTITUTIONS = (
+    (" | ", PROCESS_ID_RE_1, ""),
+    # .cpp:* ; appears we don't have .cpp: without .cpp:<d>
+    ("cpp:", re.compile(r".cpp:[0-9]+"), ".cpp:X"),
+    # [Child X, Main Thread] || [Parent X, Main Thread]
+    ("[Child ", re.compile(r"\[Child [0-9]+, [a-zA-Z]+ Thread"), "[Child X, Y Thread"),
+    ("[Parent ", re.compile(r"\[Parent [0-9]+, [a-zA-Z]+ Thread"), "[Parent X, Y Thread"),
+    ("[", PROCESS_ID_RE_2, ""),
+)
+CACHE_CLEANING_SUBSTITUTIONS = (
+    (".", re.compile(r" [0-9]+\.[0-9]+ "), " X "),
+    (" leaked ", re.compile(r" leaked [0-9]+ window(s)"), " leaked X window(s)"),
+    (" bytes leaked", re.compile(r" [0-9]+ bytes leaked"), " X bytes leaked"),
+    (" value=", re.compile(r" value=[0-9]+"), " value=*"),
+    (", expected ", re.compile(r"ot [0-9]+, expected [0-9]+"), "ot X, expected Y"),
+    (" http://localhost:", re.compile(r" http://localhost:[0-9]+/"), " http://localhost:X/"),
+    (" finished in ", re.compile(r" finished in \d+ms"), " finished"),
+)
+
+
+def get_redis():
+    """Return the redis client behind the default cache, or None if it isn't redis."""
+    if settings.CACHES["default"]["BACKEND"] != "django_redis.cache.RedisCache":
+        return None
+    return get_redis_connection("default")
+
 
-class MemDBCache:
-    keyroot = ""
+class ErrorLineCounts:
+    """
+    How often each cleaned error line was seen per day, and in which revision first.
+
+    With redis behind the default cache, each day is a hash of line -> count,
+    incremented with HINCRBY so that concurrent log parsers don't lose each
+    other's updates, and the revision a line was first seen in is kept in a
+    second hash per day, set with HSETNX.  The counts of a job's lines over the
+    last ``LINE_CACHE_TIMEOUT_DAYS`` are read in one pipelined round trip of
+    HMGETs.  Other cache backends (e.g. in the tests) get a key per line and day.
+
+    The hashes are copied to the ``db_cache`` table by the periodic
+    ``snapshot_error_line_counts`` task.  When redis has lost them, the first
+    reader restores them from there before any counts are read.  Restoring only
+    raises counts to the snapshotted ones, so it's safe to repeat.
+    """
 
     def __init__(self, keyroot):
         self.keyroot = keyroot
+        self.redis = get_redis()
+        self._restore_script = (
+            self.redis.register_script(RESTORE_COUNTS_SCRIPT) if self.redis is not None else None
+        )
 
-    def get_cache(self):
-        lcache = {}
-        keys = self.get_cache_keys()
-        # copy db cache to memory cache
-        if keys and not cache.get(f"{self.keyroot}_{keys[0]}"):
-            for k in keys:
-                self.update_cache(k, db_cache.get(f"{self.keyroot}_{k}"))
-
-        for d in [k.split("_")[-1] for k in keys]:
-            lcache[d] = cache.get(f"{self.keyroot}_{d}")
-        return lcache
-
-    def write_cache(self, key=None, value=None):
-        if key:
-            # new key, add to both cache and db_cache
-            self.update_cache(key, value)
-            self.update_db_cache(key, value)
-            self.add_cache_keys(key)
+    def _counts_key(self, date):
+        return f"{self.keyroot}:{date}"
+
+    def _new_lines_key(self, date):
+        return f"{self.keyroot}:new_lines:{date}"
+
+    def _line_key(self, key, line):
+        # Lines are too long, and have spaces, for some cache backends' keys.
+        return f"{key}:{hashlib.sha1(line.encode('utf-8')).hexdigest()}"
+
+    def _snapshot_key(self, date):
+        return f"{self.keyroot}_{date}"
+
+    def days(self, date):
+        """The dates counted for a job of ``date`` (a ``YYYY-MM-DD`` string), oldest first."""
+        day = datetime.date.fromisoformat(date)
+        return [
+            str(day - datetime.timedelta(days=n)) for n in reversed(range(LINE_CACHE_TIMEOUT_DAYS))
+        ]
+
+    def get_line_cache(self, date, lines):
+        """
+        Return the counts of ``lines`` as ``{day: {line: count}}``, with the lines
+        first seen on ``date`` and their revisions under ``line_cache[date]["new_lines"]``.
+
+        Lines never seen on a day are left out of it.
+        """
+        lines = sorted(lines)
+        days = self.days(date)
+        line_cache = {day: {} for day in days}
+        line_cache[date]["new_lines"] = {}
+        if not lines:
+            return line_cache
+
+        if self.redis is not None:
+            restored, day_counts, revisions = self._read(days, date, lines)
+            if not restored:
+                # Every line would look new until the counts are back.
+                self.restore()
+                _, day_counts, revisions = self._read(days, date, lines)
+        else:
+            keys = [[self._line_key(self._counts_key(day), line) for line in lines] for day in days]
+            keys.append([self._line_key(self._new_lines_key(date), line) for line in lines])
+            values = cache.get_many([key for day_keys in keys for key in day_keys])
+            *day_counts, revisions = [[values.get(key) for key in day_keys] for day_keys in keys]
+
+        for day, counts in zip(days, day_counts):
+            line_cache[day].update(
+                (line, int(count)) for line, count in zip(lines, counts) if count is not None
+            )
+        line_cache[date]["new_lines"] = {
+            line: force_str(revision)
+            for line, revision in zip(lines, revisions)
+            if revision is not None
+        }
+        return line_cache
+
+    def _read(self, days, date, lines):
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.exists(self._restored_key())
+        for day in days:
+            pipeline.hmget(self._counts_key(day), lines)
+        pipeline.hmget(self._new_lines_key(date), lines)
+        restored, *day_counts, revisions = pipeline.execute()
+        return restored, day_counts, revisions
+
+    def _restored_key(self):
+        return f"{self.keyroot}:restored"
+
+    def restore(self, today=None):
+        """
+        Merge the ``db_cache`` snapshots of the last ``LINE_CACHE_TIMEOUT_DAYS``
+        days back into redis, unless that was done since redis last lost them.
+
+        Concurrent callers wait for the one restoring them.  Returns whether the
+        counts are restored.
+        """
+        if self.redis is None:
+            return False
+        today = today or datetime.date.today()
+        try:
+            with self.redis.lock(
+                f"{self.keyroot}:restore_lock",
+                timeout=RESTORE_LOCK_TIMEOUT,
+                blocking_timeout=RESTORE_LOCK_TIMEOUT,
+            ):
+                if self.redis.exists(self._restored_key()):
+                    return True
+                for day in self.days(str(today)):
+                    snapshot = db_cache.get(self._snapshot_key(day))
+                    if snapshot:
+                        self._restore_day(day, snapshot)
+                        logger.info("Restored %s error line counts of %s", self.keyroot, day)
+                # Expires along with the counts it restored, at the latest.
+                self.redis.set(self._restored_key(), 1, ex=LINE_CACHE_TIMEOUT)
+        except LockError:
+            logger.warning("Timed out waiting for the %s error line counts", self.keyroot)
+            return False
+        return True
+
+    def _restore_day(self, date, snapshot):
+        new_lines = snapshot.pop("new_lines", {})
+        pipeline = self.redis.pipeline(transaction=False)
+        if snapshot:
+            self._restore_script(
+                keys=[self._counts_key(date)],
+                args=[LINE_CACHE_TIMEOUT, *chain.from_iterable(snapshot.items())],
+                client=pipeline,
+            )
+        if new_lines:
+            new_lines_key = self._new_lines_key(date)
+            for line, revision in new_lines.items():
+                pipeline.hsetnx(new_lines_key, line, revision)
+            pipeline.expire(new_lines_key, LINE_CACHE_TIMEOUT)
+        pipeline.execute()
+
+    def record(self, date, counts, new_lines):
+        """
+        Add ``counts`` (``{line: count}``) to the counts of ``date``, and mark
+        ``new_lines`` (``{line: revision}``) as first seen in those revisions.
+
+        Returns the lines that another job marked as first seen in the meantime.
+        """
+        new_lines = sorted(new_lines.items())
+        if not counts and not new_lines:
+            return set()
+        if self.redis is not None:
+            counts_key = self._counts_key(date)
+            new_lines_key = self._new_lines_key(date)
+            pipeline = self.redis.pipeline(transaction=False)
+            for line, revision in new_lines:
+                pipeline.hsetnx(new_lines_key, line, revision)
+            for line, count in counts.items():
+                pipeline.hincrby(counts_key, line, count)
+            pipeline.expire(counts_key, LINE_CACHE_TIMEOUT)
+            pipeline.expire(new_lines_key, LINE_CACHE_TIMEOUT)
+            marked = pipeline.execute()[: len(new_lines)]
         else:
-            # flush cache->db_cache; ensure that keys are removed/added
-            keys = self.get_cache_keys()
-            for key in keys:
-                self.update_db_cache(key, cache.get(f"{self.keyroot}_{key}"))
-            self.set_cache_keys(keys)
-
-    def update_cache(self, key, value, timeout=LINE_CACHE_TIMEOUT):
-        cache.set(f"{self.keyroot}_{key}", value, timeout)
-
-    def update_db_cache(self, key, value, timeout=LINE_CACHE_TIMEOUT):
-        db_cache.set(f"{self.keyroot}_{key}", value, timeout)
-
-    def get_cache_keys(self):
-        # this will return all keys (dates)
-        keys = db_cache.get(f"{self.keyroot}_keys")
-        if not keys:
-            # this is the first time we run this
-            # either fresh DB || migrating from old
-            if db_cache.get(f"{self.keyroot}"):
-                keys = self.migrate_from_old()
-            else:
-                keys = []
-            self.set_cache_keys(keys)
-        return keys
-
-    def add_cache_keys(self, key):
-        # this will return all keys (dates)
-        keys = self.get_cache_keys()
-        if not keys:
-            keys = []
-        keys.append(key)
-        self.set_cache_keys(keys)
-
-    def remove_cache_key(self, key):
-        # this will return all keys (dates)
-        keys = self.get_cache_keys()
-        keys.remove(key)
-        cache.delete(f"{self.keyroot}_{key}")
-        db_cache.delete(f"{self.keyroot}_{key}")
-        self.set_cache_keys(keys)
-
-    def set_cache_keys(self, keys):
-        db_cache.set(f"{self.keyroot}_keys", keys, LINE_CACHE_TIMEOUT)
-
-    def migrate_from_old(self):
-        keys = []
-        # get keyroot, data is {date: value, date2: value, ...}
-        data = db_cache.get(self.keyroot)
-        dates = [d for d in data if re.match(r"\d{4}-\d{2}-\d{2}", d)]
-        if len(dates) > 0:
-            # only clear db cache if we have data to work with
-            cache.clear()
-            db_cache.clear()
-
-        for date in dates:
-            self.update_cache(f"{date}", data[date])
-            self.update_db_cache(f"{date}", data[date])
-            keys.append(date)
-
-        return keys
+            marked = [
+                cache.add(
+                    self._line_key(self._new_lines_key(date), line), revision, LINE_CACHE_TIMEOUT
+                )
+                for line, revision in new_lines
+            ]
+            for line, count in counts.items():
+                key = self._line_key(self._counts_key(date), line)
+                cache.add(key, 0, LINE_CACHE_TIMEOUT)
+                cache.incr(key, count)
+        return {line for (line, _), was_marked in zip(new_lines, marked) if not was_marked}
+
+    def snapshot(self, today=None):
+        """
+        Copy the counts of the last ``LINE_CACHE_TIMEOUT_DAYS`` days to the ``db_cache``.
+
+        If redis lost them (or they were never in it), the snapshots are first
+        merged back in, and nothing is snapshotted if that fails, as it would
+        overwrite the snapshots with partial counts.
+        """
+        if self.redis is None:
+            return
+        today = today or datetime.date.today()
+        if not self.restore(today):
+            return
+
+        for day in self.days(str(today)):
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.hgetall(self._counts_key(day))
+            pipeline.hgetall(self._new_lines_key(day))
+            counts, new_lines = pipeline.execute()
+            if not counts and not new_lines:
+                continue
+            snapshot = {force_str(line): int(count) for line, count in counts.items()}
+            snapshot["new_lines"] = {
+                force_str(line): force_str(revision) for line, revision in new_lines.items()
+            }
+            db_cache.set(self._snapshot_key(day), snapshot, LINE_CACHE_TIMEOUT)
+
+
+class BugSuggestionCache:
+    """
+    Share the results of ``Bugscache.search`` across jobs, keyed by search term.
+
+    The key includes the Bugscache generation, which the bugzilla ETL bumps
+    when it has updated the bugs, so entries are invalidated all at once rather
+    than expiring.  The occurrences counted for internal issues are only
+    refreshed along with them.
+    """
+
+    def __init__(self):
+        self._generation = 0
+        self._generation_checked = None
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if (
+            self._generation_checked is None
+            or now - self._generation_checked >= GENERATION_CHECK_INTERVAL
+        ):
+            self._generation = get_generation()
+            self._generation_checked = now
+
+    def _cache_key(self, term):
+        digest = hashlib.sha1(term.encode("utf-8")).hexdigest()
+        return f"bug_suggestions:{self._generation}:{digest}"
+
+    def get_many(self, terms):
+        """Return ``{term: suggestions}`` for the ``terms`` that are cached, in one lookup."""
+        self._check_generation()
+        keys = {self._cache_key(term): term for term in terms}
+        found = cache.get_many(keys)
+        if found:
+            settings.STATSD_CLIENT.incr("bug_suggestion_cache.hit", len(found))
+        return {keys[key]: suggestions for key, suggestions in found.items()}
+
+    def search(self, term):
+        """Search the Bugscache for ``term``, and cache the suggestions."""
+        self._check_generation()
+        settings.STATSD_CLIENT.incr("bug_suggestion_cache.miss")
+        suggestions = Bugscache.search(term)
+        cache.set(self._cache_key(term), suggestions, BUG_SUGGESTION_MEMO_TIMEOUT)
+        return suggestions
+
+    def clear(self):
+        self._generation = 0
+        self._generation_checked = None
+
+
+bug_suggestion_cache = BugSuggestionCache()
 
 
 def get_error_summary(job, queryset=None):
@@ -127,31 +356,15 @@ def get_error_summary(job, queryset=None):
     if cached_error_summary is not None:
         return cached_error_summary
 
-    # add support for error line caching
+    # add support for error line counting
     # job.repository is a Repository instance, so compare its name rather than
     # the instance itself (which is never equal to a string). Without .name,
-    # comm-central jobs fell through to the "mc_error_lines" cache and shared a
+    # comm-central jobs fell through to the "mc_error_lines" counts and shared a
     # namespace with mozilla-central/autoland error-line counts.
     if job.repository.name == "comm-central":
-        lcache = MemDBCache("cc_error_lines")
+        line_counts = ErrorLineCounts("cc_error_lines")
     else:
-        lcache = MemDBCache("mc_error_lines")
-
-    date = str(job.submit_time.date())
-    line_cache = lcache.get_cache()
-    if date not in lcache.get_cache_keys():
-        lcache.write_cache(date, {})
-    else:
-        dates = lcache.get_cache_keys()
-        dates.sort()
-        for d in dates:
-            date_time = datetime.datetime.strptime(d, "%Y-%m-%d")
-            if date_time <= (
-                datetime.datetime.today() - datetime.timedelta(days=LINE_CACHE_TIMEOUT_DAYS)
-            ):
-                lcache.remove_cache_key(d)
-            else:
-                break
+        line_counts = ErrorLineCounts("mc_error_lines")
 
     if queryset is None:
         queryset = TextLogError.objects.filter(job=job).order_by("id")
@@ -159,8 +372,19 @@ def get_error_summary(job, queryset=None):
     if not queryset:
         return []
 
-    # cache terms generated from error line to save excessive querying
-    term_cache = {}
+    # Only the counts of this job's lines are read, and only the changes written back.
+    date = str(job.submit_time.date())
+    line_cache = line_counts.get_line_cache(
+        date, {normalize_line(err.line).cache_clean_line for err in queryset}
+    )
+    counts_before = dict(line_cache[date])
+    new_lines_before = dict(line_cache[date]["new_lines"])
+
+    # cache terms generated from error line to save excessive querying, starting
+    # with the suggestions other jobs already searched for
+    term_cache = bug_suggestion_cache.get_many(
+        {term for err in queryset for term in normalize_line(err.line).search_terms}
+    )
 
     error_summary = []
     # Future suggestion, set this to queryset[:10] to reduce calls to bug_suggestions_line
@@ -176,18 +400,29 @@ def get_error_summary(job, queryset=None):
         error_summary.append(summary)
 
     try:
-        cache.set(cache_key, error_summary, BUG_SUGGESTION_CACHE_TIMEOUT)
+        new_lines = line_cache[date].pop("new_lines")
+        raced = line_counts.record(
+            date,
+            {
+                line: count - counts_before.get(line, 0)
+                for line, count in line_cache[date].items()
+                if count != counts_before.get(line, 0)
+            },
+            {line: rev for line, rev in new_lines.items() if line not in new_lines_before},
+        )
+        # Another job got to mark these lines as new first.
+        for summary in error_summary:
+            if cache_clean_error_line(summary["search"]) in raced:
+                summary["failure_new_in_rev"] = False
     except Exception as e:
-        newrelic.agent.record_custom_event("error caching error_summary for job", job.id)
-        logger.error("error caching error_summary for job %s: %s", job.id, e, exc_info=True)
+        newrelic.agent.record_custom_event("error caching error_lines for job", job.id)
+        logger.error("error caching error_lines for job %s: %s", job.id, e, exc_info=True)
 
     try:
-        lcache.update_cache(date, line_cache[date])
-        # TODO: consider reducing this, each date is ~5%, so it will be faster
-        lcache.update_db_cache(date, line_cache[date])
+        cache.set(cache_key, error_summary, BUG_SUGGESTION_CACHE_TIMEOUT)
     except Exception as e:
-        newrelic.agent.record_custom_event("error caching error_lines for job", job.id)
-        logger.error("error caching error_lines for job %s: %s", job.id, e, exc_info=True)
+        newrelic.agent.record_custom_event("error caching error_summary for job", job.id)
+        logger.error("error caching error_summary for job %s: %s", job.id, e, exc_info=True)
 
     return error_summary
 
@@ -215,11 +450,11 @@ def bug_suggestions_line(
     if today not in line_cache.keys():
         line_cache[today] = {"new_lines": {}}
 
-    # remove the mozharness prefix
-    clean_line = get_cleaned_line(err.line)
-
-    # remove floating point numbers from the summary as they are often variable
-    cache_clean_line = cache_clean_error_line(clean_line)
+    # the line without its mozharness prefix, and without the numbers (e.g.
+    # durations) that often vary between runs for counting it
+    normalized = normalize_line(err.line)
+    clean_line = normalized.clean_line
+    cache_clean_line = normalized.cache_clean_line
 
     # find all recent failures matching our current `clean_line`
     counter = 0
@@ -239,9 +474,8 @@ def bug_suggestions_line(
         line_cache[today][cache_clean_line] += 1
 
     # get a meaningful search term out of the error line
-    search_info = get_error_search_term_and_path(clean_line)
-    search_term = search_info["search_term"]
-    path_end = search_info["path_end"]
+    search_term = normalized.search_term
+    path_end = normalized.path_end
     bugs = dict(open_recent=[], all_others=[])
 
     # collect open recent and all other bugs suggestions
@@ -252,7 +486,7 @@ def bug_suggestions_line(
             if not term or not term.strip():
                 continue
             if term not in term_cache:
-                term_cache[term] = Bugscache.search(term)
+                term_cache[term] = bug_suggestion_cache.search(term)
             bugs["open_recent"].extend(
                 [
                     bug_to_check
@@ -271,11 +505,11 @@ def bug_suggestions_line(
     if not bugs or not (bugs["open_recent"] or bugs["all_others"]):
         # no suggestions, try to use
         # the crash signature as search term
-        crash_signature = get_crash_signature(clean_line)
+        crash_signature = normalized.crash_signature
         if crash_signature:
             search_terms.append(crash_signature)
             if crash_signature not in term_cache:
-                term_cache[crash_signature] = Bugscache.search(crash_signature)
+                term_cache[crash_signature] = bug_suggestion_cache.search(crash_signature)
             bugs = term_cache[crash_signature]
 
     failure_new_in_rev = False
@@ -296,32 +530,60 @@ def bug_suggestions_line(
     }, line_cache
 
 
+def _apply(substitutions, line):
+    for literal, pattern, replacement in substitutions:
+        if literal in line:
+            line = pattern.sub(replacement, line)
+    return line
+
+
 def get_cleaned_line(line):
     """Strip possible unwanted information from the given line."""
     line_to_clean = MOZHARNESS_RE.sub("", line).strip()
-    line_to_clean = PROCESS_ID_RE_1.sub("", line_to_clean)
-
-    # .cpp:* ; appears we don't have .cpp: without .cpp:<d>
-    line_to_clean = re.sub(r".cpp:[0-9]+", ".cpp:X", line_to_clean)
-    # [Child X, Main Thread] || [Parent X, Main Thread]
-    line_to_clean = re.sub(r"\[Child [0-9]+, [a-zA-Z]+ Thread", "[Child X, Y Thread", line_to_clean)
-    line_to_clean = re.sub(
-        r"\[Parent [0-9]+, [a-zA-Z]+ Thread", "[Parent X, Y Thread", line_to_clean
-    )
-    return PROCESS_ID_RE_2.sub("", line_to_clean)
+    return _apply(LINE_CLEANING_SUBSTITUTIONS, line_to_clean)
 
 
 def cache_clean_error_line(line):
-    cache_clean_line = re.sub(r" [0-9]+\.[0-9]+ ", " X ", line)
-    cache_clean_line = re.sub(r" leaked [0-9]+ window(s)", " leaked X window(s)", cache_clean_line)
-    cache_clean_line = re.sub(r" [0-9]+ bytes leaked", " X bytes leaked", cache_clean_line)
-    cache_clean_line = re.sub(r" value=[0-9]+", " value=*", cache_clean_line)
-    cache_clean_line = re.sub(r"ot [0-9]+, expected [0-9]+", "ot X, expected Y", cache_clean_line)
-    cache_clean_line = re.sub(
-        r" http://localhost:[0-9]+/", " http://localhost:X/", cache_clean_line
+    return _apply(CACHE_CLEANING_SUBSTITUTIONS, line)
+
+
+@dataclass(frozen=True)
+class NormalizedLine:
+    """What bug suggestions derive from an error line, see ``normalize_line``."""
+
+    clean_line: str
+    cache_clean_line: str
+    # as get_error_search_term_and_path returns it, e.g. (None,) if there's none
+    search_term: tuple
+    path_end: str | None
+    crash_signature: str | None
+
+    @property
+    def search_terms(self):
+        """Every term bug_suggestions_line may search the Bugscache for."""
+        terms = [term for term in self.search_term if term and term.strip()]
+        if self.crash_signature:
+            terms.append(self.crash_signature)
+        return terms
+
+
+@functools.lru_cache(maxsize=NORMALIZED_LINE_CACHE_SIZE)
+def normalize_line(line):
+    """
+    Return the ``NormalizedLine`` of a raw ``TextLogError`` line.
+
+    Error lines recur across jobs (and within the same summary), so the results
+    are kept for the most recently seen lines.
+    """
+    clean_line = get_cleaned_line(line)
+    search_info = get_error_search_term_and_path(clean_line)
+    return NormalizedLine(
+        clean_line=clean_line,
+        cache_clean_line=cache_clean_error_line(clean_line),
+        search_term=tuple(search_info["search_term"]),
+        path_end=search_info["path_end"],
+        crash_signature=get_crash_signature(clean_line),
     )
-    cache_clean_line = re.sub(r" finished in \d+ms", " finished", cache_clean_line)
-    return cache_clean_line
 
 
 def get_error_search_term_and_path(error_line):
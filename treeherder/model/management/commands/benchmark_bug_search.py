@@ -0,0 +1,97 @@
+import simplejson as json
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from treeherder.model.bug_search import bugscache_index
+from treeherder.model.error_summary import normalize_line
+from treeherder.model.models import Bugscache, TextLogError
+from treeherder.utils.benchmark import StageTimer, maybe_profile
+
+
+def get_search_terms(num_errors):
+    """Return the distinct search terms bug suggestions use for the latest error lines."""
+    terms = set()
+    lines = TextLogError.objects.order_by("-id").values_list("line", flat=True)[:num_errors]
+    for line in lines:
+        terms.update(normalize_line(line).search_terms)
+    return sorted(terms)
+
+
+class Command(BaseCommand):
+    """Management command to benchmark the bug suggestion searches"""
+
+    help = """
+    Searches the Bugscache for the terms of the latest error lines (or those of
+    --terms-file), with both the Postgres query and the in-process index, and
+    reports per-term latencies, query counts and the searches whose results differ.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--errors",
+            type=int,
+            default=1000,
+            help="Number of the latest text log errors to take search terms from",
+        )
+        parser.add_argument(
+            "--terms-file", default=None, help="Read the search terms from this file, one per line"
+        )
+        parser.add_argument("--repeat", type=int, default=1, help="Number of passes over the terms")
+        parser.add_argument(
+            "--profile-output",
+            default=None,
+            help="Write a cProfile (pstats) profile of the whole run to this path",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+
+    def handle(self, *args, **options):
+        if options["terms_file"]:
+            with open(options["terms_file"]) as terms_file:
+                terms = [line.strip() for line in terms_file if line.strip()]
+        else:
+            terms = get_search_terms(options["errors"])
+
+        timer = StageTimer()
+        queries = {}
+        results = {}
+        with maybe_profile(options["profile_output"]):
+            bugscache_index.clear()
+            with timer.time("index_build", lines=Bugscache.objects.count()):
+                bugscache_index.check_generation()
+
+            for name, use_index in (("postgres", False), ("index", True)):
+                with override_settings(BUGSCACHE_SEARCH_INDEX=use_index):
+                    with CaptureQueriesContext(connection) as captured:
+                        for _ in range(options["repeat"]):
+                            for term in terms:
+                                with timer.time(name, lines=1):
+                                    results[name, term] = Bugscache.search(term)
+                queries[name] = len(captured)
+
+        mismatches = [term for term in terms if results["postgres", term] != results["index", term]]
+        searches = len(terms) * options["repeat"]
+        if options["json"]:
+            summary = {
+                "terms": len(terms),
+                "queries_per_search": {
+                    name: count / searches if searches else 0.0 for name, count in queries.items()
+                },
+                "mismatches": mismatches,
+                "stages": timer.summary(),
+            }
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(
+            f"{len(terms)} search terms, {options['repeat']} runs (lines/s is searches/s, "
+            "or rows/s for index_build)"
+        )
+        self.stdout.write(timer.format_summary())
+        for name, count in queries.items():
+            self.stdout.write(
+                f"{name}: {count / searches if searches else 0:.2f} queries per search"
+            )
+        self.stdout.write(f"{len(mismatches)} searches with different results")
+        for term in mismatches:
+            self.stdout.write(f"  {term}")
@@ -332,6 +332,11 @@ class Bugscache(models.Model):
         max_size = 50
         search_term = search_term.lower()
 
+        if settings.BUGSCACHE_SEARCH_INDEX:
+            from treeherder.model.bug_search import bugscache_index
+
+            return cls._split_matches(search_term, bugscache_index.search(search_term))
+
         # On PostgreSQL we can use the ORM directly, but NOT the full text search
         # as the ranking algorithm expects english words, not paths
         # So we use standard pattern matching AND trigram similarity to compare suite of characters
@@ -357,26 +362,27 @@ class Bugscache(models.Model):
         )
 
         try:
-            open_recent_match_string = [item.serialize() for item in recent_qs]
-            all_data = [
-                match
-                for match in open_recent_match_string
-                if match["summary"].lower().startswith(search_term)
-                or "/" + search_term in match["summary"].lower()
-                or " " + search_term in match["summary"].lower()
-                or "\\" + search_term in match["summary"].lower()
-                or "," + search_term in match["summary"].lower()
-            ]
-            open_recent = [x for x in all_data if x["resolution"] == ""]
-            all_others = [x for x in all_data if x["resolution"] != ""]
+            return cls._split_matches(search_term, [item.serialize() for item in recent_qs])
         except ProgrammingError as e:
             newrelic.agent.notice_error()
             logger.error(
                 f"Failed to execute FULLTEXT search on Bugscache, error={e}, SQL={recent_qs.query.__str__()}"
             )
-            open_recent = []
-            all_others = []
+            return {"open_recent": [], "all_others": []}
 
+    @staticmethod
+    def _split_matches(search_term, open_recent_match_string):
+        all_data = [
+            match
+            for match in open_recent_match_string
+            if match["summary"].lower().startswith(search_term)
+            or "/" + search_term in match["summary"].lower()
+            or " " + search_term in match["summary"].lower()
+            or "\\" + search_term in match["summary"].lower()
+            or "," + search_term in match["summary"].lower()
+        ]
+        open_recent = [x for x in all_data if x["resolution"] == ""]
+        all_others = [x for x in all_data if x["resolution"] != ""]
         return {"open_recent": open_recent, "all_others": all_others}
 
 
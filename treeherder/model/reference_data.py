@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha1
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever reference data rows may have been deleted (see data cycling),
+# so that every process drops the ids it has cached.
+GENERATION_CACHE_KEY = "reference_data_generation"
+# Reference data only changes when cycled, so keep shared entries for a week.
+REFERENCE_DATA_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# How often a process checks whether the generation has been bumped.
+GENERATION_CHECK_INTERVAL = 60
+
+
+class ReferenceDataCache:
+    """
+    Resolve reference data natural keys (e.g. a machine name) to row ids.
+
+    Lookups hit a size-bounded, process-local LRU first and the shared (redis)
+    cache second; only on a miss in both is the database queried, with a
+    ``get_or_create`` so concurrent workers creating the same row are safe.
+    What the database returns is only cached once the surrounding transaction
+    (if any) has committed, since the row may have been created by it.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self.stats = {"local_hit": 0, "shared_hit": 0, "miss": 0}
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._generation_checked = None
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if (
+            self._generation_checked is not None
+            and now - self._generation_checked < GENERATION_CHECK_INTERVAL
+        ):
+            return
+        generation = cache.get(GENERATION_CACHE_KEY, 0)
+        if generation != self._generation:
+            self.clear()
+            self._generation = generation
+        self._generation_checked = now
+
+    def _cache_key(self, model, lookup):
+        natural_key = "\x00".join(f"{field}={lookup[field]}" for field in sorted(lookup))
+        digest = sha1(natural_key.encode("utf-8")).hexdigest()
+        return f"reference_data:{self._generation}:{model._meta.db_table}:{digest}"
+
+    def _record(self, outcome):
+        self.stats[outcome] += 1
+        settings.STATSD_CLIENT.incr(f"reference_data_cache.{outcome}")
+
+    def _store_local(self, key, value):
+        max_size = self.max_size or settings.REFERENCE_DATA_CACHE_SIZE
+        with self._lock:
+            self._local[key] = value
+            self._local.move_to_end(key)
+            while len(self._local) > max_size:
+                self._local.popitem(last=False)
+
+    def _store(self, key, value):
+        cache.set(key, value, REFERENCE_DATA_CACHE_TIMEOUT)
+        self._store_local(key, value)
+
+    def resolve(self, model, lookup, create):
+        """Return the cached value for ``lookup``, calling ``create()`` on a miss."""
+        self._check_generation()
+        key = self._cache_key(model, lookup)
+
+        with self._lock:
+            if key in self._local:
+                self._local.move_to_end(key)
+                self._record("local_hit")
+                return self._local[key]
+
+        value = cache.get(key)
+        if value is not None:
+            self._record("shared_hit")
+            self._store_local(key, value)
+            return value
+
+        self._record("miss")
+        value = create()
+        # Runs right away outside of a transaction; a rolled back one drops it.
+        transaction.on_commit(lambda: self._store(key, value))
+        return value
+
+    def get_id(self, model, defaults=None, **lookup):
+        """Return the id of the ``model`` row matching ``lookup``, creating it if missing."""
+
+        def create():
+            obj, _ = model.objects.get_or_create(defaults=defaults, **lookup)
+            return obj.pk
+
+        return self.resolve(model, lookup, create)
+
+    def hit_rate(self):
+        total = sum(self.stats.values())
+        if not total:
+            return 0.0
+        return (self.stats["local_hit"] + self.stats["shared_hit"]) / total
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def invalidate(self):
+        """Drop cached ids in every process, e.g. after reference data has been deleted."""
+        try:
+            cache.incr(GENERATION_CACHE_KEY)
+        except ValueError:
+            cache.set(GENERATION_CACHE_KEY, 1, None)
+        self.clear()
+        self._generation_checked = None
+
+
+reference_data_cache = ReferenceDataCache()
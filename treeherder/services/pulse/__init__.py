@@ -6,8 +6,11 @@ from .consumers import (
     prepare_consumers,
     prepare_joint_consumers,
 )
+from .ingestion import DirectIngestionConsumer, IngestionService
 
 __all__ = [
+    "DirectIngestionConsumer",
+    "IngestionService",
     "JointConsumer",
     "PushConsumer",
     "TaskConsumer",
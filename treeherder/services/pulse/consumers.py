@@ -1,6 +1,7 @@
 import logging
 import socket
 import threading
+import time
 
 import environ
 import newrelic.agent
@@ -11,11 +12,13 @@ from kombu.mixins import ConsumerMixin
 from treeherder.etl.tasks.pulse_tasks import (
     store_pulse_pushes,
     store_pulse_tasks,
+    store_pulse_tasks_batch,
     store_pulse_tasks_classification,
 )
 from treeherder.utils.http import fetch_json
 
 from .exchange import get_exchange
+from .ordering import coalesce_task_messages
 
 env = environ.Env()
 logger = logging.getLogger(__name__)
@@ -51,6 +54,56 @@ MOZCI_CLASSIFICATION_TESTING_BINDINGS = [
 ]
 
 
+class TaskMessageBatcher:
+    """
+    Buffer task messages so that several are stored by one Celery task.
+
+    A batch is sent once it holds ``size`` messages, or once its oldest
+    message has waited ``wait_ms``.  Messages are only acked after their batch
+    has been sent, and ``store_pulse_tasks_batch`` retries each failed message
+    on its own, so a message is never lost or retried on behalf of another.
+
+    Only the most advanced event of each task run in a batch is sent; the
+    others are acked with it.
+    """
+
+    def __init__(self, root_url, size, wait_ms):
+        self.root_url = root_url
+        self.size = size
+        self.wait = wait_ms / 1000
+        self.messages = []
+        self.first_added = None
+
+    def add(self, body, exchange, routing_key, message):
+        if not self.messages:
+            self.first_added = time.monotonic()
+        self.messages.append((body, exchange, routing_key, message))
+        if len(self.messages) >= self.size:
+            self.flush()
+
+    def flush_if_due(self):
+        if self.messages and time.monotonic() - self.first_added >= self.wait:
+            self.flush()
+
+    def flush(self):
+        if not self.messages:
+            return
+        messages, self.messages = self.messages, []
+        latest, superseded = coalesce_task_messages(messages)
+        store_pulse_tasks_batch.apply_async(
+            args=[[[body, exchange, routing_key] for body, exchange, routing_key, _ in latest]],
+            kwargs={"root_url": self.root_url},
+            queue="store_pulse_tasks",
+        )
+        settings.STATSD_CLIENT.timing(
+            "pulse_tasks_batch.wait", (time.monotonic() - self.first_added) * 1000
+        )
+        if superseded:
+            settings.STATSD_CLIENT.incr("pulse_tasks_batch.coalesced", len(superseded))
+        for _, _, _, message in messages:
+            message.ack()
+
+
 class PulseConsumer(ConsumerMixin):
     """
     Consume jobs from Pulse exchanges
@@ -64,6 +117,26 @@ class PulseConsumer(ConsumerMixin):
         self.root_url = source["root_url"]
         self.source = source
         self.build_routing_key = build_routing_key
+        self.task_batcher = None
+        if settings.PULSE_TASKS_BATCH_SIZE > 1:
+            self.task_batcher = TaskMessageBatcher(
+                self.root_url, settings.PULSE_TASKS_BATCH_SIZE, settings.PULSE_TASKS_BATCH_WAIT_MS
+            )
+
+    def on_iteration(self):
+        # Called by kombu at least once a second, even when no messages arrive.
+        if self.task_batcher:
+            self.task_batcher.flush_if_due()
+
+    def store_task(self, body, exchange, routing_key, message):
+        """Hand a task message to the ``store_pulse_tasks`` queue, batched if enabled."""
+        if self.task_batcher:
+            self.task_batcher.add(body, exchange, routing_key, message)
+            return
+        store_pulse_tasks.apply_async(
+            args=[body, exchange, routing_key, self.root_url], queue="store_pulse_tasks"
+        )
+        message.ack()
 
     def get_consumers(self, consumer, channel):
         return [consumer(**c) for c in self.consumers]
@@ -164,10 +237,7 @@ class TaskConsumer(PulseConsumer):
         exchange = message.delivery_info["exchange"]
         routing_key = message.delivery_info["routing_key"]
         logger.debug(f"received job message from {exchange}#{routing_key}")
-        store_pulse_tasks.apply_async(
-            args=[body, exchange, routing_key, self.root_url], queue="store_pulse_tasks"
-        )
-        message.ack()
+        self.store_task(body, exchange, routing_key, message)
 
 
 class MozciClassificationConsumer(PulseConsumer):
@@ -256,19 +326,18 @@ class JointConsumer(PulseConsumer):
         routing_key = message.delivery_info["routing_key"]
         logger.debug(f"received job message from {exchange}#{routing_key}")
         if exchange.startswith("exchange/taskcluster-queue/v1/"):
-            store_pulse_tasks.apply_async(
-                args=[body, exchange, routing_key, self.root_url], queue="store_pulse_tasks"
-            )
             if "task-completed" in exchange and ".proj-mozci." in routing_key:
                 store_pulse_tasks_classification.apply_async(
                     args=[body, exchange, routing_key, self.root_url],
                     queue="store_pulse_tasks_classification",
                 )
+            # acks the message, once its batch (if any) has been sent
+            self.store_task(body, exchange, routing_key, message)
         else:
             store_pulse_pushes.apply_async(
                 args=[body, exchange, routing_key, self.root_url], queue="store_pulse_pushes"
             )
-        message.ack()
+            message.ack()
 
 
 class Consumers:
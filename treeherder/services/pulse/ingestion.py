@@ -0,0 +1,269 @@
+"""
+Ingest pulse messages in the listener process itself, rather than via Celery.
+
+By default the pulse listeners only re-publish each message to a Celery queue,
+so every event crosses RabbitMQ twice and is (de)serialized twice.  In direct
+mode the listener resolves tasks concurrently on an asyncio event loop, stores
+them with the Django ORM in a bounded thread pool, and only acks a message
+once its data has been committed.  A message that fails is handed to the usual
+Celery task, so it still gets that task's retries.
+
+The events of a task run that arrive within a short window are coalesced into
+the most advanced one, and each task is always stored by the same partition of
+the service, one event at a time, so its job is written once and in order.
+"""
+
+import asyncio
+import functools
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import newrelic.agent
+from django.conf import settings
+from django.db import close_old_connections
+
+from treeherder.etl.job_loader import JobLoader
+from treeherder.etl.push_loader import PushLoader
+from treeherder.etl.taskcluster_pulse.client import close_session
+from treeherder.etl.taskcluster_pulse.handler import handle_message
+from treeherder.etl.tasks.pulse_tasks import (
+    store_pulse_pushes,
+    store_pulse_tasks,
+    store_pulse_tasks_classification,
+)
+
+from .consumers import JointConsumer
+from .ordering import EVENT_RANKS, RunStates, partition, run_key
+
+logger = logging.getLogger(__name__)
+
+# How often (in seconds) the consumer checks for messages that are ready to be acked.
+ACK_INTERVAL = 0.1
+# How many task runs to remember the state of, to drop their stale events.
+TRACKED_RUNS = 100000
+
+
+def _with_db_connection(func, *args):
+    # The pool's threads are long lived, so give up connections that have gone
+    # stale, as Django does at the start and end of each request.
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+class IngestionService:
+    """
+    Run ingestion coroutines on an event loop in a background thread.
+
+    At most ``concurrency`` messages are processed at once; Taskcluster API
+    calls for them run concurrently on the loop, while database work runs in
+    a pool of ``db_threads`` threads.  Tasks are hashed onto ``partitions``,
+    each of which processes its messages one at a time, in submission order.
+    """
+
+    def __init__(self, concurrency=None, db_threads=None, partitions=None):
+        self.concurrency = concurrency or settings.PULSE_DIRECT_INGESTION_CONCURRENCY
+        self.partitions = partitions or settings.PULSE_DIRECT_INGESTION_PARTITIONS
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(
+            max_workers=db_threads or settings.PULSE_DIRECT_INGESTION_DB_THREADS,
+            thread_name_prefix="pulse-ingestion-db",
+        )
+        self._semaphore = None
+        self._partition_locks = None
+        self._thread = threading.Thread(target=self._run, name="pulse-ingestion", daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(close_session(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.executor.shutdown(wait=True)
+        self.loop.close()
+
+    def submit(self, coroutine_function, *args, task_id=None):
+        """
+        Schedule ``coroutine_function(self, *args)``, returning a concurrent future.
+
+        With a ``task_id``, it only starts once everything submitted earlier for
+        the same partition has finished.
+        """
+        index = None if task_id is None else partition(task_id, self.partitions)
+        return asyncio.run_coroutine_threadsafe(
+            self._limited(index, coroutine_function, *args), self.loop
+        )
+
+    async def _limited(self, index, coroutine_function, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._partition_locks = [asyncio.Lock() for _ in range(self.partitions)]
+        if index is None:
+            async with self._semaphore:
+                return await coroutine_function(self, *args)
+        # asyncio locks are fair, so a partition's coroutines run in the order submitted
+        async with self._partition_locks[index], self._semaphore:
+            return await coroutine_function(self, *args)
+
+    async def run_in_db_thread(self, func, *args):
+        return await self.loop.run_in_executor(
+            self.executor, functools.partial(_with_db_connection, func, *args)
+        )
+
+
+def store_runs(runs, root_url):
+    job_loader = JobLoader()
+    for run in runs:
+        job_loader.process_job(run, root_url)
+
+
+async def ingest_task(service, body, exchange, root_url):
+    with settings.STATSD_CLIENT.timer("pulse_direct_ingestion.task"):
+        runs = await handle_message({"exchange": exchange, "payload": body, "root_url": root_url})
+        runs = [run for run in runs if run]
+        if runs:
+            await service.run_in_db_thread(store_runs, runs, root_url)
+
+
+async def ingest_push(service, body, exchange, root_url):
+    with settings.STATSD_CLIENT.timer("pulse_direct_ingestion.push"):
+        await service.run_in_db_thread(PushLoader().process, body, exchange, root_url)
+
+
+class DirectIngestionConsumer(JointConsumer):
+    """
+    Consume the same bindings as ``JointConsumer``, but ingest task and push
+    messages directly using an ``IngestionService``.
+
+    Task events are held for ``settings.PULSE_DIRECT_INGESTION_COALESCE_MS``,
+    and only the most advanced event of each run received in that time is
+    stored.  Events older than one already stored are dropped.
+
+    kombu channels aren't thread safe, so messages are acked from the consumer
+    thread, once the service has finished with them.
+    """
+
+    def __init__(self, source, build_routing_key, service):
+        super().__init__(source, build_routing_key)
+        self.service = service
+        self.processed = queue.SimpleQueue()
+        self.coalesce_window = settings.PULSE_DIRECT_INGESTION_COALESCE_MS / 1000
+        # events waiting to be submitted, by run, in the order their runs were first seen
+        self.waiting = OrderedDict()
+        self.run_states = RunStates(TRACKED_RUNS)
+
+    def get_consumers(self, consumer, channel):
+        # Bound the number of unacked messages, so a backlog stays on the broker.
+        prefetch_count = settings.PULSE_DIRECT_INGESTION_PREFETCH
+        return [consumer(prefetch_count=prefetch_count, **c) for c in self.consumers]
+
+    def run(self, _tokens=1, **kwargs):
+        kwargs.setdefault("safety_interval", ACK_INTERVAL)
+        return super().run(_tokens, **kwargs)
+
+    @newrelic.agent.background_task(
+        name="pulse-direct-ingestion.on_message", group="Pulse Listener"
+    )
+    def on_message(self, body, message):
+        exchange = message.delivery_info["exchange"]
+        routing_key = message.delivery_info["routing_key"]
+        logger.debug(f"received message from {exchange}#{routing_key}")
+        if exchange.startswith("exchange/taskcluster-queue/v1/"):
+            if "task-completed" in exchange and ".proj-mozci." in routing_key:
+                store_pulse_tasks_classification.apply_async(
+                    args=[body, exchange, routing_key, self.root_url],
+                    queue="store_pulse_tasks_classification",
+                )
+            self.add_task_event(body, exchange, routing_key, message)
+        else:
+            self.submit(ingest_push, body, exchange, routing_key, [message])
+
+    def add_task_event(self, body, exchange, routing_key, message):
+        key = run_key(body)
+        if key is None:
+            self.submit(ingest_task, body, exchange, routing_key, [message])
+            return
+        if self.run_states.is_stale(key, exchange):
+            # a more advanced event of this run has already been stored
+            settings.STATSD_CLIENT.incr("pulse_direct_ingestion.stale")
+            message.ack()
+            return
+
+        event = self.waiting.get(key)
+        if event is None:
+            self.waiting[key] = {
+                "body": body,
+                "exchange": exchange,
+                "routing_key": routing_key,
+                "messages": [message],
+                "due": time.monotonic() + self.coalesce_window,
+            }
+        else:
+            settings.STATSD_CLIENT.incr("pulse_direct_ingestion.coalesced")
+            event["messages"].append(message)
+            if EVENT_RANKS.get(exchange, -1) >= EVENT_RANKS.get(event["exchange"], -1):
+                event.update(body=body, exchange=exchange, routing_key=routing_key)
+
+        if not self.coalesce_window:
+            self.submit_due()
+
+    def submit_due(self):
+        now = time.monotonic()
+        while self.waiting:
+            key, event = next(iter(self.waiting.items()))
+            if event["due"] > now:
+                return
+            del self.waiting[key]
+            self.run_states.record(key, event["exchange"])
+            self.submit(
+                ingest_task,
+                event["body"],
+                event["exchange"],
+                event["routing_key"],
+                event["messages"],
+                task_id=key[0],
+            )
+
+    def submit(self, ingest, body, exchange, routing_key, messages, task_id=None):
+        future = self.service.submit(ingest, body, exchange, self.root_url, task_id=task_id)
+        args = [body, exchange, routing_key, self.root_url]
+        future.add_done_callback(
+            lambda future: self.processed.put((future, ingest, args, messages))
+        )
+
+    def on_iteration(self):
+        super().on_iteration()
+        self.submit_due()
+        self.ack_processed()
+
+    def ack_processed(self):
+        while True:
+            try:
+                future, ingest, args, messages = self.processed.get_nowait()
+            except queue.Empty:
+                return
+            exception = future.exception()
+            if exception is not None:
+                logger.info(
+                    "Direct ingestion of a message from %s failed (%r), queueing it instead",
+                    args[1],
+                    exception,
+                )
+                settings.STATSD_CLIENT.incr("pulse_direct_ingestion.fallback")
+                if ingest is ingest_push:
+                    store_pulse_pushes.apply_async(args=args, queue="store_pulse_pushes")
+                else:
+                    store_pulse_tasks.apply_async(args=args, queue="store_pulse_tasks")
+            for message in messages:
+                message.ack()
@@ -0,0 +1,89 @@
+"""
+Order and coalesce the pulse events of a task run.
+
+Taskcluster publishes a defined, pending, running and completed (or failed, or
+exception) event for each run of a task, and pulse may deliver them out of
+order.  Each event carries the whole status of the task, so only the most
+advanced event of a run needs storing; the earlier ones only cost writes and
+races between the workers storing the same job.
+"""
+
+import zlib
+from collections import OrderedDict
+
+EVENT_RANKS = {
+    "exchange/taskcluster-queue/v1/task-defined": 0,
+    "exchange/taskcluster-queue/v1/task-pending": 1,
+    "exchange/taskcluster-queue/v1/task-running": 2,
+    "exchange/taskcluster-queue/v1/task-completed": 3,
+    "exchange/taskcluster-queue/v1/task-failed": 3,
+    "exchange/taskcluster-queue/v1/task-exception": 3,
+}
+
+
+def run_key(body):
+    """
+    Return the ``(task_id, run_id)`` an event is about, or None if it can't be told.
+
+    task-defined events have no runId, but describe the job that run 0 will update.
+    """
+    try:
+        return body["status"]["taskId"], body.get("runId", 0)
+    except (KeyError, TypeError):
+        return None
+
+
+def partition(task_id, partitions):
+    """Map a task to one of ``partitions``, consistently across processes and restarts."""
+    return zlib.crc32(task_id.encode("utf-8")) % partitions
+
+
+def coalesce_task_messages(messages):
+    """
+    Keep only the most advanced event of each task run in ``messages``.
+
+    ``messages`` is a list of tuples starting with ``(body, exchange)``.  Returns
+    ``(latest, superseded)``: the kept messages, in the order their runs were
+    first seen, and the dropped ones.  Of two events of the same rank the later
+    one wins.  Messages whose run can't be told are always kept.
+    """
+    latest = OrderedDict()
+    superseded = []
+    for index, message in enumerate(messages):
+        body, exchange = message[:2]
+        key = run_key(body)
+        if key is None:
+            latest[index] = message
+            continue
+        current = latest.get(key)
+        if current is None:
+            latest[key] = message
+        elif EVENT_RANKS.get(exchange, -1) >= EVENT_RANKS.get(current[1], -1):
+            latest[key] = message
+            superseded.append(current)
+        else:
+            superseded.append(message)
+    return list(latest.values()), superseded
+
+
+class RunStates:
+    """
+    Remember the rank of the last event stored for recently seen task runs, so
+    that events arriving after a more advanced one can be dropped without a
+    database round trip.  Bounded to the ``max_size`` most recently used runs.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._ranks = OrderedDict()
+
+    def is_stale(self, key, exchange):
+        rank = self._ranks.get(key)
+        return rank is not None and EVENT_RANKS.get(exchange, -1) < rank
+
+    def record(self, key, exchange):
+        rank = max(EVENT_RANKS.get(exchange, -1), self._ranks.get(key, -1))
+        self._ranks[key] = rank
+        self._ranks.move_to_end(key)
+        while len(self._ranks) > self.max_size:
+            self._ranks.popitem(last=False)
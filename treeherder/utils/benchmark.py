@@ -0,0 +1,164 @@
+"""Helpers shared by the offline benchmark management commands."""
+
+import cProfile
+import math
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LocalHTTPServer:
+    """
+    Serve canned responses from an in-process HTTP server.
+
+    ``routes`` maps a request path to a ``(status, headers, body)`` tuple, or to
+    a callable taking the request path and returning one.  Unknown paths 404.
+    Use as a context manager; ``url(path)`` returns the absolute url for a path.
+    """
+
+    def __init__(self, routes=None):
+        self.routes = dict(routes or {})
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections alive, like the real artifact hosts do.
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):  # noqa: N802
+                with server._lock:
+                    server.request_count += 1
+                path = self.path.split("?", 1)[0]
+                route = server.routes.get(path)
+                if callable(route):
+                    route = route(self.path)
+                status, headers, body = route or (404, {}, b"")
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self._server.server_port}{path}"
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def percentile(values, pct):
+    """Return the ``pct`` percentile of ``values`` using the nearest-rank method."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+class StageTimer:
+    """Accumulate wall time, throughput and (optionally) peak memory per stage."""
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.durations = defaultdict(list)
+        self.lines = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.peak_bytes = defaultdict(int)
+
+    @contextmanager
+    def time(self, stage, lines=0, nbytes=0):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[stage].append(time.perf_counter() - start)
+            self.lines[stage] += lines
+            self.bytes[stage] += nbytes
+            if self.trace_allocations:
+                _, peak = tracemalloc.get_traced_memory()
+                self.peak_bytes[stage] = max(self.peak_bytes[stage], peak)
+
+    def record(self, stage, seconds):
+        self.durations[stage].append(seconds)
+
+    def count(self, stage, lines=0, nbytes=0):
+        """Add throughput for a stage whose size is only known once it has run."""
+        self.lines[stage] += lines
+        self.bytes[stage] += nbytes
+
+    def summary(self):
+        rows = []
+        for stage, durations in self.durations.items():
+            total = sum(durations)
+            rows.append(
+                {
+                    "stage": stage,
+                    "count": len(durations),
+                    "total_s": total,
+                    "p50_ms": percentile(durations, 50) * 1000,
+                    "p99_ms": percentile(durations, 99) * 1000,
+                    "lines_per_s": self.lines[stage] / total if total else 0.0,
+                    "bytes_per_s": self.bytes[stage] / total if total else 0.0,
+                    "peak_kb": self.peak_bytes[stage] / 1024,
+                }
+            )
+        return rows
+
+    def format_summary(self):
+        header = (
+            f"{'stage':<32}{'count':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+            f"{'lines/s':>12}{'MB/s':>9}{'peak KB':>10}"
+        )
+        lines = [header, "-" * len(header)]
+        for row in self.summary():
+            lines.append(
+                f"{row['stage']:<32}{row['count']:>8}{row['total_s']:>10.3f}"
+                f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['lines_per_s']:>12.0f}"
+                f"{row['bytes_per_s'] / (1024 * 1024):>9.2f}{row['peak_kb']:>10.0f}"
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def maybe_profile(output_path=None, trace_allocations=False):
+    """Optionally run the body under cProfile and/or tracemalloc.
+
+    The profile is written in pstats format, which snakeviz, gprof2dot and
+    ``python -m pstats`` all read.  For sampling profiles, run the command under
+    ``py-spy record`` instead."""
+    profiler = cProfile.Profile() if output_path else None
+    if trace_allocations:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(output_path)
+        if trace_allocations:
+            tracemalloc.stop()
@@ -1,13 +1,127 @@
+import os
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
 import newrelic.agent
 import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# Status codes worth retrying, since they're usually transient on the artifact hosts.
+RETRY_STATUS_CODES = (502, 503, 504)
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# Connections are opened by the thread making the request, so counting them per
+# thread tells each request whether it opened one, even when threads share pools.
+_opened = threading.local()
+
+
+def connections_opened():
+    """Return the number of connections opened so far by the current thread."""
+    return getattr(_opened, "count", 0)
+
+
+class CountingPoolMixin:
+    def _new_conn(self):
+        _opened.count = connections_opened() + 1
+        return super()._new_conn()
+
+
+class CountingHTTPConnectionPool(CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """An adapter whose pools count the connections they open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+
+def create_session():
+    """Create a requests session that keeps connections alive and retries transient errors."""
+    retry = Retry(
+        total=settings.HTTP_MAX_RETRIES,
+        backoff_factor=settings.HTTP_RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        # Leave raising for bad statuses to `raise_for_status()` below.
+        raise_on_status=False,
+    )
+    adapter = CountingHTTPAdapter(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    # The session is shared by unrelated callers, so don't let cookies leak between them.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Return the process-wide session, creating it on first use.
+
+    The session is recreated after a fork (e.g. Celery prefork workers), so
+    that processes never share sockets."""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = create_session()
+                _session_pid = pid
+    return _session
+
+
+def get_connection_stats(session=None):
+    """Return the number of requests made and connections opened by ``session``.
+
+    The counts are totals across all of the session's pools, so they're only a
+    point-in-time snapshot when other threads are using the same session."""
+    session = session or get_session()
+    stats = {"requests": 0, "connections": 0}
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"] += pool.num_requests
+            stats["connections"] += pool.num_connections
+    return stats
 
 
 def make_request(url, method="GET", headers=None, timeout=30, **kwargs):
     """A wrapper around requests to set defaults & call raise_for_status()."""
     headers = headers or {}
     headers["User-Agent"] = f"treeherder/{settings.SITE_HOSTNAME}"
-    response = requests.request(method, url, headers=headers, timeout=timeout, **kwargs)
+    opened_before = connections_opened()
+
+    start = time.monotonic()
+    response = get_session().request(method, url, headers=headers, timeout=timeout, **kwargs)
+    settings.STATSD_CLIENT.timing("http_request", (time.monotonic() - start) * 1000)
+    if connections_opened() > opened_before:
+        settings.STATSD_CLIENT.incr("http_connection.new")
+    else:
+        settings.STATSD_CLIENT.incr("http_connection.reused")
+
     if response.history:
         params = {
             "url": url,
@@ -1,5 +1,6 @@
 import taskcluster_urls
 import yaml
+from django.core.cache import cache
 
 from treeherder.utils.http import fetch_json, fetch_text, make_request
 
@@ -9,6 +10,39 @@ def get_task_definition(root_url, task_id):
     return fetch_json(task_url)
 
 
+# The artifacts of a finished task run don't change, so their listing can be kept a while.
+ARTIFACTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def list_artifacts(root_url, task_id, run_id):
+    """
+    Returns the artifacts of a task run, following continuation tokens.
+
+    The listing is cached, so that the several consumers of it for one job
+    only make the API round-trips once.
+    """
+    cache_key = f"task_artifacts:{root_url}:{task_id}:{run_id}"
+    artifacts = cache.get(cache_key)
+    if artifacts is not None:
+        return artifacts
+
+    artifacts_url = taskcluster_urls.api(
+        root_url, "queue", "v1", f"task/{task_id}/runs/{run_id}/artifacts"
+    )
+    artifacts = []
+    params = None
+    while True:
+        response = fetch_json(artifacts_url, params=params)
+        artifacts.extend(response["artifacts"])
+        continuation_token = response.get("continuationToken")
+        if continuation_token is None:
+            break
+        params = {"continuationToken": continuation_token}
+
+    cache.set(cache_key, artifacts, ARTIFACTS_CACHE_TIMEOUT)
+    return artifacts
+
+
 def download_artifact(root_url, task_id, path):
     """
     Downloads a Taskcluster artifact.
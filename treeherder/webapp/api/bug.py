@@ -5,6 +5,7 @@ from rest_framework import viewsets
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 
+from treeherder.model.bug_search import bump_generation
 from treeherder.model.models import BugJobMap, Bugscache, Job
 
 from .serializers import BugJobMapSerializer
@@ -40,6 +41,7 @@ class BugJobMapViewSet(viewsets.ViewSet):
                     processed_update=False,
                     summary="(no bug data fetched)",
                 )
+                bump_generation()
         elif internal_bug_id:
             bug_reference["internal_bug_id"] = internal_bug_id
         try:
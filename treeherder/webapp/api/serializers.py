@@ -7,6 +7,7 @@ from rest_framework import serializers
 
 from treeherder.changelog.models import Changelog
 from treeherder.model import models
+from treeherder.model.bug_search import bump_generation
 from treeherder.webapp.api.utils import REPO_GROUPS, to_timestamp
 
 
@@ -473,4 +474,5 @@ class InternalIssueSerializer(serializers.ModelSerializer):
         except models.Bugscache.MultipleObjectsReturned:
             # Take last modified in case a conflict happens
             bug = models.Bugscache.objects.filter(**validated_data).order_by("modified").first()
+        bump_generation()
         return bug